@@ -1,4 +1,4 @@
-from tequila.utils import BitString, BitNumbering, BitStringLSB, initialize_bitstring, TequilaException, TequilaWarning
+from tequila.utils import BitString, BitNumbering, BitStringLSB, BitStringArray, initialize_bitstring, TequilaException, TequilaWarning
 from tequila.circuit import gates, QCircuit, NoiseModel
 from tequila.hamiltonian import paulis, QubitHamiltonian, PauliString
 from tequila.objective import Objective, ExpectationValue, Variable, assign_variable, format_variable_dictionary
@@ -8,7 +8,7 @@ from tequila.optimizers import minimize, minimize_scipy, minimize_gd, optimizer_
 
 from tequila.simulators.simulator_api import simulate, compile, compile_to_function, draw, pick_backend, \
     INSTALLED_SAMPLERS, \
-    INSTALLED_SIMULATORS, SUPPORTED_BACKENDS, INSTALLED_BACKENDS, show_available_simulators
+    INSTALLED_SIMULATORS, SUPPORTED_BACKENDS, INSTALLED_BACKENDS, show_available_simulators, compile_cache
 from tequila.wavefunction import QubitWaveFunction
 import tequila.quantumchemistry as chemistry
 
@@ -1,11 +1,13 @@
 import typing
 import copy
 import numbers
+import numpy
 from abc import ABC
 from tequila import TequilaException
 from tequila.objective.objective import Variable, FixedVariable, assign_variable
 from tequila.hamiltonian import PauliString, QubitHamiltonian
 from tequila.tools import list_assignement
+from tequila.utils.structure import structural_key
 
 from dataclasses import dataclass
 
@@ -112,14 +114,54 @@ class QGateImpl:
         else:
             return max(self.target + self.control)
 
+    def __setattr__(self, key, value):
+        # every change of the gate invalidates the cached structural key
+        object.__setattr__(self, key, value)
+        if key != "_structural_key_cache":
+            object.__setattr__(self, "_structural_key_cache", None)
+
+    def __getstate__(self):
+        # the structural key is not pickled, it is recomputed when needed
+        state = dict(self.__dict__)
+        state["_structural_key_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __deepcopy__(self, memo):
+        # the copy has the same structure, so it can share the cached key
+        result = type(self).__new__(type(self))
+        memo[id(self)] = result
+        for k, v in self.__dict__.items():
+            if k != "_structural_key_cache":
+                object.__setattr__(result, k, copy.deepcopy(v, memo))
+        object.__setattr__(result, "_structural_key_cache", self.__dict__.get("_structural_key_cache", None))
+        return result
+
+    def structural_key(self) -> tuple:
+        """
+        :return: hashable representation of the gate (type and all attributes)
+        cached until an attribute of the gate is set
+        """
+        cache = self.__dict__.get("_structural_key_cache", None)
+        if cache is None:
+            attributes = {k: v for k, v in self.__dict__.items() if k != "_structural_key_cache"}
+            key = (type(self),) + structural_key(attributes)[1:]
+            cache = (key, hash(key))
+            self._structural_key_cache = cache
+        return cache[0]
+
+    def __hash__(self):
+        self.structural_key()
+        return self._structural_key_cache[1]
+
     def __eq__(self, other):
-        if self.name != other.name:
-            return False
-        if self.target != other.target:
-            return False
-        if self.control != other.control:
+        if self is other:
+            return True
+        if not isinstance(other, QGateImpl):
             return False
-        return True
+        return hash(self) == hash(other) and self.structural_key() == other.structural_key()
 
 
 class MeasurementImpl(QGateImpl):
@@ -128,6 +170,23 @@ class MeasurementImpl(QGateImpl):
         super().__init__(name=name, target=tuple(sorted(list_assignement(target))))
 
 
+class DenseGateImpl(QGateImpl):
+    """
+    Fixed unitary given as dense matrix on the targets (the first target is the most significant qubit)
+    Created by the fusion pass (see tequila.circuit.fusion)
+    """
+
+    def __init__(self, target: UnionList, matrix):
+        super().__init__(name="Dense", target=target)
+        self.matrix = numpy.asarray(matrix, dtype=numpy.complex128)
+        if self.matrix.shape != (2 ** len(self.target), 2 ** len(self.target)):
+            raise TequilaException("matrix of shape {} does not act on the targets {}".format(self.matrix.shape,
+                                                                                               self.target))
+
+    def dagger(self):
+        return DenseGateImpl(target=self.target, matrix=self.matrix.conjugate().T)
+
+
 class ParametrizedGateImpl(QGateImpl, ABC):
     '''
     the base class from which all parametrized gates inherit. User defined gates, when implemented, are liable to be members of this class directly.
@@ -166,15 +225,6 @@ class ParametrizedGateImpl(QGateImpl, ABC):
         result += ")"
         return result
 
-    def __eq__(self, other):
-        if not isinstance(other, ParametrizedGateImpl):
-            return False
-        if not super().__eq__(other):
-            return False
-        if self._parameter != other._parameter:
-            return False
-        return True
-
 
 class RotationGateImpl(ParametrizedGateImpl):
     axis_to_string = {0: "x", 1: "y", 2: "z"}
@@ -332,6 +382,7 @@ class TrotterParameters:
     join_components: bool = True
     randomize_component_order: bool = False
     randomize: bool = False
+    ordering: str = None
 
 
 class TrotterizedGateImpl(QGateImpl):
@@ -361,7 +412,8 @@ class TrotterizedGateImpl(QGateImpl):
                  threshold: numbers.Real = 0.0,
                  join_components: bool = True,
                  randomize_component_order: bool = True,
-                 randomize: bool = True):
+                 randomize: bool = True,
+                 ordering: str = None):
         """
         :param generators: list of generators
         :param angles: coefficients for each generator
@@ -372,6 +424,8 @@ class TrotterizedGateImpl(QGateImpl):
         Note that for steps==1 as well as len(generators)==1 this has no effect
         :param randomize_component_order: randomize the order in the generators order before trotterizing
         :param randomize: randomize the trotter decomposition of each generator
+        :param ordering: order the paulistrings of each generator ('gray' or 'lexicographic') and align their CNOT ladders,
+        so that the compiled circuit needs less CNOTs after peephole optimization (see compiler.order_paulistrings)
         """
         super().__init__(name="Trotterized", target=self.extract_targets(generators), control=control)
         self.generators = list_assignement(generators)
@@ -380,6 +434,7 @@ class TrotterizedGateImpl(QGateImpl):
         self.threshold = threshold
         self.join_components = join_components
         self.randomize_component_order = randomize_component_order
+        self.ordering = ordering
         self.randomize = randomize
         self.finalize()
 
@@ -301,15 +301,65 @@ class QCircuit():
             result += str(g) + "\n"
         return result
 
+    def canonical_gate_order(self) -> list:
+        """
+        The gates in the order which sort_gates would give (moments, then lowest qubit)
+        without changing the circuit
+        """
+        table = {}
+        positions = []
+        for g in self.gates:
+            moment = max(table.get(q, 0) for q in g.qubits)
+            for q in g.qubits:
+                table[q] = moment + 1
+            positions.append((moment, min(g.qubits)))
+        order = sorted(range(len(self.gates)), key=lambda i: positions[i])
+        return [self.gates[i] for i in order]
+
+    def structural_key(self) -> tuple:
+        """
+        Hashable representation of the circuit: the structural keys of the gates in canonical order
+        so circuits which only differ by the order of gates acting on different qubits have the same key
+        The key is cached and recomputed if gates were added, removed or changed
+        """
+        gate_keys = tuple(g.structural_key() for g in self.gates)
+        cache = self.__dict__.get("_structural_key_cache", None)
+        if cache is not None and cache[0] == self._min_n_qubits and len(cache[1]) == len(gate_keys) \
+                and all(a is b for a, b in zip(cache[1], gate_keys)):
+            return cache[2]
+        key = ("QCircuit", self._min_n_qubits) + tuple(g.structural_key() for g in self.canonical_gate_order())
+        self._structural_key_cache = (self._min_n_qubits, gate_keys, key, hash(key))
+        return key
+
+    def __getstate__(self):
+        # the structural key is not pickled, it is recomputed when needed
+        state = dict(self.__dict__)
+        state["_structural_key_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __deepcopy__(self, memo):
+        # the copied gates share their cached keys, so the cached key of the circuit stays valid
+        result = type(self).__new__(type(self))
+        memo[id(self)] = result
+        for k, v in self.__dict__.items():
+            if k != "_structural_key_cache":
+                result.__dict__[k] = copy.deepcopy(v, memo)
+        result.__dict__["_structural_key_cache"] = self.__dict__.get("_structural_key_cache", None)
+        return result
+
+    def __hash__(self):
+        self.structural_key()
+        return self._structural_key_cache[3]
+
     def __eq__(self, other):
-        if len(self.gates) != len(other.gates):
+        if self is other:
+            return True
+        if not isinstance(other, QCircuit):
             return False
-        self.sort_gates()
-        other.sort_gates()
-        for i, g in enumerate(self.gates):
-            if g != other.gates[i]:
-                return False
-        return True
+        return hash(self) == hash(other) and self.structural_key() == other.structural_key()
 
     def __repr__(self):
         return self.__str__()
@@ -6,8 +6,9 @@ from tequila import TequilaException
 from tequila.circuit.circuit import QCircuit
 from tequila.circuit.gates import Rx, Ry, H, X, Rz, ExpPauli, CNOT, Phase, T, Z, Y
 from tequila.circuit._gates_impl import RotationGateImpl, PhaseGateImpl, QGateImpl, MeasurementImpl, \
-    ExponentialPauliGateImpl, TrotterizedGateImpl, PowerGateImpl
+    ExponentialPauliGateImpl, TrotterizedGateImpl, PowerGateImpl, DenseGateImpl
 from tequila.utils import to_float
+from tequila.hamiltonian import PauliString
 from tequila import Variable
 from tequila import Objective
 from tequila.objective.objective import ExpectationValueImpl
@@ -239,7 +240,7 @@ def compile_multitarget(gate, variables=None) -> QCircuit:
     if hasattr(gate, "generator") or hasattr(gate, "generators") or hasattr(gate, "paulistring"):
         return QCircuit.wrap_gate(gate)
 
-    if isinstance(gate, ExponentialPauliGateImpl) or isinstance(gate, TrotterizedGateImpl):
+    if isinstance(gate, (ExponentialPauliGateImpl, TrotterizedGateImpl, DenseGateImpl)):
         return QCircuit.wrap_gate(gate)
 
     if len(targets) == 1:
@@ -839,20 +840,80 @@ def compile_exponential_pauli_gate(gate) -> QCircuit:
         return QCircuit.wrap_gate(gate)
 
 
-def do_compile_trotterized_gate(generator, steps, factor, randomize, control):
+def order_paulistrings(paulistrings: list, ordering: str = None) -> list:
+    """
+    Order paulistrings so that neighbours act in the same way on many qubits
+    :param ordering: None keeps the order,
+        'lexicographic' sorts by (qubit, pauli) pairs,
+        'gray' starts with the lexicographically first paulistring and always continues with the paulistring
+        which differs on the least qubits from the previous one (like a gray code)
+    :return: the ordered list
+    """
+    if ordering is None:
+        return list(paulistrings)
+
+    def key(ps):
+        return tuple(sorted((k, v.upper()) for k, v in ps.items()))
+
+    ordered = sorted(paulistrings, key=key)
+    if ordering.lower() == "lexicographic":
+        return ordered
+    elif ordering.lower() == "gray":
+        result = [ordered.pop(0)]
+        while len(ordered) > 0:
+            last = set(key(result[-1]))
+            distances = [len(last.symmetric_difference(key(ps))) for ps in ordered]
+            result.append(ordered.pop(min(range(len(distances)), key=distances.__getitem__)))
+        return result
+    else:
+        raise TequilaCompilerException("unknown ordering {} for paulistrings".format(ordering))
+
+
+def align_ladders(paulistrings: list) -> list:
+    """
+    Reorder the qubits of every paulistring (which gives the order of the CNOT ladder in
+    compile_exponential_pauli_gate): qubits are sorted by how often their pauli changes between neighbouring
+    paulistrings, so neighbouring exponentials start their CNOT ladders on the same qubits with the same basis
+    and the basis changes and the shared part of the ladders cancel (see tequila.circuit.peephole)
+    :return: list of PauliStrings with the same coefficients
+    """
+    changes = {}
+    previous = {}
+    for ps in paulistrings:
+        current = {k: v.upper() for k, v in ps.items()}
+        for k in set(current.keys()).union(previous.keys()):
+            changes[k] = changes.get(k, 0) + (current.get(k, None) != previous.get(k, None))
+        previous = current
+    result = []
+    for ps in paulistrings:
+        order = sorted(ps.keys(), key=lambda k: (changes[k], k))
+        result.append(PauliString(data={k: ps[k] for k in order}, coeff=ps.coeff))
+    return result
+
+
+def do_compile_trotterized_gate(generator, steps, factor, randomize, control, ordering: str = None):
+    """
+    :param ordering: ordering of the paulistrings in every step (see order_paulistrings),
+        if given the CNOT ladders of neighbouring paulistrings are aligned as well (see align_ladders)
+    """
     assert (generator.is_hermitian())
     circuit = QCircuit()
     factor = factor / steps
+    sequence = []
     for index in range(steps):
         paulistrings = generator.paulistrings
         if randomize:
             numpy.random.shuffle(paulistrings)
-        for ps in paulistrings:
+        for ps in order_paulistrings(paulistrings, ordering=ordering):
             if len(ps._data) == 0:
                 print("ignoring constant term in trotterized gate")
                 continue
-            coeff = to_float(ps.coeff)
-            circuit += ExpPauli(paulistring=ps.naked(), angle=factor * coeff, control=control)
+            sequence.append(ps)
+    if ordering is not None:
+        sequence = align_ladders(sequence)
+    for ps in sequence:
+        coeff = to_float(ps.coeff)
+        circuit += ExpPauli(paulistring=ps.naked(), angle=factor * coeff, control=control)
 
     return circuit
 
@@ -883,7 +944,8 @@ def compile_trotterized_gate(gate, compile_exponential_pauli: bool = False):
                 if gate.angles is not None:
                     c = gate.angles[i]
                 result += do_compile_trotterized_gate(generator=g, steps=1, factor=c / gate.steps,
-                                                      randomize=gate.randomize, control=gate.control)
+                                                      randomize=gate.randomize, control=gate.control,
+                                                      ordering=getattr(gate, "ordering", None))
     else:
         if gate.randomize_component_order:
             numpy.random.shuffle(gate.generators)
@@ -891,7 +953,7 @@ def compile_trotterized_gate(gate, compile_exponential_pauli: bool = False):
             if gate.angles is not None:
                 c = gate.angles[i]
             result += do_compile_trotterized_gate(generator=g, steps=gate.steps, factor=c, randomize=gate.randomize,
-                                                  control=gate.control)
+                                                  control=gate.control, ordering=getattr(gate, "ordering", None))
 
     if compile_exponential_pauli:
         return compile_exponential_pauli_gate(result)
@@ -0,0 +1,152 @@
+import typing
+import numpy
+
+from tequila.circuit.circuit import QCircuit
+from tequila.circuit._gates_impl import QGateImpl, RotationGateImpl, PhaseGateImpl, ExponentialPauliGateImpl, \
+    DenseGateImpl
+from tequila.utils import to_float
+
+"""
+Gate fusion: runs of neighbouring gates which do not depend on variables and act on at most max_qubits qubits
+are merged into one dense unitary (DenseGateImpl), so statevector simulators sweep over the state once per block
+Gates which depend on variables stay as they are, so backends can still update them in place
+"""
+
+_PAULIS = {
+    "I": numpy.eye(2, dtype=numpy.complex128),
+    "X": numpy.array([[0.0, 1.0], [1.0, 0.0]], dtype=numpy.complex128),
+    "Y": numpy.array([[0.0, -1.0j], [1.0j, 0.0]], dtype=numpy.complex128),
+    "Z": numpy.array([[1.0, 0.0], [0.0, -1.0]], dtype=numpy.complex128),
+}
+
+_BASIC = {**_PAULIS,
+          "H": numpy.array([[1.0, 1.0], [1.0, -1.0]], dtype=numpy.complex128) / numpy.sqrt(2.0),
+          "SWAP": numpy.eye(4, dtype=numpy.complex128)[[0, 2, 1, 3]]}
+
+
+def gate_matrix(gate: QGateImpl) -> typing.Optional[numpy.ndarray]:
+    """
+    :param gate: a gate which does not depend on variables
+    :return: the matrix of the gate on its targets (first target is the most significant qubit, controls are not
+        included) or None if the gate can not be represented as fixed matrix
+    """
+    if isinstance(gate, DenseGateImpl):
+        return gate.matrix
+    if gate.is_parametrized() and len(gate.extract_variables()) > 0:
+        return None
+    if isinstance(gate, RotationGateImpl):
+        angle = to_float(gate.parameter(variables={}))
+        pauli = _PAULIS[gate.name[1].upper()]
+        return numpy.cos(angle / 2.0) * _PAULIS["I"] - 1.0j * numpy.sin(angle / 2.0) * pauli
+    if isinstance(gate, PhaseGateImpl):
+        return numpy.diag([1.0, numpy.exp(1.0j * to_float(gate.parameter(variables={})))]).astype(numpy.complex128)
+    if isinstance(gate, ExponentialPauliGateImpl):
+        angle = to_float(gate.parameter(variables={})) * gate.paulistring.coeff
+        pauli = numpy.ones((1, 1), dtype=numpy.complex128)
+        for q in gate.target:
+            pauli = numpy.kron(pauli, _PAULIS[gate.paulistring[q].upper()])
+        return numpy.cos(angle / 2.0) * numpy.eye(len(pauli)) - 1.0j * numpy.sin(angle / 2.0) * pauli
+    if type(gate) is QGateImpl and gate.name in _BASIC:
+        matrix = _BASIC[gate.name]
+        if gate.name == "SWAP":
+            return matrix if len(gate.target) == 2 else None
+        # single qubit gates with several targets act on every target
+        result = numpy.ones((1, 1), dtype=numpy.complex128)
+        for _ in gate.target:
+            result = numpy.kron(result, matrix)
+        return result
+    return None
+
+
+def apply_gate_matrix(matrix: numpy.ndarray, tensor: numpy.ndarray, targets: tuple, controls: tuple = ()):
+    """
+    Apply a gate matrix on the leading (2,)*k axes of the tensor in place
+    :param targets: axes of the targets (first target is the most significant qubit of the matrix)
+    :param controls: axes of the controls, the matrix acts where all of them are |1>
+    """
+    index = [slice(None)] * tensor.ndim
+    for c in controls:
+        index[c] = 1
+    index = tuple(index)
+    axes = [t - sum(c < t for c in controls) for t in targets]
+    n = len(targets)
+    sub = tensor[index]
+    result = numpy.tensordot(matrix.reshape((2,) * (2 * n)), sub, axes=(list(range(n, 2 * n)), axes))
+    tensor[index] = numpy.moveaxis(result, list(range(n)), axes)
+
+
+def block_matrix(gates: list, qubits: list) -> numpy.ndarray:
+    """
+    :param gates: gates with fixed matrices (see gate_matrix) acting on the qubits
+    :param qubits: the qubits of the block, the first qubit is the most significant
+    :return: the unitary of the gate sequence on the qubits
+    """
+    axis = {q: i for i, q in enumerate(qubits)}
+    dimension = 2 ** len(qubits)
+    # the columns of the identity are propagated through the gates
+    tensor = numpy.eye(dimension, dtype=numpy.complex128).reshape((2,) * len(qubits) + (dimension,))
+    for gate in gates:
+        apply_gate_matrix(matrix=gate_matrix(gate), tensor=tensor, targets=tuple(axis[t] for t in gate.target),
+                          controls=tuple(axis[c] for c in gate.control))
+    return tensor.reshape(dimension, dimension)
+
+
+def fuse_gates(circuit: QCircuit, max_qubits: int = 2) -> QCircuit:
+    """
+    Merge gates with fixed matrices into dense blocks on at most max_qubits qubits
+    Blocks on disjoint qubits stay open at the same time, a block is closed when a gate which does not fit
+    into it acts on one of its qubits
+    Blocks with a single gate keep the original gate
+    :param circuit: the (compiled) circuit
+    :param max_qubits: maximal number of qubits of a block
+    :return: the fused circuit
+    """
+    result = []
+    owner = {}
+
+    def close(block):
+        for q in block[0]:
+            del owner[q]
+        result.append(block)
+
+    for gate in circuit.gates:
+        qubits = set(gate.qubits)
+        touched = []
+        for q in sorted(qubits):
+            if q in owner and not any(owner[q] is b for b in touched):
+                touched.append(owner[q])
+        fusable = gate_matrix(gate) is not None
+        merged = set(qubits).union(*[b[0] for b in touched])
+        if fusable and len(merged) <= max_qubits:
+            # open blocks on disjoint qubits commute, they can be joined
+            block = (merged, [g for b in touched for g in b[1]] + [gate])
+            for q in merged:
+                owner[q] = block
+        else:
+            for b in touched:
+                close(b)
+            if fusable and len(qubits) <= max_qubits:
+                block = (qubits, [gate])
+                for q in qubits:
+                    owner[q] = block
+            else:
+                result.append(gate)
+    open_blocks = []
+    for block in owner.values():
+        if not any(block is b for b in open_blocks):
+            open_blocks.append(block)
+    for block in open_blocks:
+        close(block)
+
+    gates = []
+    for item in result:
+        if isinstance(item, QGateImpl):
+            gates.append(item)
+        elif len(item[1]) == 1:
+            gates.append(item[1][0])
+        else:
+            qubits = sorted(item[0])
+            gates.append(DenseGateImpl(target=qubits, matrix=block_matrix(gates=item[1], qubits=qubits)))
+    result = QCircuit(gates=gates)
+    result.n_qubits = circuit.n_qubits
+    return result
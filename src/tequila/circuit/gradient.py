@@ -1,22 +1,29 @@
 from tequila.circuit.compiler import Compiler
-from tequila.objective.objective import Objective, ExpectationValueImpl, Variable, assign_variable
+from tequila.circuit.circuit import QCircuit
+from tequila.objective.objective import Objective, ExpectationValueImpl, Variable, assign_variable, \
+    format_variable_dictionary
 from tequila import TequilaException
 import numpy as np
-import copy
+import copy, typing
 
 # make sure to use the jax/autograd numpy
 from tequila.autograd_imports import numpy, jax, __AUTOGRAD__BACKEND__
 
 
-def grad(objective: Objective, variable: Variable = None, no_compile=False):
+def grad(objective: Objective, variable: Variable = None, no_compile=False, method: str = None):
     '''
     wrapper function for getting the gradients of Objectives,ExpectationValues, Unitaries (including single gates), and Transforms.
     :param obj (QCircuit,ParametrizedGateImpl,Objective,ExpectationValue,Transform,Variable): structure to be differentiated
     :param variables (list of Variable): parameter with respect to which obj should be differentiated.
         default None: total gradient.
+    :param method: None gives the gradient as tequila Objectives (parameter shift rule)
+        a name of BatchedGradient.methods gives a BatchedGradient which evaluates the whole gradient in one call
     return: dictionary of Objectives, if called on gate, circuit, exp.value, or objective; if Variable or Transform, returns number.
     '''
 
+    if method is not None:
+        return BatchedGradient(objective=objective, variables=None if variable is None else [variable], method=method)
+
     if variable is None:
         # None means that all components are created
         variables = objective.extract_variables()
@@ -190,3 +197,127 @@ def __grad_gaussian(unitary, g, i, variable, hamiltonian):
     Ominus = ExpectationValueImpl(U=U2, H=hamiltonian)
     dOinc = w1 * Objective(args=[Oplus]) + w2 * Objective(args=[Ominus])
     return dOinc
+
+
+def parameter_derivatives(parameter) -> dict:
+    '''
+    Derivatives of a gate parameter with respect to all variables it depends on
+    :param parameter: Variable, Objective or number
+    :return: dictionary {variable: derivative} where the derivatives are numbers or Objectives
+    '''
+    if not hasattr(parameter, "extract_variables"):
+        return {}
+    return {k: __grad_inner(parameter, k) for k in parameter.extract_variables()}
+
+
+def shift_rule_circuit(unitary: QCircuit) -> typing.Tuple[QCircuit, list]:
+    '''
+    Prepare the parameter shift rule for all parametrized gates of a circuit at once
+    Every parametrized gate gets an additional shift variable added to its parameter,
+    the shifted circuits needed for the gradient then all differ only by the values of the shift variables
+    and the circuit needs to be compiled only once
+    :param unitary: the circuit to be differentiated
+    :return: the circuit with shift variables and a list of tuples (shift variable, shift of the gate, {variable: derivative})
+        where the derivatives of the gate parameter are numbers or Objectives
+    '''
+    compiler = Compiler(multitarget=True,
+                        trotterized=True,
+                        hadamard_power=True,
+                        power=True,
+                        controlled_phase=True,
+                        controlled_rotation=True)
+    compiled = compiler(unitary)
+
+    gates = []
+    rules = []
+    for i, g in enumerate(compiled.gates):
+        if g.is_parametrized() and len(g.extract_variables()) > 0:
+            if g.is_controlled():
+                raise TequilaException("controlled gate in gradient: Compiler was not called. Gate is {}".format(g))
+            if not hasattr(g, "shift"):
+                raise TequilaException("No shift found for gate {}".format(g))
+            shift_variable = Variable(name=("shift", i))
+            shifted = copy.deepcopy(g)
+            shifted._parameter = g._parameter + shift_variable
+            derivatives = parameter_derivatives(g.parameter)
+            rules.append((shift_variable, g.shift, derivatives))
+            g = shifted
+        gates.append(g)
+
+    return QCircuit(gates=gates), rules
+
+
+class BatchedGradient:
+    '''
+    Gradient of an objective with respect to all (or the given) variables which is evaluated in a single call
+    Create with grad(objective, method=...) and compile like objectives (tequila.compile)
+    The expectation values are differentiated by their backends (see BackendExpectationValue.gradient)
+    the outer derivatives of the objective transformations are taken as in grad
+    Methods:
+        'shift': parameter shift rule, the circuit is compiled once and only the shifted angles are changed
+        'adjoint': adjoint differentiation, one forward and one backward sweep through the circuit
+                   needs full wavefunction simulation and a backend which supports it (numpy, qulacs)
+    Calling the compiled gradient gives back a dictionary {variable: derivative}
+    '''
+
+    methods = ["shift", "adjoint"]
+
+    def __init__(self, objective: Objective, variables: typing.List[Variable] = None, method: str = "shift"):
+        if method not in self.methods:
+            raise TequilaException("unknown gradient method {}, supported are {}".format(method, self.methods))
+        if isinstance(objective, ExpectationValueImpl):
+            objective = Objective(args=[objective])
+        self.objective = objective
+        if variables is None:
+            variables = objective.extract_variables()
+        self.variables = [assign_variable(k) for k in variables]
+        self.method = method
+
+    def extract_variables(self) -> typing.List[Variable]:
+        return self.objective.extract_variables()
+
+    def __call__(self, variables, samples: int = None, *args, **kwargs) -> typing.Dict[Variable, float]:
+        variables = format_variable_dictionary(variables)
+        result = self.__batched_grad_objective(objective=self.objective, variables=variables, evaluated={},
+                                               samples=samples, *args, **kwargs)
+        return {k: result[k] if k in result else 0.0 for k in self.variables}
+
+    def __batched_grad_objective(self, objective: Objective, variables, evaluated: dict, *args, **kwargs) -> dict:
+        # avoid multiple evaluations of the same expectation values
+        need_values = objective._transformation is not None
+        values = []
+        gradients = []
+        for arg in objective.args:
+            if isinstance(arg, ExpectationValueImpl):
+                raise TequilaException("Tried to call uncompiled BatchedGradient, compile it with tq.compile")
+            elif hasattr(arg, "U"):
+                if arg not in evaluated:
+                    value = arg(variables, *args, **kwargs) if need_values else None
+                    evaluated[arg] = (value, arg.gradient(variables=variables, method=self.method, *args, **kwargs))
+                value, gradient = evaluated[arg]
+            elif isinstance(arg, Objective):
+                value = arg(variables, *args, **kwargs) if need_values else None
+                gradient = self.__batched_grad_objective(objective=arg, variables=variables, evaluated=evaluated,
+                                                         *args, **kwargs)
+            else:
+                value = arg(variables) if need_values else None
+                gradient = {arg: 1.0}
+            values.append(value)
+            gradients.append(gradient)
+
+        result = {}
+        for i, gradient in enumerate(gradients):
+            if not need_values:
+                outer = 1.0
+            elif __AUTOGRAD__BACKEND__ == "jax":
+                outer = jax.grad(objective.transformation, argnums=i)(*values)
+            elif __AUTOGRAD__BACKEND__ == "autograd":
+                outer = jax.grad(objective.transformation, argnum=i)(*values)
+            else:
+                raise TequilaException("Can't differentiate without autograd or jax")
+            for k, v in gradient.items():
+                if k in result:
+                    result[k] = result[k] + outer * v
+                else:
+                    result[k] = outer * v
+        return result
@@ -0,0 +1,144 @@
+import typing
+import numpy
+
+from tequila.circuit.circuit import QCircuit
+from tequila.circuit._gates_impl import QGateImpl, RotationGateImpl, PhaseGateImpl, ExponentialPauliGateImpl
+from tequila.utils import to_float
+
+"""
+Peephole optimization of compiled circuits
+Every gate is moved backwards through the gates it commutes with until it meets a gate it can be combined with:
+pairs of self-inverse gates cancel, rotations around the same axis (and exponential paulis with the same paulistring)
+are merged into one gate with the sum of the angles, rotations with vanishing fixed angles are removed
+"""
+
+_SELF_INVERSE = ["X", "Y", "Z", "H"]
+
+
+def local_basis(gate: QGateImpl, qubit) -> typing.Optional[str]:
+    """
+    :return: 'X', 'Y' or 'Z' if the gate acts on the qubit only with the identity and this pauli
+        (controls act with projectors and count as 'Z'), None otherwise
+    """
+    if qubit in gate.control:
+        return "Z"
+    if isinstance(gate, RotationGateImpl):
+        return gate.name[1].upper()
+    if isinstance(gate, PhaseGateImpl):
+        return "Z"
+    if isinstance(gate, ExponentialPauliGateImpl):
+        return gate.paulistring[qubit].upper()
+    if type(gate) is QGateImpl and gate.name in ["X", "Y", "Z"]:
+        return gate.name
+    return None
+
+
+def commute(first: QGateImpl, second: QGateImpl) -> bool:
+    """
+    Sufficient condition: on every shared qubit both gates act with the same pauli (see local_basis)
+    """
+    for q in set(first.qubits).intersection(second.qubits):
+        basis = local_basis(first, q)
+        if basis is None or basis != local_basis(second, q):
+            return False
+    return True
+
+
+def fixed_angle(gate: QGateImpl) -> typing.Optional[float]:
+    """
+    :return: the value of the parameter if it does not depend on variables, None otherwise
+    """
+    if len(gate.extract_variables()) > 0:
+        return None
+    return to_float(gate.parameter(variables={}))
+
+
+def add_parameters(first: QGateImpl, second: QGateImpl):
+    a = fixed_angle(first)
+    b = fixed_angle(second)
+    if a is not None and b is not None:
+        return a + b
+    return first.parameter + second.parameter
+
+
+def is_identity(gate: QGateImpl) -> bool:
+    if isinstance(gate, (RotationGateImpl, PhaseGateImpl, ExponentialPauliGateImpl)):
+        angle = fixed_angle(gate)
+        return angle is not None and numpy.isclose(angle, 0.0)
+    return False
+
+
+def combine(first: QGateImpl, second: QGateImpl):
+    """
+    :return: the gate which is equivalent to first followed by second, None if they cancel
+        and first if they can not be combined
+    """
+    if first.target != second.target or set(first.control) != set(second.control):
+        return first
+    if type(first) is QGateImpl and type(second) is QGateImpl:
+        if first.name == second.name and first.name in _SELF_INVERSE:
+            return None
+        return first
+    if isinstance(first, RotationGateImpl) and isinstance(second, RotationGateImpl) and first.axis == second.axis:
+        return RotationGateImpl(axis=first.axis, angle=add_parameters(first, second), target=first.target,
+                                control=first.control)
+    if isinstance(first, PhaseGateImpl) and isinstance(second, PhaseGateImpl):
+        return PhaseGateImpl(phase=add_parameters(first, second), target=first.target, control=first.control)
+    if isinstance(first, ExponentialPauliGateImpl) and isinstance(second, ExponentialPauliGateImpl):
+        if first.paulistring == second.paulistring and first.paulistring.coeff == second.paulistring.coeff:
+            return ExponentialPauliGateImpl(paulistring=first.paulistring, angle=add_parameters(first, second),
+                                            control=first.control)
+    return first
+
+
+def peephole_pass(gates: list) -> list:
+    """
+    One pass over the gates, see peephole_optimize
+    """
+    result = []
+    for gate in gates:
+        if is_identity(gate):
+            continue
+        qubits = set(gate.qubits)
+        position = None
+        for i in range(len(result) - 1, -1, -1):
+            other = result[i]
+            if other is None or qubits.isdisjoint(other.qubits):
+                continue
+            combined = combine(other, gate)
+            if combined is not other:
+                position = i
+                break
+            if not commute(other, gate):
+                break
+        if position is None:
+            result.append(gate)
+        elif combined is None or is_identity(combined):
+            result[position] = None
+        else:
+            result[position] = combined
+    return [g for g in result if g is not None]
+
+
+def peephole_optimize(circuit: QCircuit, max_passes: int = 10, silent: bool = True) -> QCircuit:
+    """
+    Cancel inverse pairs and merge rotations of a compiled circuit
+    :param circuit: the compiled circuit
+    :param max_passes: passes are repeated until the number of gates does not change anymore (at most max_passes)
+    :param silent: print gate counts and depth before and after if False
+    :return: the optimized circuit on the register of the given circuit (same n_qubits),
+        qubits whose gates all cancel are not in the qubits of the result anymore
+    """
+    gates = list(circuit.gates)
+    for _ in range(max_passes):
+        optimized = peephole_pass(gates)
+        done = len(optimized) == len(gates)
+        gates = optimized
+        if done:
+            break
+    result = QCircuit(gates=gates)
+    result.n_qubits = circuit.n_qubits
+    if not silent:
+        print("peephole: optimized circuit from {} gates (depth {}) to {} gates (depth {})".format(
+            len(circuit.gates), circuit.depth, len(result.gates), result.depth))
+    return result
@@ -1,2 +1,5 @@
 from tequila.hamiltonian.qubit_hamiltonian import PauliString, QubitHamiltonian
 from tequila.hamiltonian import paulis
+from tequila.hamiltonian.binary_hamiltonian import BinaryHamiltonian
+from tequila.hamiltonian.ketbra import KetBraHamiltonian
+from tequila.hamiltonian.grouping import MeasurementGroup, group_qubitwise_commuting
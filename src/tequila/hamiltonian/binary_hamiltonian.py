@@ -0,0 +1,381 @@
+import numbers
+import typing
+import itertools
+import numpy
+
+from tequila.hamiltonian.qubit_hamiltonian import PauliString, QubitHamiltonian
+from tequila import TequilaException
+from tequila.utils.bitstrings import parity
+
+from openfermion import QubitOperator
+
+"""
+Symplectic representation of sums of paulistrings
+Every paulistring is stored as two bit masks (x and z) packed into uint64 words, qubit q is bit q % 64 of word q // 64
+the pauli on the qubit is I (x=0,z=0), X (1,0), Y (1,1) or Z (0,1)
+All terms of a hamiltonian are rows of two (n_terms, n_words) arrays and a complex coefficient vector,
+so arithmetic works on whole arrays instead of single terms
+"""
+
+_POPCOUNT = numpy.array([bin(i).count("1") for i in range(256)], dtype=numpy.int64)
+
+
+def popcount(masks: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param masks: uint64 array of shape (..., n_words)
+    :return: number of set bits of every row, shape (...)
+    """
+    masks = numpy.ascontiguousarray(masks, dtype=numpy.uint64)
+    counts = _POPCOUNT[masks.view(numpy.uint8)]
+    return counts.reshape(masks.shape[:-1] + (-1,)).sum(axis=-1)
+
+
+def scatter_or(target: numpy.ndarray, index: numpy.ndarray, values: numpy.ndarray):
+    """
+    target[index] |= values for indices which appear several times (like numpy.bitwise_or.at, but sorted and reduced)
+    """
+    if len(index) == 0:
+        return
+    order = numpy.argsort(index, kind="stable")
+    index = index[order]
+    starts = numpy.flatnonzero(numpy.concatenate([[True], index[1:] != index[:-1]]))
+    target[index[starts]] |= numpy.bitwise_or.reduceat(values[order], starts)
+
+
+def n_words(n_qubits: int) -> int:
+    return max(1, (n_qubits + 63) // 64)
+
+
+class BinaryHamiltonian:
+    """
+    Sum of paulistrings in symplectic form, see the module description
+    Conversion from and to QubitHamiltonian (and openfermion) goes through from_qubit_hamiltonian and
+    to_qubit_hamiltonian, the converted hamiltonian is cached
+
+    Parameters
+    ----------
+    x: uint64 array of shape (n_terms, n_words) with the x bits of every paulistring
+    z: uint64 array of shape (n_terms, n_words) with the z bits of every paulistring
+    coeffs: coefficients of the paulistrings
+    """
+
+    def __init__(self, x: numpy.ndarray, z: numpy.ndarray, coeffs: numpy.ndarray):
+        self.x = numpy.asarray(x, dtype=numpy.uint64)
+        self.z = numpy.asarray(z, dtype=numpy.uint64)
+        self.coeffs = numpy.asarray(coeffs, dtype=numpy.complex128).reshape(-1)
+        if self.x.ndim != 2 or self.x.shape != self.z.shape or self.x.shape[0] != len(self.coeffs):
+            raise TequilaException(
+                "BinaryHamiltonian: x and z need shape (n_terms, n_words) and one coefficient per term, got {}, {} and {}"
+                    .format(self.x.shape, self.z.shape, self.coeffs.shape))
+        self._qubit_hamiltonian = None
+
+    @classmethod
+    def zero(cls, n_qubits: int = 1):
+        words = n_words(n_qubits)
+        return cls(x=numpy.zeros((0, words)), z=numpy.zeros((0, words)), coeffs=numpy.zeros(0))
+
+    @classmethod
+    def unit(cls, n_qubits: int = 1):
+        words = n_words(n_qubits)
+        return cls(x=numpy.zeros((1, words)), z=numpy.zeros((1, words)), coeffs=numpy.ones(1))
+
+    @classmethod
+    def from_openfermion(cls, qubit_operator: QubitOperator, n_qubits: int = None):
+        """
+        :param qubit_operator: the openfermion QubitOperator
+        :param n_qubits: size of the masks, default is given by the largest qubit index
+        """
+        terms = qubit_operator.terms
+        keys = list(terms.keys())
+        factors = list(itertools.chain.from_iterable(keys))
+        rows = numpy.repeat(numpy.arange(len(keys)), numpy.fromiter(map(len, keys), dtype=numpy.int64, count=len(keys)))
+        qubits = numpy.fromiter((f[0] for f in factors), dtype=numpy.int64, count=len(factors))
+        # unicode code points, upper case by clearing the 0x20 bit
+        paulis = numpy.array([f[1] for f in factors], dtype="U1").view(numpy.uint32) & ~numpy.uint32(0x20)
+        max_qubit = int(qubits.max()) + 1 if len(qubits) > 0 else 1
+        if n_qubits is None:
+            n_qubits = max_qubit
+        elif n_qubits < max_qubit:
+            raise TequilaException(
+                "BinaryHamiltonian: operator acts on qubit {} but n_qubits={}".format(max_qubit - 1, n_qubits))
+
+        words = n_words(n_qubits)
+        x = numpy.zeros((len(terms), words), dtype=numpy.uint64)
+        z = numpy.zeros((len(terms), words), dtype=numpy.uint64)
+        if len(rows) > 0:
+            bits = numpy.left_shift(numpy.uint64(1), (qubits % 64).astype(numpy.uint64))
+            xbits = (paulis == ord("X")) | (paulis == ord("Y"))
+            zbits = (paulis == ord("Z")) | (paulis == ord("Y"))
+            if not numpy.all(xbits | zbits):
+                unknown = set(f[1] for f, known in zip(factors, xbits | zbits) if not known)
+                raise TequilaException("BinaryHamiltonian: unknown paulis {}".format(unknown))
+            index = rows * words + qubits // 64
+            scatter_or(x.reshape(-1), index[xbits], bits[xbits])
+            scatter_or(z.reshape(-1), index[zbits], bits[zbits])
+        coeffs = numpy.fromiter(terms.values(), dtype=numpy.complex128, count=len(terms))
+        return cls(x=x, z=z, coeffs=coeffs)
+
+    @classmethod
+    def from_qubit_hamiltonian(cls, hamiltonian: QubitHamiltonian, n_qubits: int = None):
+        return cls.from_openfermion(qubit_operator=hamiltonian.qubit_operator, n_qubits=n_qubits)
+
+    @classmethod
+    def from_paulistrings(cls, paulistrings: typing.List[PauliString], n_qubits: int = None):
+        operator = QubitOperator.zero()
+        for ps in paulistrings:
+            operator.terms[ps.key_openfermion()] = operator.terms.get(ps.key_openfermion(), 0.0) + ps.coeff
+        return cls.from_openfermion(qubit_operator=operator, n_qubits=n_qubits).simplify()
+
+    def bits(self) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :return: the x and z masks unpacked into boolean arrays of shape (n_terms, n_qubits)
+        """
+        n_qubits = self.n_qubits
+        qubits = numpy.arange(n_qubits)
+        shifts = (qubits % 64).astype(numpy.uint64)
+        x = (self.x[:, qubits // 64] >> shifts) & numpy.uint64(1)
+        z = (self.z[:, qubits // 64] >> shifts) & numpy.uint64(1)
+        return x.astype(bool), z.astype(bool)
+
+    def integer_masks(self, n_qubits: int = None) -> typing.Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Masks of the paulistrings on the integers of the computational basis states (MSB numbering like
+        QubitWaveFunction and to_matrix, qubit q is bit n_qubits - 1 - q)
+        P|i> = coeff * (-1)^popcount(i & z) |i ^ x>
+        :param n_qubits: size of the register, default is self.n_qubits
+        :return: integer x masks, integer z masks and the coefficients (including the factors i of the Y paulis)
+        """
+        if n_qubits is None:
+            n_qubits = self.n_qubits
+        if n_qubits < self.n_qubits or n_qubits > 62:
+            raise TequilaException("integer masks need {} <= n_qubits <= 62, got n_qubits={}"
+                                   .format(self.n_qubits, n_qubits))
+        x, z = self.bits()
+        weights = numpy.left_shift(1, n_qubits - 1 - numpy.arange(x.shape[1])).astype(numpy.int64)
+        xmasks = x.astype(numpy.int64) @ weights
+        zmasks = z.astype(numpy.int64) @ weights
+        coeffs = self.coeffs * numpy.array([1.0, 1.0j, -1.0, -1.0j])[numpy.sum(x & z, axis=1) % 4]
+        return xmasks, zmasks, coeffs
+
+    def to_sparse(self, n_qubits: int = None):
+        """
+        Every paulistring is a signed permutation with one entry per row at column row ^ x,
+        paulistrings with the same x mask share the pattern, so the matrix has at most one entry per x mask and row
+        :param n_qubits: size of the register, default is self.n_qubits
+        :return: the hamiltonian as scipy.sparse.csr_matrix of shape (2**n_qubits, 2**n_qubits)
+        """
+        import scipy.sparse
+        if n_qubits is None:
+            n_qubits = self.n_qubits
+        xmasks, zmasks, coeffs = self.integer_masks(n_qubits=n_qubits)
+        dimension = 2 ** n_qubits
+        rows = numpy.arange(dimension, dtype=numpy.int64)
+        patterns, inverse = numpy.unique(xmasks, return_inverse=True)
+        data = numpy.zeros((dimension, len(patterns)), dtype=numpy.complex128)
+        for k in range(len(coeffs)):
+            columns = rows ^ xmasks[k]
+            data[:, inverse[k]] += coeffs[k] * (1 - 2 * parity(columns & zmasks[k]))
+        indices = rows[:, None] ^ patterns[None, :]
+        indptr = numpy.arange(0, dimension * len(patterns) + 1, len(patterns), dtype=numpy.int64)
+        matrix = scipy.sparse.csr_matrix((data.reshape(-1), indices.reshape(-1), indptr), shape=(dimension, dimension))
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        return matrix
+
+    def to_linear_operator(self, n_qubits: int = None):
+        """
+        Matrix free view of the hamiltonian, every product applies the paulistrings on the vector
+        :param n_qubits: size of the register, default is self.n_qubits
+        :return: scipy.sparse.linalg.LinearOperator of shape (2**n_qubits, 2**n_qubits)
+        """
+        import scipy.sparse.linalg
+        if n_qubits is None:
+            n_qubits = self.n_qubits
+        xmasks, zmasks, coeffs = self.integer_masks(n_qubits=n_qubits)
+        dimension = 2 ** n_qubits
+        rows = numpy.arange(dimension, dtype=numpy.int64)
+
+        def apply(vector, coefficients):
+            vector = numpy.asarray(vector).reshape(-1)
+            result = numpy.zeros(dimension, dtype=numpy.result_type(vector, numpy.complex128))
+            for x, z, c in zip(xmasks, zmasks, coefficients):
+                columns = rows ^ x
+                result += c * (1 - 2 * parity(columns & z)) * vector[columns]
+            return result
+
+        # the paulistrings are hermitian, the adjoint only conjugates the coefficients (not the factors i of the Y)
+        adjoint = coeffs.conjugate() * (1 - 2 * parity(xmasks & zmasks))
+        return scipy.sparse.linalg.LinearOperator(shape=(dimension, dimension), dtype=numpy.complex128,
+                                                  matvec=lambda v: apply(v, coeffs),
+                                                  rmatvec=lambda v: apply(v, adjoint))
+
+    @property
+    def qubit_operator(self) -> QubitOperator:
+        """
+        :return: the hamiltonian as openfermion QubitOperator, so it can be combined with QubitHamiltonians
+        """
+        return self.to_openfermion()
+
+    def to_openfermion(self) -> QubitOperator:
+        return self.to_qubit_hamiltonian().qubit_operator
+
+    def to_qubit_hamiltonian(self) -> QubitHamiltonian:
+        """
+        :return: the hamiltonian as QubitHamiltonian (converted once and cached, do not modify it)
+        """
+        if self._qubit_hamiltonian is None:
+            x, z = self.bits()
+            rows, qubits = numpy.nonzero(x | z)
+            paulis = numpy.array(["X", "Z", "Y"])[x[rows, qubits] + 2 * z[rows, qubits] - 1].tolist()
+            factors = list(zip(qubits.tolist(), paulis))
+            bounds = numpy.searchsorted(rows, numpy.arange(len(self) + 1)).tolist()
+            terms = {}
+            # real coefficients stay real (like in hamiltonians created from strings)
+            coeffs = self.coeffs.real if numpy.all(self.coeffs.imag == 0.0) else self.coeffs
+            for i, coeff in enumerate(coeffs.tolist()):
+                key = tuple(factors[bounds[i]:bounds[i + 1]])
+                terms[key] = terms.get(key, 0.0) + coeff
+            operator = QubitOperator.zero()
+            operator.terms = terms
+            self._qubit_hamiltonian = QubitHamiltonian(qubit_hamiltonian=operator)
+        return self._qubit_hamiltonian
+
+    @property
+    def paulistrings(self) -> typing.List[PauliString]:
+        return self.to_qubit_hamiltonian().paulistrings
+
+    @property
+    def n_qubits(self) -> int:
+        """
+        :return: largest qubit index the hamiltonian acts on plus one (same convention as QubitHamiltonian)
+        """
+        masks = numpy.bitwise_or.reduce(self.x | self.z, axis=0) if len(self) > 0 else numpy.zeros(1, numpy.uint64)
+        for word in range(len(masks) - 1, -1, -1):
+            if masks[word] != 0:
+                return 64 * word + int(masks[word]).bit_length()
+        return 1
+
+    @property
+    def qubits(self) -> typing.List[int]:
+        masks = numpy.bitwise_or.reduce(self.x | self.z, axis=0) if len(self) > 0 else []
+        return [64 * w + b for w, m in enumerate(masks) for b in range(64) if (int(m) >> b) & 1]
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def __repr__(self):
+        return "BinaryHamiltonian({} terms on {} qubits)".format(len(self), self.n_qubits)
+
+    def __str__(self):
+        return str(self.to_qubit_hamiltonian())
+
+    def padded(self, words: int):
+        """
+        :return: the hamiltonian with masks of the given number of words
+        """
+        if words == self.x.shape[1]:
+            return self
+        if words < self.x.shape[1]:
+            raise TequilaException("BinaryHamiltonian: can not shrink masks")
+        padding = ((0, 0), (0, words - self.x.shape[1]))
+        return BinaryHamiltonian(x=numpy.pad(self.x, padding), z=numpy.pad(self.z, padding), coeffs=self.coeffs)
+
+    def _aligned(self, other):
+        if isinstance(other, numbers.Number):
+            other = BinaryHamiltonian.unit() * other
+        elif isinstance(other, QubitHamiltonian):
+            other = BinaryHamiltonian.from_qubit_hamiltonian(other)
+        words = max(self.x.shape[1], other.x.shape[1])
+        return self.padded(words), other.padded(words)
+
+    def simplify(self, threshold: float = 0.0):
+        """
+        Merge equal paulistrings and remove terms with coefficients not larger than the threshold
+        :return: new BinaryHamiltonian with unique paulistrings (sorted by their masks)
+        """
+        if len(self) == 0:
+            return self
+        words = self.x.shape[1]
+        keys = numpy.concatenate([self.x, self.z], axis=1)
+        order = numpy.lexsort(keys.T[::-1])
+        keys = keys[order]
+        first = numpy.ones(len(keys), dtype=bool)
+        first[1:] = numpy.any(keys[1:] != keys[:-1], axis=1)
+        groups = numpy.cumsum(first) - 1
+        coeffs = self.coeffs[order]
+        coeffs = numpy.bincount(groups, weights=coeffs.real) + 1.0j * numpy.bincount(groups, weights=coeffs.imag)
+        keys = keys[first]
+        keep = numpy.abs(coeffs) > threshold
+        return BinaryHamiltonian(x=keys[keep, :words], z=keys[keep, words:], coeffs=coeffs[keep])
+
+    def __add__(self, other):
+        first, second = self._aligned(other)
+        return BinaryHamiltonian(x=numpy.concatenate([first.x, second.x]), z=numpy.concatenate([first.z, second.z]),
+                                 coeffs=numpy.concatenate([first.coeffs, second.coeffs])).simplify()
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __neg__(self):
+        return BinaryHamiltonian(x=self.x, z=self.z, coeffs=-self.coeffs)
+
+    def __sub__(self, other):
+        return self.__add__(-other)
+
+    def __rsub__(self, other):
+        return self.__neg__().__add__(other)
+
+    def _products(self, other):
+        """
+        :return: masks and coefficients of all products of terms in self (rows) with terms in other (columns)
+            and a boolean matrix which is True where the two terms anticommute
+        """
+        first, second = self._aligned(other)
+        x1, z1 = first.x[:, None, :], first.z[:, None, :]
+        x2, z2 = second.x[None, :, :], second.z[None, :, :]
+        x = x1 ^ x2
+        z = z1 ^ z2
+        # P(x,z) = i^(x.z) X^x Z^z, moving Z^z1 past X^x2 gives (-1)^(z1.x2)
+        phase = popcount(x1 & z1) + popcount(x2 & z2) + 2 * popcount(z1 & x2) - popcount(x & z)
+        phases = numpy.array([1.0, 1.0j, -1.0, -1.0j])[phase % 4]
+        coeffs = first.coeffs[:, None] * second.coeffs[None, :] * phases
+        anticommuting = (popcount(x1 & z2) + popcount(z1 & x2)) % 2 == 1
+        return x, z, coeffs, anticommuting
+
+    def __mul__(self, other):
+        if isinstance(other, numbers.Number):
+            return BinaryHamiltonian(x=self.x, z=self.z, coeffs=self.coeffs * other)
+        x, z, coeffs, _ = self._products(other)
+        words = x.shape[-1]
+        return BinaryHamiltonian(x=x.reshape(-1, words), z=z.reshape(-1, words), coeffs=coeffs.reshape(-1)).simplify()
+
+    def __rmul__(self, other):
+        if isinstance(other, numbers.Number):
+            return self.__mul__(other)
+        return BinaryHamiltonian.from_qubit_hamiltonian(other).__mul__(self)
+
+    def commutator(self, other):
+        """
+        :return: self*other - other*self, only pairs of anticommuting paulistrings contribute (twice their product)
+        """
+        x, z, coeffs, anticommuting = self._products(other)
+        return BinaryHamiltonian(x=x[anticommuting], z=z[anticommuting], coeffs=2.0 * coeffs[anticommuting]).simplify()
+
+    def commuting_terms(self, other) -> numpy.ndarray:
+        """
+        :return: boolean matrix of shape (len(self), len(other)), True where the paulistrings commute
+        """
+        return ~self._products(other)[3]
+
+    def dagger(self):
+        return BinaryHamiltonian(x=self.x, z=self.z, coeffs=self.coeffs.conjugate())
+
+    def is_hermitian(self, threshold: float = 0.0) -> bool:
+        return bool(numpy.all(numpy.abs(self.simplify().coeffs.imag) <= threshold))
+
+    def __eq__(self, other):
+        if not isinstance(other, BinaryHamiltonian):
+            return False
+        first, second = self.simplify()._aligned(other.simplify())
+        return first.x.shape == second.x.shape and numpy.array_equal(first.x, second.x) and \
+               numpy.array_equal(first.z, second.z) and numpy.allclose(first.coeffs, second.coeffs)
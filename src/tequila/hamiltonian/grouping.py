@@ -0,0 +1,74 @@
+import typing
+
+from tequila.hamiltonian.qubit_hamiltonian import PauliString, QubitHamiltonian
+from tequila import TequilaException
+
+"""
+Measurement grouping: partition the paulistrings of a hamiltonian into sets
+which can be estimated from the same shots
+"""
+
+
+class MeasurementGroup:
+    """
+    Paulistrings which commute qubit-wise: on every qubit they act with the same pauli (or not at all)
+    They are all diagonal after the same single qubit basis changes and are measured together
+    basis is a dictionary {qubit: pauli} with the union of all paulistrings in the group
+    """
+
+    def __init__(self, paulistrings: typing.List[PauliString] = None):
+        self.basis = {}
+        self.paulistrings = []
+        if paulistrings is not None:
+            for ps in paulistrings:
+                self.add(ps)
+
+    @property
+    def qubits(self):
+        return sorted(self.basis.keys())
+
+    def compatible(self, paulistring: PauliString) -> bool:
+        """
+        :return: True if the paulistring commutes qubit-wise with all paulistrings in the group
+        """
+        for q, p in paulistring.items():
+            if self.basis.get(q, p).upper() != p.upper():
+                return False
+        return True
+
+    def add(self, paulistring: PauliString):
+        if not self.compatible(paulistring):
+            raise TequilaException(
+                "paulistring {} can not be measured in the basis {}".format(paulistring, self.basis))
+        for q, p in paulistring.items():
+            self.basis[q] = p.upper()
+        self.paulistrings.append(paulistring)
+
+    def __len__(self):
+        return len(self.paulistrings)
+
+    def __repr__(self):
+        return "MeasurementGroup(basis={}, paulistrings={})".format(self.basis, self.paulistrings)
+
+
+def group_qubitwise_commuting(H: typing.Union[QubitHamiltonian, typing.List[PauliString]]) -> typing.List[
+    MeasurementGroup]:
+    """
+    Greedy partition into qubit-wise commuting groups
+    Paulistrings with large coefficients are placed first, each paulistring joins the first compatible group
+    :param H: QubitHamiltonian or list of PauliStrings
+    :return: list of MeasurementGroups, every paulistring is in exactly one group
+    """
+    if isinstance(H, QubitHamiltonian):
+        paulistrings = H.paulistrings
+    else:
+        paulistrings = list(H)
+    groups = []
+    for ps in sorted(paulistrings, key=lambda x: -abs(x.coeff)):
+        for group in groups:
+            if group.compatible(ps):
+                group.add(ps)
+                break
+        else:
+            groups.append(MeasurementGroup(paulistrings=[ps]))
+    return groups
@@ -0,0 +1,177 @@
+import typing
+import numpy
+
+from tequila.hamiltonian.qubit_hamiltonian import QubitHamiltonian
+from tequila.hamiltonian.binary_hamiltonian import BinaryHamiltonian
+from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+from tequila.utils.bitstrings import reverse_bits
+from tequila.utils.structure import structural_key
+from tequila import TequilaException
+
+from openfermion.config import EQ_TOLERANCE
+
+"""
+Operators |ket><bra| given by two wavefunctions
+The pauli coefficients are c(x,z) = <bra|P(x,z)|ket> / 2^n, for fixed x mask this is the Walsh-Hadamard transform
+of f_x(i) = conj(bra(i ^ x)) ket(i) evaluated at z (up to the factors i of the Y paulis), so all coefficients
+with the same x mask are computed together
+KetBraHamiltonian keeps the wavefunctions and computes the pauli form only when it is needed,
+simulators evaluate it directly as <state|ket><bra|state>
+"""
+
+# maximal number of entries of the arrays which are transformed together
+WALSH_HADAMARD_CHUNK = 2 ** 22
+
+
+def walsh_hadamard(array: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param array: array of shape (m, 2^n)
+    :return: the unnormalized Walsh-Hadamard transform of every row, result[z] = sum_i (-1)^popcount(i & z) array[i]
+    """
+    m, dimension = array.shape
+    result = array
+    h = 1
+    while h < dimension:
+        result = result.reshape(m, -1, 2, h)
+        result = numpy.stack([result[:, :, 0] + result[:, :, 1], result[:, :, 0] - result[:, :, 1]], axis=2)
+        h *= 2
+    return result.reshape(m, dimension)
+
+
+def wavefunction_arrays(wfn, n_qubits: int = None) -> typing.Tuple[int, numpy.ndarray, numpy.ndarray]:
+    """
+    :param wfn: QubitWaveFunction (or anything QubitWaveFunction can be initialized with)
+    :return: number of qubits, integers of the basis states (MSB numbering) and amplitudes
+    """
+    if not isinstance(wfn, QubitWaveFunction):
+        wfn = QubitWaveFunction(state=wfn, n_qubits=n_qubits)
+    indices, amplitudes = wfn.to_arrays()
+    n = wfn.n_qubits if n_qubits is None else max(n_qubits, wfn.n_qubits)
+    return n, numpy.asarray(indices, dtype=numpy.int64), numpy.asarray(amplitudes, dtype=numpy.complex128)
+
+
+def ketbra_pauli_form(ket, bra, threshold: float = 0.0, n_qubits: int = None) -> QubitHamiltonian:
+    """
+    Pauli decomposition of |ket><bra|
+    :param ket: QubitWaveFunction (or anything QubitWaveFunction can be initialized with)
+    :param bra: QubitWaveFunction (or anything QubitWaveFunction can be initialized with)
+    :param threshold: products of amplitudes conj(bra(j)) ket(i) which are not larger are ignored
+    :param n_qubits: only needed if ket or bra are given as integers
+    :return: QubitHamiltonian
+    """
+    n_ket, ket_indices, ket_amplitudes = wavefunction_arrays(ket, n_qubits=n_qubits)
+    n_bra, bra_indices, bra_amplitudes = wavefunction_arrays(bra, n_qubits=n_qubits)
+    n = max(n_ket, n_bra)
+    if n > 30:
+        raise TequilaException("pauli form of |ket><bra| on {} qubits is too large".format(n))
+    # the first qubit is the most significant bit
+    ket_indices = ket_indices << (n - n_ket)
+    bra_indices = bra_indices << (n - n_bra)
+    dimension = 2 ** n
+    ket_dense = numpy.zeros(dimension, dtype=numpy.complex128)
+    ket_dense[ket_indices] = ket_amplitudes
+    bra_dense = numpy.zeros(dimension, dtype=numpy.complex128)
+    bra_dense[bra_indices] = bra_amplitudes
+
+    xmasks = numpy.unique(ket_indices[:, None] ^ bra_indices[None, :])
+    rows = numpy.arange(dimension, dtype=numpy.int64)
+    chunk = max(1, WALSH_HADAMARD_CHUNK // dimension)
+    x, z, coeffs = [], [], []
+    for start in range(0, len(xmasks), chunk):
+        masks = xmasks[start:start + chunk]
+        f = bra_dense[rows[None, :] ^ masks[:, None]].conjugate() * ket_dense[None, :]
+        if threshold > 0.0:
+            f[numpy.abs(f) <= threshold] = 0.0
+        transformed = walsh_hadamard(f) / dimension
+        # like the addition of openfermion operators, which drops terms below EQ_TOLERANCE
+        i, j = numpy.nonzero(numpy.abs(transformed) > EQ_TOLERANCE)
+        x.append(masks[i])
+        z.append(j.astype(numpy.int64))
+        coeffs.append(transformed[i, j])
+    x = numpy.concatenate(x) if len(x) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    z = numpy.concatenate(z) if len(z) > 0 else numpy.zeros(0, dtype=numpy.int64)
+    coeffs = numpy.concatenate(coeffs) if len(coeffs) > 0 else numpy.zeros(0, dtype=numpy.complex128)
+    # P(x,z) = i^ny X^x Z^z, so <bra|X^x Z^z|ket> = i^ny <bra|P|ket> with the hermitian P
+    ny = numpy.asarray([bin(v).count("1") for v in (x & z).tolist()], dtype=numpy.int64)
+    coeffs = coeffs * numpy.array([1.0, 1.0j, -1.0, -1.0j])[ny % 4]
+    # BinaryHamiltonian stores qubit q in bit q
+    binary = BinaryHamiltonian(x=reverse_bits(x, n)[:, None], z=reverse_bits(z, n)[:, None], coeffs=coeffs)
+    return binary.to_qubit_hamiltonian()
+
+
+class KetBraHamiltonian(QubitHamiltonian):
+    """
+    The operator |ket><bra| (or its hermitian part (|ket><bra| + |bra><ket|)/2) in lazy form
+    The pauli form (qubit_operator, paulistrings, ...) is computed when it is accessed the first time,
+    expectation values in simulators are computed from the wavefunctions without it (see CompiledKetBra)
+
+    Parameters
+    ----------
+    ket: QubitWaveFunction
+    bra: QubitWaveFunction
+    hermitian: if True the operator is the hermitian part of |ket><bra|
+    threshold: threshold for the pauli form (see ketbra_pauli_form)
+    n_qubits: size of the register of the wavefunctions
+    """
+
+    def __init__(self, ket, bra, hermitian: bool = False, threshold: float = 0.0, n_qubits: int = None):
+        n_ket, ket_indices, ket_amplitudes = wavefunction_arrays(ket, n_qubits=n_qubits)
+        n_bra, bra_indices, bra_amplitudes = wavefunction_arrays(bra, n_qubits=n_qubits)
+        n = max(n_ket, n_bra)
+        self.ket = QubitWaveFunction()._set_sparse(indices=ket_indices << (n - n_ket), amplitudes=ket_amplitudes,
+                                                   n_qubits=n)
+        self.bra = QubitWaveFunction()._set_sparse(indices=bra_indices << (n - n_bra), amplitudes=bra_amplitudes,
+                                                   n_qubits=n)
+        self.hermitian = hermitian
+        self.threshold = threshold
+        self._qubit_operator = None
+
+    @property
+    def qubit_operator(self):
+        if self._qubit_operator is None:
+            H = ketbra_pauli_form(ket=self.ket, bra=self.bra, threshold=self.threshold)
+            if self.hermitian:
+                H = H.split()[0]
+            self._qubit_operator = H.qubit_operator
+        return self._qubit_operator
+
+    @qubit_operator.setter
+    def qubit_operator(self, other):
+        raise TequilaException("KetBraHamiltonian can not be modified, "
+                               "convert it with QubitHamiltonian(qubit_hamiltonian=H.qubit_operator) first")
+
+    # in-place arithmetic gives new QubitHamiltonians, the ket and bra would not describe the result anymore
+    def __iadd__(self, other):
+        return self.__add__(other)
+
+    def __isub__(self, other):
+        return self.__sub__(other)
+
+    def __imul__(self, other):
+        return self.__mul__(other)
+
+    @property
+    def n_qubits(self):
+        return self.ket.n_qubits
+
+    @property
+    def qubits(self):
+        return list(range(self.n_qubits))
+
+    @property
+    def stored_terms(self) -> int:
+        """
+        :return: number of stored amplitudes (the pauli form can have up to 4^n_qubits terms)
+        """
+        return len(self.ket) + len(self.bra)
+
+    def structural_key(self) -> tuple:
+        return ("KetBraHamiltonian", structural_key(self.ket.to_arrays()), structural_key(self.bra.to_arrays()),
+                self.ket.n_qubits, self.hermitian, self.threshold)
+
+    def expectation_value(self, wfn: QubitWaveFunction):
+        """
+        :return: <wfn|ket><bra|wfn> (the real part for the hermitian operator)
+        """
+        value = wfn.inner(self.ket) * self.bra.inner(wfn)
+        return value.real if self.hermitian else value
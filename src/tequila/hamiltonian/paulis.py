@@ -5,10 +5,10 @@ Currently uses OpenFermion as backend (QubitOperators)
 """
 import typing
 from tequila.hamiltonian import QubitHamiltonian
+from tequila.hamiltonian.ketbra import KetBraHamiltonian, ketbra_pauli_form
 from tequila import BitString, TequilaException
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.tools import list_assignement
-import numpy
 
 
 def pauli(qubit, type) -> QubitHamiltonian:
@@ -226,7 +226,7 @@ def Sm(qubit) -> QubitHamiltonian:
     return result
 
 
-def Projector(wfn, threshold=0.0, n_qubits=None) -> QubitHamiltonian:
+def Projector(wfn, threshold=0.0, n_qubits=None, lazy: bool = False) -> QubitHamiltonian:
     """
     Notes
     ----------
@@ -249,25 +249,25 @@ def Projector(wfn, threshold=0.0, n_qubits=None) -> QubitHamiltonian:
 
     n_qubits: only needed when an integer is given as wavefunction
 
+    lazy: bool: (Default value = False)
+        keep the projector as wavefunction (KetBraHamiltonian), simulators evaluate it as
+        |<wfn|state>|^2 and the paulistrings are only computed if needed
+
     Returns
     -------
 
     """
 
-    wfn = QubitWaveFunction(state=wfn, n_qubits=n_qubits)
+    if lazy:
+        return KetBraHamiltonian(ket=wfn, bra=wfn, hermitian=True, threshold=threshold, n_qubits=n_qubits)
 
-    H = QubitHamiltonian.zero()
-    for k1, v1 in wfn.items():
-        for k2, v2 in wfn.items():
-            c = v1.conjugate() * v2
-            if not numpy.isclose(c, 0.0, atol=threshold):
-                H += c * decompose_transfer_operator(bra=k1, ket=k2)
+    H = ketbra_pauli_form(ket=wfn, bra=wfn, threshold=threshold, n_qubits=n_qubits)
     assert (H.is_hermitian())
     return H
 
 
 def KetBra(ket: QubitWaveFunction, bra: QubitWaveFunction, hermitian: bool = False, threshold: float = 1.e-6,
-           n_qubits=None):
+           n_qubits=None, lazy: bool = False):
     """
     Notes
     ----------
@@ -294,21 +294,19 @@ def KetBra(ket: QubitWaveFunction, bra: QubitWaveFunction, hermitian: bool = Fal
     threshold: float: (Default 1.e-6)
          elements smaller than the threshold will be ignored
     n_qubits: only needed if ket and/or bra are passed down as integers
+    lazy: bool: (Default False)
+         keep the operator as wavefunctions (KetBraHamiltonian), simulators evaluate it as
+         <state|ket><bra|state> and the paulistrings are only computed if needed
 
     Returns
     -------
     a tequila QubitHamiltonian (not necessarily hermitian)
 
     """
-    H = QubitHamiltonian.zero()
-    ket = QubitWaveFunction(state=ket, n_qubits=n_qubits)
-    bra = QubitWaveFunction(state=bra, n_qubits=n_qubits)
-
-    for k1, v1 in bra.items():
-        for k2, v2 in ket.items():
-            c = v1.conjugate() * v2
-            if not numpy.isclose(c, 0.0, atol=threshold):
-                H += c * decompose_transfer_operator(bra=k1, ket=k2)
+    if lazy:
+        return KetBraHamiltonian(ket=ket, bra=bra, hermitian=hermitian, threshold=threshold, n_qubits=n_qubits)
+
+    H = ketbra_pauli_form(ket=ket, bra=bra, threshold=threshold, n_qubits=n_qubits)
     if hermitian:
         return H.split()[0]
     else:
@@ -245,7 +245,7 @@ class QubitHamiltonian:
         assert (isinstance(self._qubit_operator, QubitOperator))
 
     def __len__(self):
-        return len(self._qubit_operator.terms)
+        return len(self.qubit_operator.terms)
 
     def __repr__(self):
         result = ""
@@ -254,20 +254,20 @@ class QubitHamiltonian:
         return result
 
     def __getitem__(self, item):
-        return self._qubit_operator.terms[item]
+        return self.qubit_operator.terms[item]
 
     def __setitem__(self, key, value):
-        self._qubit_operator.terms[key] = value
+        self.qubit_operator.terms[key] = value
         return self
 
     def items(self):
-        return self._qubit_operator.terms.items()
+        return self.qubit_operator.terms.items()
 
     def keys(self):
-        return self._qubit_operator.terms.keys()
+        return self.qubit_operator.terms.keys()
 
     def values(self):
-        return self._qubit_operator.terms.values()
+        return self.qubit_operator.terms.values()
 
     @classmethod
     def zero(cls):
@@ -394,7 +394,7 @@ class QubitHamiltonian:
         return self.__mul__(other=-1.0)
 
     def __eq__(self, other):
-        return self._qubit_operator == other._qubit_operator
+        return self.qubit_operator == other.qubit_operator
 
     def is_hermitian(self):
         try:
@@ -409,7 +409,7 @@ class QubitHamiltonian:
         for k, v in self.qubit_operator.terms.items():
             if not numpy.isclose(v, 0.0, atol=threshold):
                 simplified[k] = v
-        self._qubit_operator.terms = simplified
+        self.qubit_operator.terms = simplified
         return self
 
     def split(self, *args, **kwargs) -> tuple:
@@ -434,7 +434,7 @@ class QubitHamiltonian:
 
     def conjugate(self):
         conj_hamiltonian = QubitOperator("", 0)
-        for key, value in self._qubit_operator.terms.items():
+        for key, value in self.qubit_operator.terms.items():
             sign = 1
             for term in key:
                 p = self.pauli(term)
@@ -446,7 +446,7 @@ class QubitHamiltonian:
 
     def transpose(self):
         trans_hamiltonian = QubitOperator("", 0)
-        for key, value in self._qubit_operator.terms.items():
+        for key, value in self.qubit_operator.terms.items():
             sign = 1
             for term in key:
                 p = self.pauli(term)
@@ -458,13 +458,13 @@ class QubitHamiltonian:
 
     def dagger(self):
         dag_hamiltonian = QubitOperator("", 0)
-        for key, value in self._qubit_operator.terms.items():
+        for key, value in self.qubit_operator.terms.items():
             dag_hamiltonian.terms[key] = value.conjugate()
 
         return QubitHamiltonian(qubit_hamiltonian=dag_hamiltonian)
 
     def normalize(self):
-        self._qubit_operator.renormalize()
+        self.qubit_operator.renormalize()
         return self
 
     def to_matrix(self):
@@ -473,6 +473,7 @@ class QubitHamiltonian:
 
         Returns a dense 2**N x 2**N matrix representation of this
         QubitHamiltonian. Watch for memory usage when N is >12!
+        For larger N use to_sparse or to_linear_operator
         
         :return: numpy.ndarray(2**N, 2**N) with type numpy.complex
         """
@@ -489,6 +490,28 @@ class QubitHamiltonian:
             Hm += val * reduce(numpy.kron, term)
         return Hm
 
+    def to_sparse(self, n_qubits: int = None):
+        """
+        Returns the Hamiltonian as sparse matrix (same basis ordering as to_matrix)
+        Built from the binary masks of the paulistrings without dense intermediates
+
+        :param n_qubits: size of the register, defaults to self.n_qubits
+        :return: scipy.sparse.csr_matrix(2**N, 2**N) with type numpy.complex128
+        """
+        from tequila.hamiltonian.binary_hamiltonian import BinaryHamiltonian
+        return BinaryHamiltonian.from_qubit_hamiltonian(self).to_sparse(n_qubits=n_qubits)
+
+    def to_linear_operator(self, n_qubits: int = None):
+        """
+        Returns the Hamiltonian as matrix free scipy.sparse.linalg.LinearOperator (same basis ordering as to_matrix)
+        Use it for products with large vectors (e.g. in scipy.sparse.linalg.eigsh) when the sparse matrix is too large
+
+        :param n_qubits: size of the register, defaults to self.n_qubits
+        :return: scipy.sparse.linalg.LinearOperator of shape (2**N, 2**N)
+        """
+        from tequila.hamiltonian.binary_hamiltonian import BinaryHamiltonian
+        return BinaryHamiltonian.from_qubit_hamiltonian(self).to_linear_operator(n_qubits=n_qubits)
+
     @property
     def n_qubits(self):
         max_index = 0
@@ -516,7 +539,7 @@ class QubitHamiltonian:
         for ps in other:
             tmp = QubitOperator(term=ps.key_openfermion(), value=ps.coeff)
             new_hamiltonian += tmp
-        self._qubit_operator = new_hamiltonian
+        self.qubit_operator = new_hamiltonian
         return self
 
     def map_qubits(self, qubit_map: dict):
@@ -2,8 +2,11 @@ import typing, copy, numbers
 
 from tequila import TequilaException
 from tequila.utils import JoinedTransformation, to_float
-from tequila.hamiltonian import paulis
+from tequila.utils.state_cache import shared_states
+from tequila.utils.structure import structural_key
+from tequila.hamiltonian import paulis, QubitHamiltonian
 from tequila.autograd_imports import numpy
+import numpy as np
 
 import collections
 
@@ -43,13 +46,39 @@ class ExpectationValueImpl:
             self.U.update_variables(variables)
 
     def __init__(self, U=None, H=None, contraction=None, shape=None):
+        if U is not None:
+            # compute the structural keys of the gates before copying, copies share them
+            U.structural_key()
         self._unitary = copy.deepcopy(U)
-        if hasattr(H, "paulistrings"):
+        if isinstance(H, QubitHamiltonian) or hasattr(H, "paulistrings"):
             self._hamiltonian = tuple([copy.deepcopy(H)])
         else:
             self._hamiltonian = tuple(H)
         self._contraction = contraction
         self._shape = shape
+        self._hamiltonian_key = None
+
+    def structural_key(self) -> tuple:
+        """
+        Hashable representation of unitary, hamiltonians, shape and contraction
+        Expectation values with the same structure are evaluated only once within objectives
+        """
+        if self._hamiltonian_key is None:
+            H_key = (structural_key(self._hamiltonian), structural_key(self._shape), structural_key(self._contraction))
+            self._hamiltonian_key = (H_key, hash(H_key))
+        U_key = None if self.U is None else self.U.structural_key()
+        return ("ExpectationValueImpl", U_key, self._hamiltonian_key[0])
+
+    def __hash__(self):
+        self.structural_key()
+        return hash((None if self.U is None else hash(self.U), self._hamiltonian_key[1]))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ExpectationValueImpl):
+            return False
+        return hash(self) == hash(other) and self.structural_key() == other.structural_key()
 
     def __call__(self, *args, **kwargs):
         raise TequilaException(
@@ -82,6 +111,10 @@ class Objective:
         else:
             self._args = tuple(args)
             self._transformation = transformation
+        # set by compile, dispatches the expectation values (see tequila.simulators.executors)
+        self.executor = None
+        # set by compile, distributes the samples (see tequila.simulators.shot_allocation)
+        self.shot_allocation = None
 
     @property
     def backend(self) -> str:
@@ -304,17 +337,84 @@ class Objective:
 
     def __call__(self, variables=None, *args, **kwargs):
         variables = format_variable_dictionary(variables)
+        if self.shot_allocation is not None and kwargs.get("samples", None) is not None:
+            kwargs = {"shot_allocation": self.shot_allocation, **kwargs}
+        if self.executor is not None:
+            return self.executor.evaluate_objectives([self], variables, *args, **kwargs)[0]
         # avoid multiple evaluations
         evaluated = {}
         ev_array = []
+        # expectation values with the same circuit share the simulated state
+        with shared_states():
+            for E in self.args:
+                if E not in evaluated:
+                    expval_result = E(variables=variables, *args, **kwargs)
+                    evaluated[E] = expval_result
+                else:
+                    expval_result = evaluated[E]
+                ev_array.append(expval_result)
+        return self.transformation(*ev_array)
+
+    def sample_with_error(self, variables, samples: int, *args, **kwargs) -> tuple:
+        """
+        Sample the objective and estimate the standard error of the result
+        The errors of the expectation values are propagated linearly through the transformation
+        :param variables: the variables
+        :param samples: the number of samples (see BackendExpectationValue.sample)
+        :return: tuple (estimate, standard error)
+        """
+        variables = format_variable_dictionary(variables)
+        if self.shot_allocation is not None:
+            kwargs = {"shot_allocation": self.shot_allocation, **kwargs}
+        evaluated = {}
+        values = []
+        errors = []
+        for E in self.args:
+            if E not in evaluated:
+                if hasattr(E, "sample_with_error"):
+                    evaluated[E] = E.sample_with_error(variables=variables, samples=samples, *args, **kwargs)
+                elif hasattr(E, "U"):
+                    raise TequilaException("sample_with_error needs a compiled objective")
+                else:
+                    evaluated[E] = (E(variables=variables), 0.0)
+            values.append(evaluated[E][0])
+            errors.append(evaluated[E][1])
+        result = self.transformation(*values)
+        variance = 0.0
+        for i, error in enumerate(errors):
+            if error == 0.0:
+                continue
+            # central difference with a step of the size of the error
+            shifted = [list(values), list(values)]
+            shifted[0][i] += error
+            shifted[1][i] -= error
+            variance += ((self.transformation(*shifted[0]) - self.transformation(*shifted[1])) / 2.0) ** 2
+        return result, np.sqrt(variance)
+
+    def batch(self, variables: typing.List[typing.Dict], *args, **kwargs) -> np.ndarray:
+        """
+        Evaluate the objective at many parameter points
+        Compiled expectation values are evaluated for all points at once,
+        so backends can reuse their translated circuits and treat the points together
+        :param variables: list of variable dictionaries, one per point
+        :return: array with the values of the objective, first axis enumerates the points
+        """
+        variables = [format_variable_dictionary(v) for v in variables]
+        evaluated = {}
+        ev_array = []
         for E in self.args:
             if E not in evaluated:
-                expval_result = E(variables=variables, *args, **kwargs)
+                if hasattr(E, "batch"):
+                    expval_result = E.batch(variables=variables, *args, **kwargs)
+                else:
+                    expval_result = [E(variables=v, *args, **kwargs) for v in variables]
                 evaluated[E] = expval_result
             else:
                 expval_result = evaluated[E]
             ev_array.append(expval_result)
-        return self.transformation(*ev_array)
+        # plain numpy array (the autograd/jax numpy of this module would give float32 jax arrays)
+        return np.asarray([self.transformation(*[x[i] for x in ev_array]) for i in range(len(variables))],
+                          dtype=np.float64)
 
 
 def ExpectationValue(U, H, *args, **kwargs) -> Objective:
@@ -5,6 +5,7 @@ Define Containers for SciPy usage
 """
 from tequila.objective import format_variable_dictionary
 from tequila.tools.qng import evaluate_qng
+from tequila.utils.state_cache import shared_states
 
 
 class _EvalContainer:
@@ -43,6 +44,18 @@ class _EvalContainer:
             self.history_angles.append(angles)
         return numpy.float64(E)  # jax types confuses optimizers
 
+    def evaluate_objectives(self, objectives: list, variables) -> list:
+        """
+        Evaluate compiled objectives at the same point
+        If they were compiled with an executor it evaluates all their expectation values together
+        The objectives share simulated states (e.g. the common prefixes of shifted circuits)
+        """
+        executor = getattr(objectives[0], "executor", None) if len(objectives) > 0 else None
+        with shared_states():
+            if executor is None:
+                return [O(variables=variables, samples=self.samples, **self.backend_options) for O in objectives]
+            return executor.evaluate_objectives(objectives, variables, samples=self.samples, **self.backend_options)
+
 
 class _GradContainer(_EvalContainer):
     """
@@ -57,13 +70,31 @@ class _GradContainer(_EvalContainer):
         variables = dict((self.param_keys[i], p[i]) for i in range(len(self.param_keys)))
         if self.passive_angles is not None:
             variables = {**variables, **self.passive_angles}
+        values = self.evaluate_objectives([dO[k] for k in self.param_keys], variables=variables)
         for i in range(self.N):
-            dE_vec[i] = dO[self.param_keys[i]](variables=variables, samples=self.samples, **self.backend_options)
+            dE_vec[i] = values[i]
             memory[self.param_keys[i]] = dE_vec[i]
         self.history.append(memory)
         return numpy.asarray(dE_vec, dtype=numpy.float64)  # jax types confuse optimizers
 
 
+class _BatchedGradContainer(_EvalContainer):
+    """
+    Same for gradients which are evaluated in one call (see BatchedGradient)
+    Container Class to access scipy and keep the optimization history
+    """
+
+    def __call__(self, p, *args, **kwargs):
+        variables = dict((self.param_keys[i], p[i]) for i in range(len(self.param_keys)))
+        if self.passive_angles is not None:
+            variables = {**variables, **self.passive_angles}
+        dE = self.objective(variables=variables, samples=self.samples, **self.backend_options)
+        dE_vec = numpy.asarray([dE[k] for k in self.param_keys], dtype=numpy.float64)
+        if self.save_history:
+            self.history.append(dict(zip(self.param_keys, dE_vec)))
+        return dE_vec
+
+
 class _QngContainer(_EvalContainer):
 
     def __init__(self, combos, param_keys, passive_angles=None, samples=None, save_history=True,
@@ -98,10 +129,12 @@ class _HessContainer(_EvalContainer):
         variables = dict((self.param_keys[i], p[i]) for i in range(len(self.param_keys)))
         if self.passive_angles is not None:
             variables = {**variables, **self.passive_angles}
+        keys = [(self.param_keys[i], self.param_keys[j]) for i in range(self.N) for j in range(i, self.N)]
+        values = dict(zip(keys, self.evaluate_objectives([ddO[key] for key in keys], variables=variables)))
         for i in range(self.N):
             for j in range(i, self.N):
                 key = (self.param_keys[i], self.param_keys[j])
-                value = ddO[key](variables=variables, samples=self.samples, **self.backend_options)
+                value = values[key]
                 ddE_mat[i, j] = value
                 ddE_mat[j, i] = value
                 memory[key] = value
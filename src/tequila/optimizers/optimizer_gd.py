@@ -2,7 +2,7 @@ import numpy, typing, numbers
 from tequila.objective import Objective
 from tequila.objective.objective import assign_variable, Variable, format_variable_dictionary, format_variable_list
 from .optimizer_base import Optimizer
-from tequila.circuit.gradient import grad
+from tequila.circuit.gradient import grad, BatchedGradient
 from collections import namedtuple
 from tequila.simulators.simulator_api import compile
 from tequila.circuit.noise import NoiseModel
@@ -51,6 +51,7 @@ class OptimizerGD(Optimizer):
                  samples: int = None,
                  backend: str = None,
                  noise: NoiseModel = None,
+                 gradient: str = None,
                  reset_history: bool = True, *args, **kwargs) -> GDReturnType:
         """
         Optimizes with a variation of gradient descent and gives back the optimized angles
@@ -65,6 +66,7 @@ class OptimizerGD(Optimizer):
         :param samples: the number of samples to use. Default None: Wavefunction simulation used instead.
         :param backend: which simulation backend to use. Default None: let Tequila Pick!
         :param noise: the NoiseModel to apply to sampling. Default None. Affects chosen simulator.
+        :param gradient: None: gradients as tequila objectives, name of a BatchedGradient method: full gradient in one call
         :param reset_history: reset the history before optimization starts (has no effect if self.save_history is False)
         :return: tuple of optimized energy ,optimized angles and scipy output
         """
@@ -87,7 +89,12 @@ class OptimizerGD(Optimizer):
                        noise_model=noise,
                        samples=samples)
 
-        if not qng:
+        if not qng and gradient is not None:
+            batched = compile(objective=BatchedGradient(objective=objective, variables=list(active_angles.keys()),
+                                                        method=gradient),
+                              variables=initial_values, backend=backend, noise_model=noise, samples=samples)
+            gradients = lambda variables: numpy.asarray(list(batched(variables).values()))
+        elif not qng:
             g_list = []
             for k in active_angles.keys():
                 g = grad(objective, k)
@@ -332,7 +339,7 @@ class OptimizerGD(Optimizer):
 
         r = rho * r + (1 - rho) * numpy.square(grads)
         for i in range(len(m)):
-            m[i] = beta * m[i] - lr * grads[i] / numpy.sqrt(r[i])
+            m[i] = beta * m[i] - lr * grads[i] / numpy.sqrt(epsilon + r[i])
         new = {}
         for i, k in enumerate(active_angles.keys()):
             new[k] = v[k] + m[i]
@@ -352,6 +359,7 @@ def minimize(objective: Objective,
              maxiter: int = 100,
              backend: str = None,
              noise: NoiseModel = None,
+             gradient: str = None,
              silent: bool = False,
              save_history: bool = True,
              *args,
@@ -386,6 +394,11 @@ def minimize(objective: Objective,
     noise: NoiseModel:
          (Default value =None)
          a NoiseModel to apply to all expectation values in the objective.
+    gradient: str :
+         (Default value = None)
+         None: gradients are constructed as tequila objectives
+         'shift': parameter shift rule evaluated in one call per iteration (see tequila.circuit.gradient.BatchedGradient)
+         'adjoint': adjoint differentiation, one forward and one backward simulation per iteration (numpy and qulacs)
     stop_count: int :
          (Default value = None)
          Convergence tolerance for optimization; if no improvement after this many epochs, stop.
@@ -436,5 +449,5 @@ def minimize(objective: Objective,
                      qng=qng,
                      stop_count=stop_count,
                      backend=backend, initial_values=initial_values,
-                     variables=variables, noise=noise,
+                     variables=variables, noise=noise, gradient=gradient,
                      samples=samples, *args, **kwargs)
@@ -51,10 +51,10 @@ class OptimizerGpyOpt(Optimizer):
         return BayesianOptimization(f=func, domain=domain, acquisition=method)
 
     def construct_function(self, objective, backend, passives=None, samples=None, noise_model=None) -> typing.Callable:
-        return lambda arr: objective(backend=backend,
-                                     variables=array_to_objective_dict(objective, arr, passives),
-                                     samples=samples,
-                                     noise_model=noise_model)
+        # GPyOpt hands over one row per point, all points are evaluated in one batch
+        return lambda arr: objective.batch(variables=[self.redictify(x, objective, passives) for x in arr],
+                                           samples=samples,
+                                           noise_model=noise_model).reshape(-1, 1)
 
     def redictify(self, arr, objective, passives=None) -> typing.Dict:
         op = objective.extract_variables()
@@ -192,8 +192,8 @@ class OptimizerPhoenics(Optimizer):
             recs = self._process_for_sim(precs, passives=passives)
 
             start = time.time()
-            for i, rec in enumerate(recs):
-                En = compiled_objective(variables=rec, samples=samples, noise_model=noise, **backend_options)
+            energies = compiled_objective.batch(variables=recs, samples=samples, noise_model=noise, **backend_options)
+            for rec, En in zip(recs, energies):
                 runs.append((rec, En))
                 if not self.silent:
                     print("energy = {:+2.8f} , angles=".format(En), rec)
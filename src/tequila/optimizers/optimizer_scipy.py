@@ -2,8 +2,8 @@ import scipy, numpy, typing, numbers
 from tequila.objective import Objective
 from tequila.objective.objective import assign_variable, Variable, format_variable_dictionary, format_variable_list
 from .optimizer_base import Optimizer
-from tequila.circuit.gradient import grad
-from ._scipy_containers import _EvalContainer, _GradContainer, _HessContainer, _QngContainer
+from tequila.circuit.gradient import grad, BatchedGradient
+from ._scipy_containers import _EvalContainer, _GradContainer, _HessContainer, _QngContainer, _BatchedGradContainer
 from collections import namedtuple
 from tequila.simulators.simulator_api import compile
 from tequila.utils.exceptions import TequilaException
@@ -141,7 +141,18 @@ class OptimizerSciPy(Optimizer):
                            silent=self.silent)
 
         # compile gradients
-        if self.method in self.gradient_based_methods + self.hessian_based_methods and not isinstance(gradient, str):
+        if self.method in self.gradient_based_methods + self.hessian_based_methods and gradient in BatchedGradient.methods:
+            compiled_gradient = compile(objective=grad(objective=objective, method=gradient), variables=initial_values,
+                                        samples=samples, noise_model=noise, backend=backend, *args, **kwargs)
+            dE = _BatchedGradContainer(objective=compiled_gradient,
+                                       param_keys=param_keys,
+                                       samples=samples,
+                                       passive_angles=passive_angles,
+                                       save_history=self.save_history,
+                                       silent=self.silent,
+                                       backend_options=backend_options)
+            infostring += "Gradients: {}\n".format(gradient)
+        elif self.method in self.gradient_based_methods + self.hessian_based_methods and not isinstance(gradient, str):
             compiled_grad_objectives = dict()
             if gradient is None:
                 gradient = {assign_variable(k): grad(objective=objective, variable=k) for k in active_angles.keys()}
@@ -331,6 +342,8 @@ def minimize(objective: Objective,
         The tequila objective to optimize
     gradient: typing.Union[str, typing.Dict[Variable, Objective], None] : (Default value = None) :
         '2-point', 'cs' or '3-point' for numerical gradient evaluation (does not work in combination with all optimizers),
+        'shift' for the parameter shift rule evaluated in one call per iteration (see tequila.circuit.gradient.BatchedGradient),
+        'adjoint' for adjoint differentiation with one forward and one backward simulation (numpy and qulacs backends),
         dictionary of variables and tequila objective to define own gradient,
         None for automatic construction (default)
     hessian: typing.Union[str, typing.Dict[Variable, Objective], None] : (Default value = None) :
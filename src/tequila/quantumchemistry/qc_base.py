@@ -644,6 +644,8 @@ class QuantumChemistryBase:
              (Default value = "mp2")
         trotter_parameters: gates.TrotterParameters :
              (Default value = None)
+             TrotterParameters(ordering="gray") reorders the paulistrings of the excitation generators
+             (they commute, the ordering only reduces the CNOT count)
 
         Returns
         -------
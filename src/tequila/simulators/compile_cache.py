@@ -0,0 +1,120 @@
+from collections import OrderedDict, namedtuple
+from tequila.utils.structure import structural_key
+
+"""
+Process-wide cache for compiled expectation values
+Expectation values which have the same structure (gates, parameters, hamiltonians)
+and are compiled for the same backend and noise model share one compiled backend object
+"""
+
+CacheInfo = namedtuple("CacheInfo", "hits misses evictions currsize maxsize memory max_memory")
+
+
+def estimate_memory(compiled) -> int:
+    """
+    Rough estimate of the memory (in bytes) held by a compiled expectation value:
+    one complex statevector on the register, the translated gates and the hamiltonian terms
+    """
+    n_qubits = compiled.n_qubits if compiled.U is not None else 0
+    n_gates = len(compiled.U.abstract_circuit.gates) if compiled.U is not None else 0
+    # lazy hamiltonians (KetBraHamiltonian) are not expanded into paulistrings
+    n_terms = sum(H.stored_terms if hasattr(H, "stored_terms") else len(H) for H in compiled._abstract_hamiltonians)
+    return 16 * 2 ** n_qubits + 512 * n_gates + 128 * n_terms
+
+
+class CompileCache:
+    """
+    LRU cache of compiled expectation values
+    Keys are built from the structure of the abstract expectation value, the backend and the noise model
+    so that structurally identical expectation values (e.g. from repeated gradient constructions) are compiled once
+    The cached objects are shared, they must not be modified after compilation
+
+    Parameters
+    ----------
+    maxsize: maximal number of cached objects, 0 disables the cache
+    max_memory: maximal estimated memory of all cached objects in bytes (see estimate_memory), None for no limit
+    """
+
+    def __init__(self, maxsize: int = 512, max_memory: int = 2 ** 30):
+        self.maxsize = maxsize
+        self.max_memory = max_memory
+        self._data = OrderedDict()
+        self._memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @staticmethod
+    def make_key(E, backend: str, noise_model=None) -> tuple:
+        # expectation values hash and compare by structure
+        return (backend, E, structural_key(noise_model))
+
+    def get(self, E, backend: str, noise_model, compile_function):
+        """
+        Get the compiled expectation value from the cache or compile it
+        :param E: the abstract ExpectationValueImpl
+        :param backend: name of the backend
+        :param noise_model: the noise model (or None)
+        :param compile_function: called without arguments if E is not in the cache
+        :return: the compiled expectation value
+        """
+        if self.maxsize == 0:
+            return compile_function()
+        key = self.make_key(E=E, backend=backend, noise_model=noise_model)
+        if key in self._data:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key][0]
+        self.misses += 1
+        compiled = compile_function()
+        memory = estimate_memory(compiled)
+        self._data[key] = (compiled, memory)
+        self._memory += memory
+        self.shrink()
+        return compiled
+
+    def shrink(self):
+        """
+        Drop the least recently used objects until the limits are respected
+        The most recent object is kept in any case
+        """
+        while len(self._data) > 1 and (len(self._data) > self.maxsize or (
+                self.max_memory is not None and self._memory > self.max_memory)):
+            key, (compiled, memory) = self._data.popitem(last=False)
+            self._memory -= memory
+            self.evictions += 1
+        if self.maxsize == 0:
+            self.clear()
+
+    def resize(self, maxsize: int = None, max_memory: int = None):
+        """
+        Change the limits of the cache, None keeps the current limit
+        """
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if max_memory is not None:
+            self.max_memory = max_memory
+        self.shrink()
+
+    def clear(self):
+        """
+        Remove all cached objects and reset the statistics
+        """
+        self._data.clear()
+        self._memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(hits=self.hits, misses=self.misses, evictions=self.evictions, currsize=len(self._data),
+                         maxsize=self.maxsize, memory=self._memory, max_memory=self.max_memory)
+
+
+compile_cache = CompileCache()
@@ -0,0 +1,201 @@
+from tequila.utils import TequilaException
+from tequila.objective.objective import format_variable_dictionary
+from tequila.utils.state_cache import shared_states
+
+import multiprocessing, os, typing
+import numpy
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Executors evaluate independent compiled expectation values at one parameter point
+Compiled objectives carry their executor (see tq.compile(..., executor=...))
+Several objectives (e.g. the components of a gradient) can be evaluated together,
+every unique compiled expectation value is then dispatched only once
+"""
+
+
+class TequilaExecutorException(TequilaException):
+    pass
+
+
+class Executor:
+    """
+    Base class: evaluates the expectation values one after another in the current process
+    """
+
+    def evaluate(self, expectationvalues: list, variables, *args, **kwargs) -> list:
+        """
+        :param expectationvalues: list of compiled expectation values
+        :param variables: the variables (one parameter point)
+        :return: list with the values of the expectation values
+        """
+        # expectation values with the same circuit share the simulated state
+        with shared_states():
+            return [E(variables, *args, **kwargs) for E in expectationvalues]
+
+    def register(self, expectationvalues: list):
+        """
+        Announce compiled expectation values which will be evaluated later
+        Executors which keep them in worker processes can prepare the workers
+        """
+        pass
+
+    def evaluate_objectives(self, objectives: list, variables, *args, **kwargs) -> list:
+        """
+        Evaluate compiled objectives at the same parameter point
+        Expectation values which appear in several objectives are evaluated once
+        :param objectives: list of compiled objectives
+        :param variables: the variables (one parameter point)
+        :return: list with the values of the objectives
+        """
+        variables = format_variable_dictionary(variables)
+        expectationvalues = []
+        index = {}
+        for objective in objectives:
+            for E in objective.get_expectationvalues():
+                if id(E) not in index:
+                    index[id(E)] = len(expectationvalues)
+                    expectationvalues.append(E)
+        values = self.evaluate(expectationvalues, variables, *args, **kwargs)
+        result = []
+        for objective in objectives:
+            args_values = [values[index[id(E)]] if id(E) in index else E(variables=variables) for E in
+                           objective.args]
+            result.append(objective.transformation(*args_values))
+        return result
+
+    def shutdown(self):
+        pass
+
+    def __getstate__(self):
+        # pools can not be pickled, copies start their own
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+
+class SerialExecutor(Executor):
+    """
+    Evaluation in the current process (the default)
+    """
+    pass
+
+
+class ThreadExecutor(Executor):
+    """
+    Evaluates the expectation values in a pool of threads
+    Only useful if the backend releases the GIL during simulation (e.g. qulacs)
+    Every compiled expectation value is evaluated by at most one thread per call,
+    but compiled objects are shared (see compile_cache) and not thread-safe:
+    do not evaluate objectives which share them from different threads at the same time
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers
+        self._pool = None
+
+    def evaluate(self, expectationvalues: list, variables, *args, **kwargs) -> list:
+        if len(expectationvalues) < 2:
+            return super().evaluate(expectationvalues, variables, *args, **kwargs)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [self._pool.submit(E, variables, *args, **kwargs) for E in expectationvalues]
+        return [f.result() for f in futures]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+# the compiled expectation values in the worker processes
+_worker_registry = {}
+
+
+def _initialize_worker(registry: dict, entropy: int):
+    global _worker_registry
+    _worker_registry = registry
+    # forked workers start with the random state of the parent, every worker gets its own seed
+    seed = numpy.random.SeedSequence(entropy=entropy, spawn_key=(os.getpid(),))
+    numpy.random.seed(seed.generate_state(4))
+
+
+def _evaluate_in_worker(key, variables, args, kwargs):
+    return _worker_registry[key](variables, *args, **kwargs)
+
+
+class ProcessExecutor(Executor):
+    """
+    Evaluates the expectation values in a pool of worker processes
+    The workers are started with all registered expectation values and keep them,
+    only the variables and the results are sent in each call
+    New expectation values restart the pool, so compile everything before the first evaluation
+    The executor keeps every registered expectation value until clear is called
+    The workers are forked if the platform supports it, otherwise the compiled expectation values need to be picklable
+    Every started worker seeds the numpy random generator from the parent's generator and its process id,
+    so samples differ between workers and pools (and are reproducible with numpy.random.seed in the parent)
+    """
+
+    def __init__(self, max_workers: int = None, start_method: str = None):
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        if start_method is None:
+            start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        self.start_method = start_method
+        self._registry = {}
+        self._keys = {}
+        self._pool = None
+
+    def register(self, expectationvalues: list):
+        for E in expectationvalues:
+            if id(E) not in self._keys:
+                # the registry keeps a reference, so the id can not be reused
+                self._keys[id(E)] = len(self._registry)
+                self._registry[len(self._registry)] = E
+                self.shutdown()
+
+    def evaluate(self, expectationvalues: list, variables, *args, **kwargs) -> list:
+        if len(expectationvalues) < 2:
+            return super().evaluate(expectationvalues, variables, *args, **kwargs)
+        self.register(expectationvalues)
+        if self._pool is None:
+            context = multiprocessing.get_context(self.start_method)
+            entropy = int(numpy.random.randint(0, 2 ** 62, dtype=numpy.int64))
+            self._pool = context.Pool(processes=self.max_workers, initializer=_initialize_worker,
+                                      initargs=(self._registry, entropy))
+        tasks = [(self._keys[id(E)], variables, args, kwargs) for E in expectationvalues]
+        return self._pool.starmap(_evaluate_in_worker, tasks)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def clear(self):
+        """
+        Forget all registered expectation values and stop the workers
+        """
+        self.shutdown()
+        self._registry = {}
+        self._keys = {}
+
+    def __del__(self):
+        try:
+            self.shutdown()
+        except Exception:
+            pass
+
+
+INSTALLED_EXECUTORS = {"serial": SerialExecutor, "threads": ThreadExecutor, "processes": ProcessExecutor}
+
+
+def make_executor(executor: typing.Union[str, Executor] = None) -> typing.Optional[Executor]:
+    """
+    :param executor: an Executor, one of the names in INSTALLED_EXECUTORS or None
+    :return: the executor (None stays None)
+    """
+    if executor is None or isinstance(executor, Executor):
+        return executor
+    if isinstance(executor, str) and executor.lower() in INSTALLED_EXECUTORS:
+        return INSTALLED_EXECUTORS[executor.lower()]()
+    raise TequilaExecutorException(
+        "unknown executor {}, choose from {} or pass an Executor".format(executor, list(INSTALLED_EXECUTORS.keys())))
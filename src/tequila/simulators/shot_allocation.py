@@ -0,0 +1,125 @@
+from tequila.utils import TequilaException
+from tequila.utils.structure import IdentityKey
+
+import numpy, typing
+
+"""
+Shot allocation: distribute a total number of samples over the measurement groups of a hamiltonian
+(see BackendExpectationValue.measurement_groups)
+Without allocation every group is measured with the full number of samples
+"""
+
+
+class TequilaShotAllocationException(TequilaException):
+    pass
+
+
+class ShotAllocation:
+    """
+    Base class: the shots are distributed proportional to the weights of the groups
+    every group is measured at least once
+    """
+
+    def weights(self, groups: list) -> numpy.ndarray:
+        raise TequilaShotAllocationException("ShotAllocation needs to be overwritten: weights not implemented")
+
+    def allocate(self, samples: int, groups: list) -> typing.List[int]:
+        """
+        :param samples: the total number of samples for all groups
+        :param groups: list of MeasurementGroups
+        :return: list with the number of samples for each group
+        """
+        if len(groups) == 0:
+            return []
+        if samples < len(groups):
+            raise TequilaShotAllocationException(
+                "{} samples can not be distributed over {} measurement groups".format(samples, len(groups)))
+        weights = numpy.asarray(self.weights(groups), dtype=float)
+        if not numpy.all(numpy.isfinite(weights)) or numpy.sum(weights) <= 0.0:
+            weights = numpy.ones(len(groups))
+        # one shot for every group, the rest proportional to the weights
+        exact = (samples - len(groups)) * weights / numpy.sum(weights)
+        shots = numpy.floor(exact).astype(int)
+        remainder = samples - len(groups) - numpy.sum(shots)
+        shots[numpy.argsort(shots - exact)[:remainder]] += 1
+        return [int(x) + 1 for x in shots]
+
+    def update(self, groups: list, variances: list):
+        """
+        Receive the sampled single-shot variances of the groups
+        """
+        pass
+
+
+class UniformAllocation(ShotAllocation):
+    """
+    Same number of samples for every group
+    """
+
+    def weights(self, groups: list) -> numpy.ndarray:
+        return numpy.ones(len(groups))
+
+
+class ProportionalAllocation(ShotAllocation):
+    """
+    Samples proportional to the sum of the absolute coefficients of the paulistrings in the group
+    This is the optimal allocation if the single-shot variance of each group is at its bound
+    """
+
+    def weights(self, groups: list) -> numpy.ndarray:
+        return numpy.asarray([sum(abs(ps.coeff) for ps in group.paulistrings) for group in groups])
+
+
+class VarianceAllocation(ProportionalAllocation):
+    """
+    Samples proportional to the single-shot standard deviation of the groups,
+    which minimizes the variance of the total estimate for a given number of samples
+    The variances are averaged over all previous calls (they change slowly during optimizations)
+    Groups without estimate are weighted with the bound of their standard deviation (see ProportionalAllocation)
+
+    Parameters
+    ----------
+    regularization: fraction of the bound which is added to the standard deviation,
+    keeps groups with vanishing estimated variance from starving
+    """
+
+    def __init__(self, regularization: float = 0.05):
+        self.regularization = regularization
+        self._variances = {}
+
+    def weights(self, groups: list) -> numpy.ndarray:
+        bounds = super().weights(groups)
+        result = []
+        for group, bound in zip(groups, bounds):
+            key = IdentityKey(group)
+            if key in self._variances:
+                count, variance = self._variances[key]
+                result.append(numpy.sqrt(variance) + self.regularization * bound)
+            else:
+                result.append(bound)
+        return numpy.asarray(result)
+
+    def update(self, groups: list, variances: list):
+        for group, variance in zip(groups, variances):
+            key = IdentityKey(group)
+            count, average = self._variances.get(key, (0, 0.0))
+            self._variances[key] = (count + 1, (count * average + variance) / (count + 1))
+
+
+INSTALLED_SHOT_ALLOCATIONS = {"uniform": UniformAllocation, "proportional": ProportionalAllocation,
+                              "variance": VarianceAllocation}
+
+
+def make_shot_allocation(shot_allocation: typing.Union[str, ShotAllocation] = None) -> typing.Optional[
+    ShotAllocation]:
+    """
+    :param shot_allocation: a ShotAllocation, one of the names in INSTALLED_SHOT_ALLOCATIONS or None
+    :return: the shot allocation (None stays None)
+    """
+    if shot_allocation is None or isinstance(shot_allocation, ShotAllocation):
+        return shot_allocation
+    if isinstance(shot_allocation, str) and shot_allocation.lower() in INSTALLED_SHOT_ALLOCATIONS:
+        return INSTALLED_SHOT_ALLOCATIONS[shot_allocation.lower()]()
+    raise TequilaShotAllocationException(
+        "unknown shot allocation {}, choose from {} or pass a ShotAllocation".format(
+            shot_allocation, list(INSTALLED_SHOT_ALLOCATIONS.keys())))
@@ -6,8 +6,12 @@ from typing import Dict, Union, Hashable
 from tequila.objective import Objective, Variable, assign_variable, format_variable_dictionary
 from tequila.utils.exceptions import TequilaException, TequilaWarning
 from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue
+from tequila.simulators.compile_cache import compile_cache
+from tequila.simulators.executors import make_executor
+from tequila.simulators.shot_allocation import make_shot_allocation
+from tequila.circuit.gradient import BatchedGradient
 
-SUPPORTED_BACKENDS = ["qulacs", "qiskit", "cirq", "pyquil", "symbolic"]
+SUPPORTED_BACKENDS = ["qulacs", "qiskit", "cirq", "pyquil", "numpy", "symbolic"]
 SUPPORTED_NOISE_BACKENDS = ["qiskit", 'cirq', 'pyquil']
 BackendTypes = namedtuple('BackendTypes', 'CircType ExpValueType')
 INSTALLED_SIMULATORS = {}
@@ -72,6 +76,12 @@ try:
 except ImportError:
     HAS_CIRQ = False
 
+from tequila.simulators.simulator_numpy import BackendCircuitNumpy, BackendExpectationValueNumpy
+
+INSTALLED_SIMULATORS["numpy"] = BackendTypes(CircType=BackendCircuitNumpy, ExpValueType=BackendExpectationValueNumpy)
+INSTALLED_SAMPLERS["numpy"] = BackendTypes(CircType=BackendCircuitNumpy, ExpValueType=BackendExpectationValueNumpy)
+HAS_NUMPY = True
+
 from tequila.simulators.simulator_symbolic import BackendCircuitSymbolic, BackendExpectationValueSymbolic
 
 INSTALLED_SIMULATORS["symbolic"] = BackendTypes(CircType=BackendCircuitSymbolic,
@@ -159,19 +169,29 @@ def compile_objective(objective: 'Objective',
                       backend: str = None,
                       samples: int = None,
                       noise_model=None,
+                      executor=None,
+                      shot_allocation=None,
                       *args,
                       **kwargs) -> Objective:
     """
     Compiles an objective to a chosen backend
     The abstract circuits are replaced by the circuit objects of the backend
-    Direct return if the objective was alrady compiled
+    Direct return if the objective was alrady compiled (and no executor is given)
+    Compiled expectation values are taken from the process-wide compile_cache if an expectation value
+    with the same structure was already compiled for the same backend and noise model
     :param objective: abstract objective
     :param variables: The variables of the objective given as dictionary
     with keys as tequila Variables and values the corresponding real numbers
     :param backend: specify the backend or give None for automatic assignment
     :param noise_model: the NoiseModel to apply to the objective.
+    :param executor: Executor or name of an executor (see tequila.simulators.executors) which evaluates
+    the expectation values of the compiled objective
+    :param shot_allocation: ShotAllocation or name of a shot allocation (see tequila.simulators.shot_allocation)
+    which distributes the samples of the compiled objective over the measurement groups
     :return: Compiled Objective
     """
+    executor = make_executor(executor)
+    shot_allocation = make_shot_allocation(shot_allocation)
 
     backend = pick_backend(backend=backend, samples=samples, noise=noise_model is not None)
 
@@ -192,7 +212,14 @@ def compile_objective(objective: 'Objective',
             all_compiled = False
 
     if all_compiled:
-        return objective
+        if executor is None and shot_allocation is None:
+            return objective
+        compiled = type(objective)(args=objective.args, transformation=objective._transformation)
+        compiled.executor = objective.executor if executor is None else executor
+        compiled.shot_allocation = objective.shot_allocation if shot_allocation is None else shot_allocation
+        if executor is not None:
+            executor.register(compiled.get_expectationvalues())
+        return compiled
 
     compiled_args = []
     # avoid double compilations
@@ -200,14 +227,20 @@ def compile_objective(objective: 'Objective',
     for arg in objective.args:
         if hasattr(arg, "H") and hasattr(arg, "U") and not isinstance(arg, BackendExpectationValue):
             if arg not in expectationvalues:
-                compiled_expval = ExpValueType(arg, variables, noise_model)
+                compiled_expval = compile_cache.get(E=arg, backend=backend, noise_model=noise_model,
+                                                    compile_function=lambda: ExpValueType(arg, variables, noise_model))
                 expectationvalues[arg] = compiled_expval
             else:
                 compiled_expval = expectationvalues[arg]
             compiled_args.append(compiled_expval)
         else:
             compiled_args.append(arg)
-    return type(objective)(args=compiled_args, transformation=objective._transformation)
+    compiled = type(objective)(args=compiled_args, transformation=objective._transformation)
+    compiled.shot_allocation = shot_allocation
+    if executor is not None:
+        compiled.executor = executor
+        executor.register(compiled.get_expectationvalues())
+    return compiled
 
 
 def compile_circuit(abstract_circuit: 'QCircuit',
@@ -259,10 +292,11 @@ def simulate(objective: typing.Union['Objective', 'QCircuit'],
     Parameters
     ----------
     objective :
-        tequila objective or circuit
+        tequila objective, circuit or BatchedGradient (see tequila.grad)
     variables :
         The variables of the objective given as dictionary
         with keys as tequila Variables/hashable types and values the corresponding real numbers
+        or a list of such dictionaries to evaluate the objective at many points (see Objective.batch)
     samples : int : (Default value = None)
         if None a full wavefunction simulation is performed, otherwise a fixed number of samples is simulated
     backend : str : (Default value = None)
@@ -279,9 +313,21 @@ def simulate(objective: typing.Union['Objective', 'QCircuit'],
     -------
     type
         simulated/sampled objective or simulated/sampled wavefunction
+        for a list of variables: numpy array with the values of the objective
+        (list of wavefunctions for circuits)
 
     """
 
+    if isinstance(variables, (list, tuple)):
+        if len(variables) == 0:
+            raise TequilaException("simulate received an empty list of variables")
+        variables = [format_variable_dictionary(v) for v in variables]
+        compiled_objective = compile(objective=objective, samples=samples, variables=variables[0], backend=backend,
+                                     noise_model=noise_model, *args, **kwargs)
+        if hasattr(compiled_objective, "batch"):
+            return compiled_objective.batch(variables=variables, samples=samples, *args, **kwargs)
+        return [compiled_objective(variables=v, samples=samples, *args, **kwargs) for v in variables]
+
     variables = format_variable_dictionary(variables)
 
     if variables is None and not (len(objective.extract_variables()) == 0):
@@ -346,11 +392,13 @@ def draw(objective, variables=None, backend: str = None):
             print(compiled.circuit)
 
 
-def compile(objective: typing.Union['Objective', 'QCircuit'],
+def compile(objective: typing.Union['Objective', 'QCircuit', 'BatchedGradient'],
             variables: Dict[Union['Variable', Hashable], RealNumber] = None,
             samples: int = None,
             backend: str = None,
             noise_model=None,
+            executor=None,
+            shot_allocation=None,
             *args,
             **kwargs) -> typing.Union['BackendCircuit', 'Objective']:
     """Compile a tequila objective or circuit to a backend
@@ -358,7 +406,7 @@ def compile(objective: typing.Union['Objective', 'QCircuit'],
     Parameters
     ----------
     objective : Objective:
-        tequila objective or circuit
+        tequila objective, circuit or BatchedGradient (see tequila.grad)
     variables : Dict[Union[Variable :Hashable]:RealNumber]:
         The variables of the objective given as dictionary
         with keys as tequila Variables and values the corresponding real numbers
@@ -368,6 +416,13 @@ def compile(objective: typing.Union['Objective', 'QCircuit'],
         specify the backend or give None for automatic assignment
     noise_model: NoiseModel : (Default value =None) :
         the noise model to apply to the objective or QCircuit.
+    executor: Executor or str : (Default value = None) :
+        evaluate the independent expectation values of the objective with this executor:
+        'serial', 'threads', 'processes' or an instance from tequila.simulators.executors
+    shot_allocation: ShotAllocation or str : (Default value = None) :
+        distribute the samples over the measurement groups of each hamiltonian, samples is then the total number:
+        'uniform', 'proportional', 'variance' or an instance from tequila.simulators.shot_allocation
+        without shot allocation every group is measured with the given number of samples
 
     Returns
     -------
@@ -384,8 +439,13 @@ def compile(objective: typing.Union['Objective', 'QCircuit'],
         # allow hashable types as keys without casting it to variables
         variables = {assign_variable(k): v for k, v in variables.items()}
 
-    if isinstance(objective, Objective) or hasattr(objective, "args"):
-        return compile_objective(objective=objective, variables=variables, backend=backend, noise_model=noise_model)
+    if isinstance(objective, BatchedGradient):
+        compiled = compile_objective(objective=objective.objective, variables=variables, backend=backend,
+                                     noise_model=noise_model)
+        return BatchedGradient(objective=compiled, variables=objective.variables, method=objective.method)
+    elif isinstance(objective, Objective) or hasattr(objective, "args"):
+        return compile_objective(objective=objective, variables=variables, backend=backend, noise_model=noise_model,
+                                 executor=executor, shot_allocation=shot_allocation)
     elif hasattr(objective, "gates") or hasattr(objective, "abstract_circuit"):
         return compile_circuit(abstract_circuit=objective, variables=variables, backend=backend,
                                noise_model=noise_model, *args, **kwargs)
@@ -5,11 +5,22 @@ from tequila.utils.misc import to_float
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.circuit.compiler import change_basis
 from tequila.circuit.gates import Measurement
+from tequila.hamiltonian import PauliString
+from tequila.hamiltonian.grouping import MeasurementGroup, group_qubitwise_commuting
+from tequila.hamiltonian.ketbra import KetBraHamiltonian
+from tequila.simulators.shot_allocation import make_shot_allocation
 from tequila import BitString
-from tequila.objective.objective import Variable, format_variable_dictionary
+from tequila.utils.bitstrings import parity
+from tequila.objective.objective import Objective, Variable, ExpectationValueImpl, format_variable_dictionary
+from tequila.utils.structure import structural_key, HashedKey
+from tequila.utils.state_cache import active_state_cache, shared_states
 from tequila.circuit import compiler
+from tequila.circuit.fusion import fuse_gates
+from tequila.circuit.peephole import peephole_optimize
+from tequila.circuit.gradient import shift_rule_circuit
 
-import numbers, typing, numpy
+import numbers, typing, numpy, time
+from collections import namedtuple
 
 """
 TODO: Classes are now immutable: 
@@ -18,6 +29,403 @@ TODO: Classes are now immutable:
        - Maybe only keep paulistrings and not full hamiltonian types
 """
 
+def pauli_masks(paulistring: dict, qubit_map: dict, n_qubits: int) -> tuple:
+    """
+    Translate a paulistring given as dictionary {qubit: pauli} to bitmasks on the (mapped) register
+    Qubit qubit_map[q] is the bit n_qubits-1-qubit_map[q] of the basis state index (MSB convention)
+    Returns
+    -------
+        tuple of (xmask, zmask, ny) where Y contributes to both masks and ny counts the Y operators
+    """
+    xmask = 0
+    zmask = 0
+    ny = 0
+    for q, p in paulistring.items():
+        bit = 1 << (n_qubits - 1 - qubit_map[q])
+        p = p.upper()
+        if p == "X":
+            xmask |= bit
+        elif p == "Y":
+            xmask |= bit
+            zmask |= bit
+            ny += 1
+        elif p == "Z":
+            zmask |= bit
+        else:
+            raise TequilaException("unknown pauli: {}".format(p))
+    return xmask, zmask, ny
+
+
+def bit_parity(values: numpy.ndarray, mask: int) -> numpy.ndarray:
+    """
+    Parity of the bits selected by mask for an array of basis state indices
+    Returns
+    -------
+        integer array with 0 for even and 1 for odd parity
+    """
+    return parity(numpy.bitwise_and(numpy.asarray(values, dtype=numpy.int64), mask))
+
+
+def restrict_paulistring(paulistring: PauliString, qubits) -> typing.Optional[PauliString]:
+    """
+    Restrict a paulistring to the qubits of a register, the other qubits are in state |0>
+    (<0|Z|0> = 1, <0|X|0> = <0|Y|0> = 0)
+    Returns
+    -------
+        the restricted paulistring with the same coefficient or None if the expectation value vanishes
+    """
+    data = {}
+    for q, p in paulistring.items():
+        if q in qubits:
+            data[q] = p.upper()
+        elif p.upper() != "Z":
+            return None
+    return PauliString(data=data, coeff=paulistring.coeff)
+
+
+SampleStatistics = namedtuple("SampleStatistics", "estimates variances samples")
+
+
+class RunningStatistics:
+    """
+    Running mean and variance of sampled values, chunks are merged with the parallel variance update
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, values: numpy.ndarray, counts: numpy.ndarray):
+        """
+        :param values: the sampled values
+        :param counts: how often each value was sampled
+        """
+        n = numpy.sum(counts)
+        if n == 0:
+            return
+        mean = numpy.dot(values, counts) / n
+        m2 = numpy.dot((values - mean) ** 2, counts)
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = int(total)
+
+    @property
+    def variance(self) -> float:
+        """
+        single shot variance
+        """
+        return self._m2 / max(self.n - 1, 1)
+
+    @property
+    def variance_of_mean(self) -> float:
+        return self.variance / self.n if self.n > 0 else 0.0
+
+
+class CompiledHamiltonian:
+    """
+    QubitHamiltonian translated to the register of a backend circuit
+    Every paulistring is stored as pair of bitmasks so that its action on a basis state is
+    P|i> = i^ny (-1)^popcount(i & zmask) |i ^ xmask>
+    The phases i^ny are absorbed into the coefficients
+    Parts of paulistrings acting on qubits which are not in the register are evaluated on |0>
+    (<0|Z|0> = 1, <0|X|0> = <0|Y|0> = 0)
+    """
+
+    def __init__(self, H, qubit_map: dict, n_qubits: int):
+        self.n_qubits = n_qubits
+        xmasks = []
+        zmasks = []
+        coeffs = []
+        for ps in H.paulistrings:
+            active = {}
+            zero = False
+            for k, v in ps.items():
+                if k in qubit_map:
+                    active[k] = v
+                elif v.upper() != "Z":
+                    zero = True
+                    break
+            if zero:
+                continue
+            xmask, zmask, ny = pauli_masks(paulistring=active, qubit_map=qubit_map, n_qubits=n_qubits)
+            xmasks.append(xmask)
+            zmasks.append(zmask)
+            coeffs.append(ps.coeff * 1.0j ** ny)
+        self.xmasks = numpy.asarray(xmasks, dtype=numpy.int64)
+        self.zmasks = numpy.asarray(zmasks, dtype=numpy.int64)
+        self.coeffs = numpy.asarray(coeffs, dtype=numpy.complex128)
+        self._indices = None
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    @property
+    def indices(self) -> numpy.ndarray:
+        if self._indices is None:
+            self._indices = numpy.arange(2 ** self.n_qubits, dtype=numpy.int64)
+        return self._indices
+
+    def expectation_value(self, state: numpy.ndarray) -> numbers.Number:
+        """
+        Compute <state|H|state>
+        Terms are grouped by their xmask so that the overlap between the state and its permutation
+        is only computed once per group
+        :param state: amplitudes on the register as dense array (MSB ordering),
+            or array of states (one per row) which gives the array of expectation values
+        :return: the expectation value (complex if the hamiltonian is not hermitian)
+        """
+        if len(self.coeffs) == 0:
+            return numpy.zeros(state.shape[:-1]) if state.ndim > 1 else 0.0
+        indices = self.indices
+        E = 0.0
+        for xmask in numpy.unique(self.xmasks):
+            group = numpy.flatnonzero(self.xmasks == xmask)
+            if xmask == 0:
+                overlap = numpy.abs(state) ** 2
+            else:
+                overlap = state[..., indices ^ xmask].conjugate() * state
+            for i in group:
+                zmask = self.zmasks[i]
+                if zmask == 0:
+                    E += self.coeffs[i] * numpy.sum(overlap, axis=-1)
+                else:
+                    E += self.coeffs[i] * numpy.dot(overlap, 1 - 2 * parity(indices & zmask))
+        return E
+
+    def apply(self, state: numpy.ndarray) -> numpy.ndarray:
+        """
+        Compute H|state>
+        Terms are grouped by their xmask so that the permutation of the state is only done once per group
+        :param state: amplitudes on the register as dense array (MSB ordering)
+        :return: the resulting amplitudes as dense array
+        """
+        result = numpy.zeros(len(state), dtype=numpy.complex128)
+        indices = self.indices
+        for xmask in numpy.unique(self.xmasks):
+            group = numpy.flatnonzero(self.xmasks == xmask)
+            permuted = indices ^ xmask
+            shifted = state[permuted] if xmask != 0 else state
+            for i in group:
+                zmask = self.zmasks[i]
+                if zmask == 0:
+                    result += self.coeffs[i] * shifted
+                else:
+                    result += self.coeffs[i] * (1 - 2 * parity(permuted & zmask)) * shifted
+        return result
+
+
+class CompiledKetBra:
+    """
+    KetBraHamiltonian translated to the register of a backend circuit
+    The operator is evaluated from the wavefunctions as <state|ket><bra|state> without its pauli form
+    Qubits of the operator which are not in the register are in |0>,
+    the operator acts as identity on qubits of the register which are not part of it
+    """
+
+    def __init__(self, H: KetBraHamiltonian, qubit_map: dict, n_qubits: int):
+        self.n_qubits = n_qubits
+        self.hermitian = H.hermitian
+        n_operator = H.n_qubits
+        mapped = [q for q in range(n_operator) if q in qubit_map]
+        unmapped = sum(1 << (n_operator - 1 - q) for q in range(n_operator) if q not in qubit_map)
+        mask = sum(1 << (n_qubits - 1 - qubit_map[q]) for q in mapped)
+
+        def embed(wfn):
+            indices, amplitudes = wfn.to_arrays()
+            keep = (indices & unmapped) == 0
+            indices, amplitudes = indices[keep], amplitudes[keep]
+            offsets = numpy.zeros(len(indices), dtype=numpy.int64)
+            for q in mapped:
+                offsets |= ((indices >> (n_operator - 1 - q)) & 1) << (n_qubits - 1 - qubit_map[q])
+            return offsets, numpy.asarray(amplitudes, dtype=numpy.complex128)
+
+        self.ket_offsets, self.ket_amplitudes = embed(H.ket)
+        self.bra_offsets, self.bra_amplitudes = embed(H.bra)
+        # basis states of the register qubits which are not part of the operator
+        self.rest = numpy.flatnonzero((numpy.arange(2 ** n_qubits, dtype=numpy.int64) & mask) == 0)
+
+    def __len__(self):
+        return len(self.ket_amplitudes) + len(self.bra_amplitudes)
+
+    def overlaps(self, state: numpy.ndarray, offsets: numpy.ndarray, amplitudes: numpy.ndarray) -> numpy.ndarray:
+        """
+        :return: (<wfn| x 1)|state> for the wavefunction given by offsets and amplitudes, one entry per rest state
+        """
+        return state[..., self.rest[:, None] | offsets[None, :]].dot(amplitudes.conjugate())
+
+    def expectation_value(self, state: numpy.ndarray) -> numbers.Number:
+        """
+        Compute <state|ket><bra|state> (summed over the rest of the register)
+        :param state: amplitudes on the register as dense array (MSB ordering),
+            or array of states (one per row) which gives the array of expectation values
+        :return: the expectation value (the real part for the hermitian operator)
+        """
+        bra = self.overlaps(state, self.bra_offsets, self.bra_amplitudes)
+        ket = self.overlaps(state, self.ket_offsets, self.ket_amplitudes)
+        E = numpy.sum(ket.conjugate() * bra, axis=-1)
+        return E.real if self.hermitian else E
+
+    def apply(self, state: numpy.ndarray) -> numpy.ndarray:
+        """
+        Compute H|state>
+        :param state: amplitudes on the register as dense array (MSB ordering)
+        :return: the resulting amplitudes as dense array
+        """
+        pairs = [(self.ket_offsets, self.ket_amplitudes, self.bra_offsets, self.bra_amplitudes)]
+        if self.hermitian:
+            pairs.append((self.bra_offsets, self.bra_amplitudes, self.ket_offsets, self.ket_amplitudes))
+        result = numpy.zeros(len(state), dtype=numpy.complex128)
+        for ket_offsets, ket_amplitudes, bra_offsets, bra_amplitudes in pairs:
+            overlaps = self.overlaps(state, bra_offsets, bra_amplitudes)
+            result[self.rest[:, None] | ket_offsets[None, :]] += overlaps[:, None] * ket_amplitudes[None, :]
+        return 0.5 * result if self.hermitian else result
+
+
+def compile_hamiltonian(H, qubit_map: dict, n_qubits: int):
+    """
+    :return: CompiledKetBra for lazy KetBraHamiltonians, CompiledHamiltonian otherwise
+    """
+    if isinstance(H, KetBraHamiltonian):
+        return CompiledKetBra(H=H, qubit_map=qubit_map, n_qubits=n_qubits)
+    return CompiledHamiltonian(H=H, qubit_map=qubit_map, n_qubits=n_qubits)
+
+
+def replace_keys(key, replacements: dict):
+    """
+    Replace parts of a structural key
+    """
+    if key in replacements:
+        return replacements[key]
+    if isinstance(key, tuple):
+        return tuple(replace_keys(x, replacements) for x in key)
+    return key
+
+
+class ParameterSlots:
+    """
+    Parameters of a translated circuit which depend on variables
+    Backends record one slot for every backend parameter (a parametric gate, a symbol, ...) during create_circuit
+    together with a handle to it and the tequila expression (Variable or Objective) which gives its value
+    Identical expressions are evaluated once and expressions of the same form (same transformation of
+    different variables) are evaluated together on arrays
+    """
+
+    def __init__(self):
+        self.handles = []
+        self.expressions = []
+        self._slot_index = []
+        self._unique = {}
+        self._unique_expressions = []
+        self._batches = None
+        self._slot_array = None
+
+    def __len__(self):
+        return len(self.handles)
+
+    def __getitem__(self, slot: int):
+        return self.expressions[slot]
+
+    def add(self, expression, handle=None) -> int:
+        """
+        Record a slot
+        :param expression: the tequila expression which gives the value of the backend parameter
+        :param handle: whatever the backend needs to set the parameter (index, gate, symbol, ...)
+        :return: the index of the slot
+        """
+        key = structural_key(expression)
+        if key not in self._unique:
+            self._unique[key] = len(self._unique_expressions)
+            self._unique_expressions.append(expression)
+        self._slot_index.append(self._unique[key])
+        self.handles.append(handle)
+        self.expressions.append(expression)
+        self._batches = None
+        return len(self.handles) - 1
+
+    def make_batches(self) -> list:
+        """
+        Group the unique expressions into batches of the form [indices, transformation, arguments]
+        where arguments holds one list per argument position of the transformation
+        Plain variables form one batch without transformation, expressions which can not be grouped
+        (e.g. depending on other objectives) form batches of size one
+        """
+        forms = {}
+        batches = []
+        for i, expression in enumerate(self._unique_expressions):
+            if isinstance(expression, Objective) and all(
+                    isinstance(arg, (Variable, numbers.Number)) for arg in expression.args):
+                # the variables are replaced by their argument positions, as they also appear in the closures
+                positions = {structural_key(arg): ("argument", k) for k, arg in enumerate(expression.args) if
+                             isinstance(arg, Variable)}
+                form = (replace_keys(structural_key(expression.transformation), positions), len(expression.args))
+                arguments = expression.args
+            elif isinstance(expression, (Variable, numbers.Number)):
+                form = None
+                arguments = (expression,)
+            else:
+                batches.append([[i], None, [[expression]]])
+                continue
+            if form not in forms:
+                forms[form] = [[], None if form is None else expression.transformation,
+                               [[] for _ in arguments]]
+                batches.append(forms[form])
+            batch = forms[form]
+            batch[0].append(i)
+            for k, arg in enumerate(arguments):
+                batch[2][k].append(arg)
+        return batches
+
+    @staticmethod
+    def evaluate_batch(batch: list, points: list) -> numpy.ndarray:
+        """
+        :param batch: the batch as given by make_batches
+        :param points: list of variable dictionaries
+        :return: the values of the expressions in the batch at all points, shape (expressions, points)
+        """
+        indices, transformation, arguments = batch
+        columns = [numpy.asarray([[arg(variables) if callable(arg) else arg for variables in points] for arg in column])
+                   for column in arguments]
+        if transformation is None:
+            return columns[0]
+        try:
+            values = numpy.asarray(transformation(*columns))
+        except Exception:
+            values = None
+        if values is None or values.shape != (len(indices), len(points)):
+            # the transformation does not act elementwise on arrays, fall back to single evaluations
+            batch[1] = None
+            batch[2] = [[Objective(args=[column[i] for column in arguments], transformation=transformation) for i in
+                         range(len(indices))]]
+            return ParameterSlots.evaluate_batch(batch=batch, points=points)
+        return values
+
+    def batch(self, points: list) -> numpy.ndarray:
+        """
+        :param points: list of variable dictionaries
+        :return: the values of all slots at all points, shape (slots, points)
+        """
+        if self._batches is None:
+            self._batches = self.make_batches()
+            self._slot_array = numpy.asarray(self._slot_index, dtype=numpy.int64)
+        values = numpy.zeros((len(self._unique_expressions), len(points)))
+        for batch in self._batches:
+            result = self.evaluate_batch(batch=batch, points=points)
+            if numpy.iscomplexobj(result):
+                result = numpy.vectorize(to_float)(result)
+            values[batch[0]] = result
+        return values[self._slot_array]
+
+    def __call__(self, variables) -> numpy.ndarray:
+        """
+        :param variables: the variables of the circuit
+        :return: the values of all slots
+        """
+        return self.batch(points=[variables])[:, 0]
+
+
 class BackendCircuit():
     """
     Functions in the end need to be overwritten by specific backend implementation
@@ -46,6 +454,14 @@ class BackendCircuit():
         "cc_max": True
     }
 
+    # backends which record their variable dependent parameters in self.parameter_slots during create_circuit
+    # set this to True and implement update_parameters
+    records_parameter_slots = False
+
+    # backends which translate DenseGateImpl can merge gates without variables into dense blocks
+    # on up to this many qubits before the translation (see tequila.circuit.fusion), 0 disables the fusion
+    fusion_qubits = 0
+
     @property
     def n_qubits(self) -> numbers.Integral:
         return len(self.qubit_map)
@@ -79,7 +495,13 @@ class BackendCircuit():
         self.qubit_map = self.make_qubit_map(qubits)
 
         compiled = c(abstract_circuit)
+        # noise models act on the individual gates, so the gates are only optimized without noise
+        if optimize_circuit and noise_model is None:
+            compiled = peephole_optimize(circuit=compiled)
+            if self.fusion_qubits > 0:
+                compiled = fuse_gates(circuit=compiled, max_qubits=self.fusion_qubits)
         self.abstract_circuit = compiled
+        self.parameter_slots = ParameterSlots()
         # translate into the backend object
         self.circuit = self.create_circuit(abstract_circuit=compiled, variables=variables)
 
@@ -138,10 +560,23 @@ class BackendCircuit():
 
     def update_variables(self, variables):
         """
-        This is the default which just translates the circuit again
-        Overwrite in backend if parametrized circuits are supported
+        Backends which record parameter slots only recompute the values of the slots
+        The default for all other backends is to translate the circuit again
+        """
+        if self.records_parameter_slots:
+            if len(self.parameter_slots) > 0:
+                self.update_parameters(handles=self.parameter_slots.handles, values=self.parameter_slots(variables))
+        else:
+            self.circuit = self.create_circuit(abstract_circuit=self.abstract_circuit, variables=variables)
+
+    def update_parameters(self, handles: list, values: numpy.ndarray):
+        """
+        Set the parameters of the translated circuit
+        Overwrite in backends which record parameter slots
+        :param handles: the handles of the slots as recorded in create_circuit
+        :param values: the new values of the slots
         """
-        self.circuit = self.create_circuit(abstract_circuit=self.abstract_circuit, variables=variables)
+        raise TequilaException("Backend Handler needs to be overwritten for backends which record parameter slots")
 
     def simulate(self, variables, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
         """
@@ -161,7 +596,8 @@ class BackendCircuit():
 
         all_qubits = [i for i in range(self.abstract_circuit.n_qubits)]
         if self.use_mapping:
-            active_qubits = self.abstract_circuit.qubits
+            # the qubits of the original circuit, optimized circuits may not act on all of them
+            active_qubits = list(self.qubits)
             # maps from reduced register to full register
             keymap = KeyMapSubregisterToRegister(subregister=active_qubits, register=all_qubits)
         else:
@@ -171,47 +607,66 @@ class BackendCircuit():
         result.apply_keymap(keymap=keymap, initial_state=initial_state)
         return result
 
+    def simulate_amplitudes(self, variables, initial_state=0, *args, **kwargs) -> numpy.ndarray:
+        """
+        Simulate the wavefunction without mapping it back to the full register
+        Overwrite in backend if the amplitudes are directly accessible
+        :param initial_state: integer on the register of the backend circuit
+        :return: The amplitudes as dense array on the register of the backend circuit (MSB ordering)
+        """
+        self.update_variables(variables)
+        wfn = self.do_simulate(variables=variables, initial_state=initial_state, *args, **kwargs)
+        return wfn.to_dense(n_qubits=self.n_qubits).to_array()
+
+    def simulate_amplitudes_batch(self, variables: list, initial_state=0, *args, **kwargs) -> numpy.ndarray:
+        """
+        Simulate the wavefunctions for many parameter points
+        Overwrite in backend if the points can be simulated together
+        :param variables: list of variable dictionaries
+        :param initial_state: integer on the register of the backend circuit
+        :return: The amplitudes as array with one row per point (register of the backend circuit, MSB ordering)
+        """
+        return numpy.asarray([self.simulate_amplitudes(variables=v, initial_state=initial_state, *args, **kwargs) for
+                              v in variables])
+
     def sample_paulistring(self, samples: int, paulistring, *args,
                            **kwargs) -> numbers.Real:
-        # make basis change and translate to backend
-        basis_change = QCircuit()
-        not_in_u = []  # all indices of the paulistring which are not part of the circuit i.e. will always have the same outcome
-        qubits = []
-        for idx, p in paulistring.items():
-            if idx not in self.abstract_qubit_map:
-                not_in_u.append(idx)
-            else:
-                qubits.append(idx)
-                basis_change += change_basis(target=idx, axis=p)
-
-        # check the constant parts as <0|pauli|0>, can only be 0 or 1
-        # so we can do a fast return of one of them is not Z
-        for i in not_in_u:
-            pauli = paulistring[i]
-            if pauli.upper() != "Z":
-                return 0.0
-
-        # make measurement instruction
-        measure = QCircuit()
-        if len(qubits) == 0:
+        # the constant parts are evaluated as <0|pauli|0>
+        paulistring = restrict_paulistring(paulistring=paulistring, qubits=self.abstract_qubit_map)
+        if paulistring is None:
+            return 0.0
+        elif len(paulistring) == 0:
             # no measurement instructions for a constant term as paulistring
             return paulistring.coeff
-        else:
-            measure += Measurement(target=qubits)
-            #measure += Measurement(name=str(paulistring), target=qubits)
-            circuit = self.circuit + self.create_circuit(basis_change + measure)
-            # run simulators
-            counts = self.do_sample(samples=samples, circuit=circuit, *args, **kwargs)
-            # compute energy
-            E = 0.0
-            n_samples = 0
-            for key, count in counts.items():
-                parity = key.array.count(1)
-                sign = (-1) ** parity
-                E += sign * count
-                n_samples += count
-            E = E / samples * paulistring.coeff
-            return E
+        values, counts = self.sample_measurement_group(samples=samples,
+                                                       group=MeasurementGroup(paulistrings=[paulistring]), *args,
+                                                       **kwargs)
+        return numpy.dot(values, counts) / samples
+
+    def sample_measurement_group(self, samples: int, group: MeasurementGroup, *args, **kwargs) -> tuple:
+        """
+        Measure all paulistrings of a group on one set of shots
+        The paulistrings need to act on qubits of the circuit only (see restrict_paulistring)
+        :return: tuple (values, counts): the measured values of the sum of the paulistrings (with coefficients)
+        for every measured bitstring and how often the bitstring was measured
+        """
+        # make basis change and translate to backend
+        basis_change = QCircuit()
+        for idx, p in group.basis.items():
+            basis_change += change_basis(target=idx, axis=p)
+        # all qubits are measured, so the layout of the measured bitstrings is the same for all backends
+        measured = sorted(self.abstract_qubit_map.keys())
+        position = {q: i for i, q in enumerate(measured)}
+        circuit = self.circuit + self.create_circuit(basis_change + Measurement(target=measured))
+        # run simulators
+        keys, counts = self.do_sample(samples=samples, circuit=circuit, *args, **kwargs).to_arrays()
+        counts = numpy.asarray(counts, dtype=float)
+        # compute energy
+        values = numpy.zeros(len(keys))
+        for ps in group.paulistrings:
+            xmask, zmask, ny = pauli_masks(paulistring=ps, qubit_map=position, n_qubits=len(measured))
+            values += ps.coeff * (1.0 - 2.0 * bit_parity(keys, xmask | zmask))
+        return values, counts
 
     def sample(self, variables, samples, *args, **kwargs):
         self.update_variables(variables)
@@ -299,24 +754,55 @@ class BackendExpectationValue:
         self._U = self.initialize_unitary(E.U, variables, noise_model)
         self._H = self.initialize_hamiltonian(E.H)
         self._abstract_hamiltonians = E.H
+        self._abstract_unitary = E.U
+        self._shifted = None
+        self._shift_rules = None
+        self._adjoint_rules = None
+        self._measurement_groups = None
+        # expectation values with the same key simulate the same state (see cached_state)
+        # the qubit map is part of the key since the hamiltonians can extend the register of the circuit
+        self._state_key = HashedKey((type(self), E.U, self.U.n_qubits,
+                                     tuple(sorted(self.U.abstract_qubit_map.items())), structural_key(noise_model)))
         self._variables = E.extract_variables()
         self._contraction = E._contraction
         self._shape = E._shape
 
     def __call__(self, variables, samples: int = None, *args, **kwargs):
 
+        variables = self.check_variables(variables)
+        if samples is None:
+            data = self.simulate(variables=variables, *args, **kwargs)
+        else:
+            data = self.sample(variables=variables, samples=samples, *args, **kwargs)
+        return self.finalize(data)
+
+    def batch(self, variables: list, samples: int = None, *args, **kwargs) -> numpy.ndarray:
+        """
+        Evaluate the expectation value at many parameter points
+        :param variables: list of variable dictionaries
+        :param samples: number of samples per point, None for full simulation
+        :return: array with one entry per point
+        """
+        variables = [self.check_variables(v) for v in variables]
+        if samples is None:
+            data = self.simulate_batch(variables=variables, *args, **kwargs)
+        else:
+            data = [self.sample(variables=v, samples=samples, *args, **kwargs) for v in variables]
+        return numpy.asarray([self.finalize(x) for x in data])
+
+    def check_variables(self, variables):
         variables = format_variable_dictionary(variables=variables)
         if self._variables is not None and len(self._variables) > 0:
             if variables is None or (not set(self._variables) <= set(variables.keys())):
                 raise TequilaException(
                     "BackendExpectationValue received not all variables. Circuit depends on variables {}, you gave {}".format(
                         self._variables, variables))
+        return variables
 
-        if samples is None:
-            data = self.simulate(variables=variables, *args, **kwargs)
-        else:
-            data = self.sample(variables=variables, samples=samples, *args, **kwargs)
-
+    def finalize(self, data: numpy.ndarray):
+        """
+        Bring the values of the hamiltonians into the shape of the expectation value
+        """
         if self._shape is None and self._contraction is None:
             # this is the default
             return numpy.sum(data)
@@ -328,8 +814,21 @@ class BackendExpectationValue:
         else:
             return self._contraction(data)
 
-    def initialize_hamiltonian(self, H):
-        return tuple(H)
+    def initialize_hamiltonian(self, hamiltonians):
+        """
+        Translate the hamiltonians into bitmasks on the register of the circuit
+        self._abstract_hamiltonians keeps the original tequila hamiltonians
+        """
+        result = []
+        for H in hamiltonians:
+            if not self.use_mapping and H.qubits != self.U.qubits:
+                raise TequilaException(
+                    "Can not compute expectation value without using qubit mappings."
+                    " Your Hamiltonian and your Unitary do not act on the same set of qubits. "
+                    "Hamiltonian acts on {}, Unitary acts on {}".format(
+                        H.qubits, self.U.qubits))
+            result.append(compile_hamiltonian(H=H, qubit_map=self.U.abstract_qubit_map, n_qubits=self.U.n_qubits))
+        return tuple(result)
 
     def initialize_unitary(self, U, variables, noise_model):
         return self.BackendCircuitType(abstract_circuit=U, variables=variables, use_mapping=self.use_mapping,
@@ -338,44 +837,244 @@ class BackendExpectationValue:
     def update_variables(self, variables):
         self._U.update_variables(variables=variables)
 
-    def sample(self, variables, samples, *args, **kwargs) -> numpy.array:
+    @property
+    def measurement_groups(self) -> tuple:
+        """
+        The paulistrings of the hamiltonians restricted to the qubits of the circuit
+        and partitioned into qubit-wise commuting groups, computed once
+        :return: tuple with one pair (constant, list of MeasurementGroups) per hamiltonian
+        """
+        if self._measurement_groups is None:
+            result = []
+            for H in self._abstract_hamiltonians:
+                constant = 0.0
+                paulistrings = []
+                for ps in H.paulistrings:
+                    ps = restrict_paulistring(paulistring=ps, qubits=self.U.abstract_qubit_map)
+                    if ps is None:
+                        continue
+                    elif len(ps) == 0:
+                        constant += ps.coeff
+                    else:
+                        paulistrings.append(ps)
+                result.append((constant, group_qubitwise_commuting(paulistrings)))
+            self._measurement_groups = tuple(result)
+        return self._measurement_groups
+
+    def sample(self, variables, samples, shot_allocation=None, *args, **kwargs) -> numpy.array:
+        """
+        Every group of qubit-wise commuting paulistrings is estimated from one set of samples
+        :param samples: number of samples for every group or
+        total number of samples for each hamiltonian if a shot_allocation is given
+        :param shot_allocation: ShotAllocation or name of a shot allocation (see tequila.simulators.shot_allocation)
+        For streaming with early stopping see sample_statistics
+        """
+        return self.sample_statistics(variables=variables, samples=samples, shot_allocation=shot_allocation, *args,
+                                      **kwargs).estimates
+
+    def sample_with_error(self, variables, samples, shot_allocation=None, *args, **kwargs) -> tuple:
+        """
+        Same as calling the expectation value with samples, but gives back the standard error of the estimate as well
+        :return: tuple (estimate, standard error) in the shape of the expectation value
+        """
+        if self._contraction is not None:
+            raise TequilaException("standard errors of contracted expectation values are not supported")
+        variables = self.check_variables(variables)
+        statistics = self.sample_statistics(variables=variables, samples=samples, shot_allocation=shot_allocation,
+                                            *args, **kwargs)
+        values, variances = statistics.estimates, statistics.variances
+        if self._shape is None:
+            return numpy.sum(values), numpy.sqrt(numpy.sum(variances))
+        return values.reshape(self._shape), numpy.sqrt(variances).reshape(self._shape)
+
+    def sample_statistics(self, variables, samples, shot_allocation=None, target_error: float = None,
+                          time_budget: float = None, chunk: int = None, *args, **kwargs) -> SampleStatistics:
+        """
+        Sample all measurement groups and keep track of the statistics
+        If target_error or time_budget is given, the samples are drawn in chunks (streaming)
+        until the standard error of the sum of all hamiltonians is below target_error,
+        the time budget is used up or all samples are used (samples is then the maximal number)
+        :param target_error: stop when the standard error is below this value
+        :param time_budget: stop when sampling took longer than this (in seconds)
+        :param chunk: number of samples in every chunk (counted like samples), defaults to a tenth of samples
+        :return: SampleStatistics with the estimates, the variances of the estimates and the number of samples
+        which were used, with one entry per hamiltonian
+        """
+        shot_allocation = make_shot_allocation(shot_allocation)
         self.update_variables(variables)
+        sample_group = self.group_sampler(*args, **kwargs)
 
-        result = []
-        for H in self.H:
-            E = 0.0
-            for ps in H.paulistrings:
-                E += self.sample_paulistring(samples=samples, paulistring=ps, *args, **kwargs)
-            result.append(to_float(E))
-        return numpy.asarray(result)
+        streaming = target_error is not None or time_budget is not None
+        if not streaming:
+            chunk = samples
+        elif chunk is None:
+            chunk = max(samples // 10, 1)
+        start = time.time()
+        statistics = [[RunningStatistics() for group in groups] for constant, groups in self.measurement_groups]
+        used = [0] * len(statistics)
+        while True:
+            for i, (constant, groups) in enumerate(self.measurement_groups):
+                if len(groups) == 0:
+                    used[i] = samples
+                n = min(chunk, samples - used[i])
+                if n <= 0:
+                    continue
+                if shot_allocation is None:
+                    shots = [n] * len(groups)
+                else:
+                    n = max(n, len(groups))
+                    shots = shot_allocation.allocate(samples=n, groups=groups)
+                for running, group, m in zip(statistics[i], groups, shots):
+                    running.add(*sample_group(group, m))
+                used[i] += n
+
+            variances = numpy.asarray([sum(x.variance_of_mean for x in groups) for groups in statistics])
+            if not streaming or all(x >= samples for x in used):
+                break
+            if target_error is not None and numpy.sqrt(numpy.sum(variances)) <= target_error:
+                break
+            if time_budget is not None and time.time() - start >= time_budget:
+                break
+
+        if shot_allocation is not None:
+            for (constant, groups), running in zip(self.measurement_groups, statistics):
+                shot_allocation.update(groups=groups, variances=[x.variance for x in running])
+        estimates = [to_float(constant + sum(x.mean for x in running)) for (constant, groups), running in
+                     zip(self.measurement_groups, statistics)]
+        return SampleStatistics(estimates=numpy.asarray(estimates), variances=variances,
+                                samples=numpy.asarray([sum(x.n for x in running) for running in statistics]))
+
+    def group_sampler(self, *args, **kwargs) -> typing.Callable:
+        """
+        Called after the variables were updated
+        Overwrite in backend if the measurement groups can share work (e.g. simulate U only once)
+        :return: callable (group, samples) -> (values, counts) which measures a measurement group
+        (see BackendCircuit.sample_measurement_group)
+        """
+        return lambda group, samples: self.U.sample_measurement_group(samples=samples, group=group, *args, **kwargs)
+
+    def cached_state(self, variables, simulate: typing.Callable, initial_state=0):
+        """
+        Share simulated states between expectation values with the same circuit
+        while a state cache is open (see tequila.utils.state_cache)
+        :param simulate: called without arguments if the state is not cached
+        :return: the simulated state, it must not be modified
+        """
+        cache = active_state_cache()
+        if cache is None:
+            return simulate()
+        key = (self._state_key, initial_state, tuple(variables[v] for v in self._variables))
+        if key not in cache:
+            cache[key] = simulate()
+        return cache[key]
 
     def simulate(self, variables, *args, **kwargs):
-        self.update_variables(variables)
+        state = self.cached_state(variables=variables, initial_state=kwargs.get("initial_state", 0),
+                                  simulate=lambda: self.U.simulate_amplitudes(variables=variables, *args, **kwargs))
         result = []
         for H in self.H:
-            final_E = 0.0
-            if self.use_mapping:
-                # The hamiltonian can be defined on more qubits as the unitaries
-                qubits_h = H.qubits
-                qubits_u = self.U.qubits
-                all_qubits = list(set(qubits_h) | set(qubits_u) | set(range(self.U.abstract_circuit.max_qubit() + 1)))
-                keymap = KeyMapSubregisterToRegister(subregister=qubits_u, register=all_qubits)
-            else:
-                if H.qubits != self.U.qubits:
-                    raise TequilaException(
-                        "Can not compute expectation value without using qubit mappings."
-                        " Your Hamiltonian and your Unitary do not act on the same set of qubits. "
-                        "Hamiltonian acts on {}, Unitary acts on {}".format(
-                            H.qubits, self.U.qubits))
-                keymap = KeyMapSubregisterToRegister(subregister=self.U.qubits, register=self.U.qubits)
-            # TODO inefficient, let the backend do it if possible or interface some library
-            simresult = self.U.simulate(variables=variables, *args, **kwargs)
-            wfn = simresult.apply_keymap(keymap=keymap)
-            final_E += wfn.compute_expectationvalue(operator=H)
-
-            result.append(to_float(final_E))
+            result.append(to_float(H.expectation_value(state=state)))
         return numpy.asarray(result)
 
+    def simulate_batch(self, variables: list, *args, **kwargs) -> numpy.ndarray:
+        """
+        Overwrite in backend if the points can be simulated together
+        :param variables: list of variable dictionaries
+        :return: the values of the hamiltonians with one row per point
+        """
+        return numpy.asarray([self.simulate(variables=v, *args, **kwargs) for v in variables])
+
+    def gradient(self, variables, samples: int = None, method: str = "shift", *args, **kwargs) -> typing.Dict[
+        Variable, numbers.Real]:
+        """
+        Gradient with respect to all variables of the expectation value
+        Overwrite in backend to support more methods
+        :param method: 'shift': parameter shift rule on a circuit which is compiled only once
+                       'adjoint': adjoint differentiation, needs full wavefunction simulation
+        :return: dictionary {variable: derivative}
+        """
+        if self._contraction is not None:
+            raise TequilaException("gradients of contracted expectation values are not supported")
+        if method == "shift":
+            return self.shift_gradient(variables=variables, samples=samples, *args, **kwargs)
+        elif method == "adjoint":
+            if samples is not None:
+                raise TequilaException("adjoint gradients need full wavefunction simulation, samples are not supported")
+            if self.U.noise_model is not None:
+                raise TequilaException("adjoint gradients can not be combined with noise models")
+            return self.adjoint_gradient(variables=format_variable_dictionary(variables), *args, **kwargs)
+        else:
+            raise TequilaException("gradient method {} is not supported by {}".format(method, type(self).__name__))
+
+    def shift_gradient(self, variables, samples: int = None, *args, **kwargs) -> typing.Dict[Variable, numbers.Real]:
+        """
+        Parameter shift rule for all parametrized gates
+        The shifted circuits are represented by a single backend circuit with additional shift variables
+        so every shifted evaluation only updates the angles
+        """
+        variables = format_variable_dictionary(variables)
+        if self._shifted is None:
+            circuit, self._shift_rules = shift_rule_circuit(self._abstract_unitary)
+            shifts = {rule[0]: 0.0 for rule in self._shift_rules}
+            E = ExpectationValueImpl(U=circuit, H=self._abstract_hamiltonians, shape=self._shape)
+            self._shifted = type(self)(E, variables={**variables, **shifts}, noise_model=self.U.noise_model)
+
+        shifts = {rule[0]: 0.0 for rule in self._shift_rules}
+        result = {}
+        # the shifted circuits share the states of their unshifted prefix
+        with shared_states():
+            for shift_variable, shift, derivatives in self._shift_rules:
+                weights = {}
+                for k, d in derivatives.items():
+                    w = d(variables) if hasattr(d, "__call__") else d
+                    if w != 0.0:
+                        weights[k] = shift * w
+                if len(weights) == 0:
+                    continue
+                shifts[shift_variable] = numpy.pi / (4 * shift)
+                Eplus = self._shifted(variables={**variables, **shifts}, samples=samples, *args, **kwargs)
+                shifts[shift_variable] = -numpy.pi / (4 * shift)
+                Eminus = self._shifted(variables={**variables, **shifts}, samples=samples, *args, **kwargs)
+                shifts[shift_variable] = 0.0
+                for k, w in weights.items():
+                    if k in result:
+                        result[k] = result[k] + w * (Eplus - Eminus)
+                    else:
+                        result[k] = w * (Eplus - Eminus)
+        return result
+
+    def adjoint_gradient(self, variables, *args, **kwargs) -> typing.Dict[Variable, numbers.Real]:
+        """
+        Adjoint differentiation: the circuit is simulated once forward, afterwards the state and H|state>
+        are propagated backwards through the daggered gates and the derivative with respect to every gate parameter
+        is an overlap of the two
+        Needs gate-wise access to the wavefunction, overwrite in backends which support it
+        and collect the derivatives with chain_gate_gradients
+        """
+        raise TequilaException("gradient method adjoint is not supported by {}".format(type(self).__name__))
+
+    def chain_gate_gradients(self, variables, gate_gradients: list) -> typing.Dict[Variable, numbers.Real]:
+        """
+        Chain rule from derivatives with respect to gate parameters to derivatives with respect to the variables
+        :param gate_gradients: list of tuples (derivatives of the gate parameter from parameter_derivatives,
+            array with the derivatives of the expectation values of all hamiltonians with respect to the gate parameter)
+        :return: dictionary {variable: derivative} in the same shape as the expectation value
+        """
+        result = {}
+        for derivatives, gradient in gate_gradients:
+            for k, d in derivatives.items():
+                w = d(variables) if hasattr(d, "__call__") else d
+                if k in result:
+                    result[k] = result[k] + w * gradient
+                else:
+                    result[k] = w * gradient
+        for k, v in result.items():
+            if self._shape is None:
+                result[k] = numpy.sum(v)
+            else:
+                result[k] = v.reshape(self._shape)
+        return result
+
     def sample_paulistring(self, samples: int,
                            paulistring,*args,**kwargs) -> numbers.Real:
         return self.U.sample_paulistring(samples=samples, paulistring=paulistring,*args,**kwargs)
@@ -1,7 +1,8 @@
 from tequila.simulators.simulator_base import QCircuit, BackendCircuit, BackendExpectationValue
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila import TequilaException
-from tequila import BitString, BitNumbering
+from tequila import BitNumbering
+from tequila.utils.bitstrings import integers_from_bits
 import sympy
 
 import numpy as np
@@ -47,6 +48,7 @@ class BackendCircuitCirq(BackendCircuit):
     }
 
     numbering: BitNumbering = BitNumbering.MSB
+    records_parameter_slots = True
 
     def __init__(self, abstract_circuit: QCircuit, variables, use_mapping=True,noise_model=None, *args, **kwargs):
 
@@ -65,13 +67,9 @@ class BackendCircuitCirq(BackendCircuit):
 
         self.tq_to_sympy={}
         self.counter=0
+        self.resolver=cirq.ParamResolver({})
         super().__init__(abstract_circuit=abstract_circuit, variables=variables,noise_model=noise_model, use_mapping=use_mapping, *args, **kwargs)
-        if len(self.tq_to_sympy.keys()) is None:
-            self.sympy_to_tq = None
-            self.resolver=None
-        else:
-            self.sympy_to_tq = {v: k for k, v in self.tq_to_sympy.items()}
-            self.resolver=cirq.ParamResolver({k:v(variables) for k,v in self.sympy_to_tq.items()})
+        self.update_variables(variables)
         if self.noise_model is not None:
             self.noise_lookup = {
                 'bit flip': [lambda x: cirq.bit_flip(x)],
@@ -87,20 +85,16 @@ class BackendCircuitCirq(BackendCircuit):
 
     def do_simulate(self, variables, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
         simulator = cirq.Simulator()
-        backend_result = simulator.simulate(program=self.circuit,param_resolver=self.resolver, initial_state=initial_state)
-        return QubitWaveFunction.from_array(arr=backend_result.final_state, numbering=self.numbering)
+        # the qubit order includes qubits without gates (e.g. when all their gates cancelled)
+        backend_result = simulator.simulate(program=self.circuit, param_resolver=self.resolver,
+                                            qubit_order=sorted(self.qubit_map.values()), initial_state=initial_state)
+        return QubitWaveFunction.from_dense(arr=backend_result.final_state, numbering=self.numbering)
 
     def convert_measurements(self, backend_result: cirq.TrialResult) -> QubitWaveFunction:
         assert (len(backend_result.measurements) == 1)
         for key, value in backend_result.measurements.items():
-            counter = QubitWaveFunction()
-            for sample in value:
-                binary = BitString.from_array(array=sample.astype(int))
-                if binary in counter._state:
-                    counter._state[binary] += 1
-                else:
-                    counter._state[binary] = 1
-            return counter
+            value = np.asarray(value)
+            return QubitWaveFunction.from_counts(outcomes=integers_from_bits(value), n_qubits=value.shape[-1])
 
     def do_sample(self, samples,circuit, *args, **kwargs) -> QubitWaveFunction:
         return self.convert_measurements(cirq.sample(program=circuit,param_resolver=self.resolver, repetitions=samples))
@@ -121,6 +115,7 @@ class BackendCircuitCirq(BackendCircuit):
             except:
                 par = sympy.Symbol('{}_{}'.format(self._name_variable_objective(gate.parameter),str(self.counter)))
                 self.tq_to_sympy[gate.parameter] = par
+                self.parameter_slots.add(expression=gate.parameter, handle=par)
                 self.counter += 1
         cirq_gate = op(**mapping(par)).on(*[self.qubit_map[t] for t in gate.target])
         if gate.is_controlled():
@@ -153,14 +148,11 @@ class BackendCircuitCirq(BackendCircuit):
                         new_ops.append(channel(noise.probs[i]).on_each([q for q in op.qubits]))
         return cirq.Circuit(*new_ops)
 
-    def update_variables(self, variables):
+    def update_parameters(self, handles: list, values: np.ndarray):
         """
-        overriding the underlying base to make sure this stuff remains noisy
+        only the resolver changes, so the (noisy) circuit is kept
         """
-        if self.sympy_to_tq is not None:
-            self.resolver=cirq.ParamResolver({k:v(variables) for k,v in self.sympy_to_tq.items()})
-        else:
-            self.resolver=None
+        self.resolver=cirq.ParamResolver(dict(zip(handles, values)))
 
 class BackendExpectationValueCirq(BackendExpectationValue):
     BackendCircuitType = BackendCircuitCirq
\ No newline at end of file
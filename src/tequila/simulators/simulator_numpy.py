@@ -0,0 +1,446 @@
+from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue, pauli_masks
+from tequila.circuit.gradient import parameter_derivatives
+from tequila.circuit._gates_impl import DenseGateImpl
+from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+from tequila.utils.bitstrings import BitNumbering, parity
+from tequila.utils import to_float
+from tequila.utils.state_cache import active_prefix_cache
+from tequila import TequilaException
+import numbers, numpy
+
+"""
+Dense statevector simulator which only depends on numpy
+The state is stored as complex128 array of length 2**n_qubits
+Gates are applied by reshaping the state into a (2,)*n_qubits tensor and contracting
+the gate matrix with the target axes
+Axis k of the tensor corresponds to qubit k of the (mapped) register, i.e. the MSB convention of tequila
+"""
+
+
+class TequilaNumpyException(TequilaException):
+    def __str__(self):
+        return "Error in numpy backend:" + self.message
+
+
+def rotation_matrix(axis: str, angle: numbers.Real) -> numpy.ndarray:
+    """
+    Same convention as for the rest of tequila: R_axis(angle) = exp(-i angle/2 * pauli)
+    For an array of angles the array of matrices is returned
+    """
+    c = numpy.cos(angle / 2.0)
+    s = numpy.sin(angle / 2.0)
+    if axis == "x":
+        matrix = numpy.array([[c, -1.0j * s], [-1.0j * s, c]], dtype=numpy.complex128)
+    elif axis == "y":
+        matrix = numpy.array([[c, -s], [s, c]], dtype=numpy.complex128)
+    elif axis == "z":
+        zero = numpy.zeros_like(c)
+        matrix = numpy.array([[numpy.exp(-0.5j * angle), zero], [zero, numpy.exp(0.5j * angle)]],
+                             dtype=numpy.complex128)
+    else:
+        raise TequilaNumpyException("unknown rotation axis {}".format(axis))
+    if matrix.ndim > 2:
+        matrix = numpy.moveaxis(matrix, (0, 1), (-2, -1))
+    return matrix
+
+
+class NumpyGate:
+    """
+    A gate translated for the numpy backend
+    targets and controls are axes of the state tensor
+    the matrix acts on the targets (first target is the most significant) if all controls are in state |1>
+    parametrized gates keep their tequila parameter and recompute the matrix in set_value
+    """
+
+    def __init__(self, targets, controls=None, matrix=None, parameter=None, generator=None, name=None):
+        self.targets = tuple(targets)
+        self.controls = tuple() if controls is None else tuple(controls)
+        self.matrix = matrix
+        self.parameter = parameter
+        self.generator = generator
+        self.name = name
+        self.value = None
+
+    def cache_key(self) -> tuple:
+        """
+        :return: hashable key which is equal for gates acting in the same way (see PrefixStateCache)
+        """
+        return (self.name, self.targets, self.controls, self.value)
+
+    def is_parametrized(self) -> bool:
+        return self.generator is not None
+
+    def update_variables(self, variables):
+        self.set_value(self.parameter(variables))
+
+    def set_value(self, value, matrix: numpy.ndarray = None):
+        self.value = value
+        self.matrix = self.generator(value) if matrix is None else matrix
+
+    def apply_matrix(self, matrix: numpy.ndarray, state: numpy.ndarray, n_qubits: int,
+                     project: bool = False) -> numpy.ndarray:
+        """
+        Apply the matrix on the targets if all controls are in state |1>
+        States can carry a leading batch axis (one state per parameter point), the matrix is then either
+        shared or given per point
+        :param project: set the amplitudes where the controls are not all |1> to zero instead of keeping them
+        """
+        batch = state.shape[:-1]
+        offset = len(batch)
+        tensor = state.reshape(batch + (2,) * n_qubits)
+        if len(self.controls) == 0:
+            return contract(matrix=matrix, tensor=tensor, axes=tuple(t + offset for t in self.targets)).reshape(
+                state.shape)
+
+        # act only on the subspace where all controls are |1>
+        index = [slice(None)] * (n_qubits + offset)
+        for c in self.controls:
+            index[c + offset] = 1
+        index = tuple(index)
+        axes = tuple(t + offset - sum(c < t for c in self.controls) for t in self.targets)
+        if project:
+            result = numpy.zeros_like(tensor)
+            result[index] = contract(matrix=matrix, tensor=tensor[index], axes=axes)
+            return result.reshape(state.shape)
+        tensor[index] = contract(matrix=matrix, tensor=tensor[index], axes=axes)
+        return tensor.reshape(state.shape)
+
+    def apply(self, state: numpy.ndarray, n_qubits: int, *args, **kwargs) -> numpy.ndarray:
+        return self.apply_matrix(matrix=self.matrix, state=state, n_qubits=n_qubits)
+
+    def apply_dagger(self, state: numpy.ndarray, n_qubits: int, *args, **kwargs) -> numpy.ndarray:
+        return self.apply_matrix(matrix=numpy.swapaxes(self.matrix.conjugate(), -1, -2), state=state,
+                                 n_qubits=n_qubits)
+
+    def apply_derivative(self, state: numpy.ndarray, n_qubits: int, *args, **kwargs) -> numpy.ndarray:
+        """
+        Derivative of the gate with respect to its parameter applied to the state (the state is not changed)
+        Uses d/da R(a) = -i/2 P R(a) = 1/2 R(a + pi) for the rotations
+        """
+        matrix = 0.5 * self.generator(self.value + numpy.pi)
+        return self.apply_matrix(matrix=matrix, state=state.copy(), n_qubits=n_qubits, project=True)
+
+
+class NumpyExpPauliGate(NumpyGate):
+    """
+    exp(-i angle/2 * coeff * paulistring) applied as cos(angle/2) - i sin(angle/2) P
+    with P acting as a signed permutation given by bitmasks
+    """
+
+    def __init__(self, xmask: int, zmask: int, ny: int, parameter, coeff=1.0):
+        super().__init__(targets=[], parameter=parameter, generator=None, name="Exp-Pauli")
+        self.xmask = xmask
+        self.zmask = zmask
+        self.ny = ny
+        self.coeff = coeff
+        self.angle = None
+
+    def is_parametrized(self) -> bool:
+        return True
+
+    def cache_key(self) -> tuple:
+        return (self.name, self.xmask, self.zmask, self.ny, self.angle)
+
+    def update_variables(self, variables):
+        self.set_value(self.parameter(variables))
+
+    def set_value(self, value):
+        if numpy.ndim(value) > 0:
+            # one angle per parameter point
+            self.angle = numpy.real(numpy.asarray(value) * self.coeff)
+        else:
+            self.angle = to_float(value * self.coeff)
+
+    def apply_angle(self, angle: float, state: numpy.ndarray, indices: numpy.ndarray = None) -> numpy.ndarray:
+        if indices is None:
+            indices = numpy.arange(state.shape[-1], dtype=numpy.int64)
+        c = numpy.cos(angle / 2.0)
+        s = numpy.sin(angle / 2.0)
+        if numpy.ndim(angle) > 0:
+            c = c[:, None]
+            s = s[:, None]
+        return c * state - 1.0j * s * apply_pauli(state=state, indices=indices, xmask=self.xmask, zmask=self.zmask,
+                                                  ny=self.ny)
+
+    def apply(self, state: numpy.ndarray, n_qubits: int, indices: numpy.ndarray = None, *args, **kwargs):
+        return self.apply_angle(angle=self.angle, state=state, indices=indices)
+
+    def apply_dagger(self, state: numpy.ndarray, n_qubits: int, indices: numpy.ndarray = None, *args, **kwargs):
+        return self.apply_angle(angle=-self.angle, state=state, indices=indices)
+
+    def apply_derivative(self, state: numpy.ndarray, n_qubits: int, indices: numpy.ndarray = None, *args, **kwargs):
+        """
+        the angle is coeff*parameter, so the derivative with respect to the parameter is coeff/2 U(angle + pi)
+        """
+        return 0.5 * self.coeff * self.apply_angle(angle=self.angle + numpy.pi, state=state, indices=indices)
+
+
+class NumpyMeasurement(NumpyGate):
+
+    def apply(self, state: numpy.ndarray, *args, **kwargs) -> numpy.ndarray:
+        return state
+
+    def apply_dagger(self, state: numpy.ndarray, *args, **kwargs) -> numpy.ndarray:
+        return state
+
+
+def contract(matrix: numpy.ndarray, tensor: numpy.ndarray, axes: tuple) -> numpy.ndarray:
+    """
+    Apply a 2**k x 2**k matrix on k axes of a tensor with shape (2,)*n
+    A stack of matrices (m, 2**k, 2**k) is applied on a tensor with shape (m,) + (2,)*n, one matrix per leading index
+    """
+    k = len(axes)
+    if matrix.ndim == 3:
+        tensor = numpy.moveaxis(tensor, list(axes), list(range(-k, 0)))
+        shape = tensor.shape
+        result = numpy.matmul(tensor.reshape(shape[0], -1, 2 ** k), numpy.swapaxes(matrix, -1, -2))
+        return numpy.moveaxis(result.reshape(shape), list(range(-k, 0)), list(axes))
+    result = numpy.tensordot(matrix.reshape((2,) * (2 * k)), tensor, axes=(list(range(k, 2 * k)), list(axes)))
+    return numpy.moveaxis(result, list(range(k)), list(axes))
+
+
+def apply_pauli(state: numpy.ndarray, indices: numpy.ndarray, xmask: int, zmask: int, ny: int) -> numpy.ndarray:
+    """
+    P|i> = i^ny (-1)^popcount(i & zmask) |i ^ xmask>
+    """
+    result = state * (1.0j ** ny)
+    if zmask != 0:
+        result = result * (1 - 2 * parity(indices & zmask))
+    if xmask != 0:
+        result = result[..., indices ^ xmask]
+    return result
+
+
+class BackendCircuitNumpy(BackendCircuit):
+    """
+    Statevector backend without further dependencies
+    The translated circuit is a list of NumpyGate objects
+    """
+
+    compiler_arguments = {
+        "trotterized": True,
+        "swap": False,
+        "multitarget": True,
+        "controlled_rotation": False,
+        "gaussian": True,
+        "exponential_pauli": False,
+        "controlled_exponential_pauli": True,
+        "phase": True,
+        "power": True,
+        "hadamard_power": True,
+        "controlled_power": True,
+        "controlled_phase": True,
+        "toffoli": False,
+        "phase_to_z": True,
+        "cc_max": False
+    }
+
+    numbering = BitNumbering.MSB
+    records_parameter_slots = True
+    fusion_qubits = 2
+
+    def __init__(self, *args, **kwargs):
+        self.op_lookup = {
+            'I': numpy.eye(2, dtype=numpy.complex128),
+            'X': numpy.array([[0.0, 1.0], [1.0, 0.0]], dtype=numpy.complex128),
+            'Y': numpy.array([[0.0, -1.0j], [1.0j, 0.0]], dtype=numpy.complex128),
+            'Z': numpy.array([[1.0, 0.0], [0.0, -1.0]], dtype=numpy.complex128),
+            'H': numpy.array([[1.0, 1.0], [1.0, -1.0]], dtype=numpy.complex128) / numpy.sqrt(2.0),
+            'SWAP': numpy.eye(4, dtype=numpy.complex128)[[0, 2, 1, 3]],
+            'Rx': lambda angle: rotation_matrix(axis="x", angle=angle),
+            'Ry': lambda angle: rotation_matrix(axis="y", angle=angle),
+            'Rz': lambda angle: rotation_matrix(axis="z", angle=angle),
+        }
+        self._indices = None
+        self._parameter_groups = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def indices(self) -> numpy.ndarray:
+        if self._indices is None or len(self._indices) != 2 ** self.n_qubits:
+            self._indices = numpy.arange(2 ** self.n_qubits, dtype=numpy.int64)
+        return self._indices
+
+    def initialize_circuit(self, *args, **kwargs):
+        return []
+
+    def fast_return(self, abstract_circuit):
+        return isinstance(abstract_circuit, list)
+
+    def add_basic_gate(self, gate, circuit, *args, **kwargs):
+        if isinstance(gate, DenseGateImpl):
+            circuit.append(NumpyGate(targets=[self.qubit_map[t] for t in gate.target], matrix=gate.matrix,
+                                     name=(gate.name, gate.matrix.tobytes())))
+            return
+        if gate.name not in self.op_lookup or callable(self.op_lookup[gate.name]):
+            raise TequilaNumpyException("unknown gate for numpy backend: {}".format(gate))
+        circuit.append(NumpyGate(targets=[self.qubit_map[t] for t in gate.target],
+                                 controls=[self.qubit_map[c] for c in gate.control],
+                                 matrix=self.op_lookup[gate.name], name=gate.name))
+
+    def add_parametrized_gate(self, gate, circuit, variables=None, *args, **kwargs):
+        if gate.name == "Exp-Pauli":
+            if gate.is_controlled():
+                raise TequilaNumpyException("controlled exponential paulis should have been compiled:\n{}".format(gate))
+            xmask, zmask, ny = pauli_masks(paulistring=dict(gate.paulistring.items()), qubit_map=self.qubit_map,
+                                           n_qubits=self.n_qubits)
+            numpy_gate = NumpyExpPauliGate(xmask=xmask, zmask=zmask, ny=ny, parameter=gate.parameter,
+                                           coeff=gate.paulistring.coeff)
+        elif gate.name in self.op_lookup and callable(self.op_lookup[gate.name]):
+            numpy_gate = NumpyGate(targets=[self.qubit_map[t] for t in gate.target],
+                                   controls=[self.qubit_map[c] for c in gate.control],
+                                   parameter=gate.parameter,
+                                   generator=self.op_lookup[gate.name], name=gate.name)
+        else:
+            raise TequilaNumpyException("unknown gate for numpy backend: {}".format(gate))
+
+        if len(gate.extract_variables()) > 0:
+            self.parameter_slots.add(expression=gate.parameter, handle=numpy_gate)
+        if variables is not None or len(gate.extract_variables()) == 0:
+            numpy_gate.update_variables(variables)
+        circuit.append(numpy_gate)
+
+    def add_measurement(self, gate, circuit, *args, **kwargs):
+        circuit.append(NumpyMeasurement(targets=[self.qubit_map[t] for t in gate.target], name=gate.name))
+
+    def update_parameters(self, handles: list, values: numpy.ndarray):
+        """
+        The matrices of all gates with the same generator are computed together
+        """
+        if self._parameter_groups is None or self._parameter_groups[0] != len(handles):
+            groups = {}
+            for slot, gate in enumerate(handles):
+                groups.setdefault(gate.generator, ([], []))
+                groups[gate.generator][0].append(slot)
+                groups[gate.generator][1].append(gate)
+            self._parameter_groups = (len(handles), [(generator, numpy.asarray(slots), gates) for
+                                                     generator, (slots, gates) in groups.items()])
+        for generator, slots, gates in self._parameter_groups[1]:
+            group_values = values[slots]
+            if generator is None:
+                for gate, value in zip(gates, group_values):
+                    gate.set_value(value)
+            else:
+                for gate, value, matrix in zip(gates, group_values, generator(group_values)):
+                    gate.set_value(value, matrix=matrix)
+
+    def apply_circuit(self, circuit: list, state: numpy.ndarray) -> numpy.ndarray:
+        indices = self.indices
+        for gate in circuit:
+            state = gate.apply(state=state, n_qubits=self.n_qubits, indices=indices)
+        return state
+
+    def initialize_state(self, initial_state: int = 0, batch: int = None) -> numpy.ndarray:
+        """
+        :param batch: number of parameter points, gives one state per row if not None
+        """
+        shape = (2 ** self.n_qubits,) if batch is None else (batch, 2 ** self.n_qubits)
+        state = numpy.zeros(shape, dtype=numpy.complex128)
+        state[..., initial_state] = 1.0
+        return state
+
+    def compute_state(self, initial_state: int = 0, circuit: list = None) -> numpy.ndarray:
+        """
+        Returns
+        -------
+            the final state of the circuit as flat numpy array
+        """
+        if circuit is None:
+            circuit = self.circuit
+        return self.apply_circuit(circuit=circuit, state=self.initialize_state(initial_state=initial_state))
+
+    def simulate_amplitudes(self, variables, initial_state=0, *args, **kwargs) -> numpy.ndarray:
+        self.update_variables(variables)
+        prefixes = active_prefix_cache()
+        if prefixes is None:
+            return self.compute_state(initial_state=initial_state)
+        # circuits with the same gate prefix continue from the stored intermediate states
+        return prefixes.simulate(root=(type(self), self.qubits, initial_state),
+                                 keys=[gate.cache_key() for gate in self.circuit],
+                                 initialize=lambda: self.initialize_state(initial_state=initial_state),
+                                 apply=lambda state, start, stop: self.apply_circuit(circuit=self.circuit[start:stop],
+                                                                                     state=state))
+
+    def simulate_amplitudes_batch(self, variables: list, initial_state=0, *args, **kwargs) -> numpy.ndarray:
+        """
+        The parametrized gates get one matrix (or angle) per point and act on the stack of states
+        The gates keep the values of the last batch until update_variables is called again
+        """
+        if len(self.parameter_slots) > 0:
+            self.update_parameters(handles=self.parameter_slots.handles, values=self.parameter_slots.batch(variables))
+        return self.apply_circuit(circuit=self.circuit,
+                                  state=self.initialize_state(initial_state=initial_state, batch=len(variables)))
+
+    def do_simulate(self, variables, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
+        state = self.compute_state(initial_state=initial_state)
+        return QubitWaveFunction.from_dense(arr=state, numbering=self.numbering)
+
+    def convert_measurements(self, backend_result, measured: tuple = None) -> QubitWaveFunction:
+        """
+        Parameters
+        ----------
+        backend_result:
+            tuple of measured basis states (as integers on the full register) and their counts
+        measured:
+            the measured axes, all axes if None
+        """
+        outcomes, counts = backend_result
+        if measured is None:
+            return QubitWaveFunction.from_counts(outcomes=outcomes, n_qubits=self.n_qubits, counts=counts)
+        keys = numpy.zeros_like(outcomes)
+        for m in measured:
+            keys = (keys << 1) | ((outcomes >> (self.n_qubits - 1 - m)) & 1)
+        return QubitWaveFunction.from_counts(outcomes=keys, n_qubits=len(measured), counts=counts)
+
+    def do_sample(self, samples, circuit, noise_model=None, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
+        if noise_model is not None:
+            raise TequilaNumpyException("noise is not supported")
+        state = self.compute_state(initial_state=initial_state, circuit=circuit)
+        measured = []
+        for gate in circuit:
+            if isinstance(gate, NumpyMeasurement):
+                measured += list(gate.targets)
+        probabilities = numpy.abs(state) ** 2
+        probabilities /= numpy.sum(probabilities)
+        outcomes = numpy.random.choice(len(state), size=samples, p=probabilities)
+        outcomes, counts = numpy.unique(outcomes, return_counts=True)
+        return self.convert_measurements(backend_result=(outcomes, counts),
+                                         measured=tuple(sorted(set(measured))) if len(measured) > 0 else None)
+
+
+class BackendExpectationValueNumpy(BackendExpectationValue):
+    BackendCircuitType = BackendCircuitNumpy
+    use_mapping = True
+
+    def simulate_batch(self, variables: list, *args, **kwargs) -> numpy.ndarray:
+        """
+        All points are simulated together as one stack of states
+        """
+        states = self.U.simulate_amplitudes_batch(variables=variables, *args, **kwargs)
+        result = []
+        for H in self.H:
+            values = numpy.asarray(H.expectation_value(state=states))
+            result.append(numpy.vectorize(to_float)(values) if numpy.iscomplexobj(values) else values)
+        return numpy.stack(result, axis=-1).reshape(len(variables), len(self.H))
+
+    def adjoint_gradient(self, variables, initial_state: int = 0, *args, **kwargs):
+        """
+        One forward simulation, then the state and H|state> are propagated backwards through the daggered gates
+        dE/da_k = 2 Re <state|H U_N ... U_k+1 dU_k/da_k U_k-1 ... U_1|initial_state>
+        """
+        U = self.U
+        if self._adjoint_rules is None:
+            self._adjoint_rules = [parameter_derivatives(gate.parameter) if gate.is_parametrized() else {}
+                                   for gate in U.circuit]
+        state = U.simulate_amplitudes(variables=variables, initial_state=initial_state)
+        lambdas = [H.apply(state=state) for H in self.H]
+        indices = U.indices
+        gate_gradients = []
+        for gate, derivatives in zip(reversed(U.circuit), reversed(self._adjoint_rules)):
+            state = gate.apply_dagger(state=state, n_qubits=U.n_qubits, indices=indices)
+            if len(derivatives) > 0:
+                dstate = gate.apply_derivative(state=state, n_qubits=U.n_qubits, indices=indices)
+                gradient = numpy.asarray([2.0 * numpy.vdot(l, dstate).real for l in lambdas])
+                gate_gradients.append((derivatives, gradient))
+            lambdas = [gate.apply_dagger(state=l, n_qubits=U.n_qubits, indices=indices) for l in lambdas]
+        return self.chain_gate_gradients(variables=variables, gate_gradients=gate_gradients)
@@ -1,6 +1,7 @@
 from tequila.simulators.simulator_base import QCircuit, TequilaException, BackendCircuit, BackendExpectationValue
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila import BitString, BitNumbering
+from tequila.utils.bitstrings import integers_from_bits
 import subprocess
 import sys
 import numpy as np
@@ -208,6 +209,7 @@ class BackendCircuitPyquil(BackendCircuit):
     }
 
     numbering = BitNumbering.LSB
+    records_parameter_slots = True
 
     def __init__(self, abstract_circuit: QCircuit, variables, use_mapping=True, noise_model=None, *args, **kwargs):
         self.op_lookup = {
@@ -224,6 +226,7 @@ class BackendCircuitPyquil(BackendCircuit):
         }
         self.match_par_to_dummy = {}
         self.counter = 0
+        self.resolver = {}
         super().__init__(abstract_circuit=abstract_circuit, variables=variables, noise_model=noise_model,
                          use_mapping=use_mapping, *args, **kwargs)
         if self.noise_model is not None:
@@ -237,13 +240,7 @@ class BackendCircuitPyquil(BackendCircuit):
             }
 
             self.circuit = self.get_noisy_prog(self.circuit, self.noise_model)
-        if len(self.match_par_to_dummy.keys()) is None:
-            self.match_dummy_to_value = None
-            self.resolver = None
-        else:
-            self.match_dummy_to_value = {'theta_{}'.format(str(i)): k for i, k in
-                                         enumerate(self.match_par_to_dummy.keys())}
-            self.resolver = {k: [to_float(v(variables))] for k, v in self.match_dummy_to_value.items()}
+        self.update_variables(variables)
 
     def do_simulate(self, variables, initial_state, *args, **kwargs):
 
@@ -252,10 +249,13 @@ class BackendCircuitPyquil(BackendCircuit):
         msb = BitString.from_int(initial_state, nbits=n_qubits)
         iprep = pyquil.Program()
         for i, val in enumerate(msb.array):
+            # identities keep qubits without gates in the wavefunction
             if val > 0:
                 iprep += pyquil.gates.X(i)
+            else:
+                iprep += pyquil.gates.I(i)
         backend_result = simulator.wavefunction(iprep + self.circuit, memory_map=self.resolver)
-        return QubitWaveFunction.from_array(arr=backend_result.amplitudes, numbering=self.numbering)
+        return QubitWaveFunction.from_dense(arr=backend_result.amplitudes, numbering=self.numbering)
 
     def do_sample(self, samples, circuit, *args, **kwargs) -> QubitWaveFunction:
         n_qubits = self.n_qubits
@@ -278,25 +278,8 @@ class BackendCircuitPyquil(BackendCircuit):
         :return: backend_result in Tequila format.
         """
 
-        def string_to_array(s):
-            listing = []
-            for letter in s:
-                if letter not in [',', ' ', '[', ']', '.']:
-                    listing.append(int(letter))
-            return listing
-
-        result = QubitWaveFunction()
-        bit_dict = {}
-        for b in backend_result:
-            try:
-                bit_dict[str(b)] += 1
-            except:
-                bit_dict[str(b)] = 1
-
-        for k, v in bit_dict.items():
-            arr = string_to_array(k)
-            result._state[BitString.from_array(arr)] = v
-        return result
+        bits = np.asarray(backend_result)
+        return QubitWaveFunction.from_counts(outcomes=integers_from_bits(bits), n_qubits=bits.shape[-1])
 
     def fast_return(self, abstract_circuit):
         return isinstance(abstract_circuit, pyquil.Program)
@@ -314,6 +297,7 @@ class BackendCircuitPyquil(BackendCircuit):
             except:
                 par = circuit.declare('theta_{}'.format(str(self.counter)), 'REAL')
                 self.match_par_to_dummy[gate.parameter] = par
+                self.parameter_slots.add(expression=gate.parameter, handle='theta_{}'.format(str(self.counter)))
                 self.counter += 1
         pyquil_gate = op(angle=par, qubit=self.qubit_map[gate.target[0]])
         if gate.is_controlled():
@@ -380,15 +364,11 @@ class BackendCircuitPyquil(BackendCircuit):
                 pass
         return new
 
-    def update_variables(self, variables):
+    def update_parameters(self, handles: list, values: np.ndarray):
         """
-        overwriting the underlying code so that noise gets added when present
+        only the memory map changes, so the (noisy) program is kept
         """
-
-        if self.match_dummy_to_value is not None:
-            self.resolver = {k: [to_float(v(variables))] for k, v in self.match_dummy_to_value.items()}
-        else:
-            self.resolver = None
+        self.resolver = {k: [to_float(v)] for k, v in zip(handles, values)}
 
 
 class BackendExpectationValuePyquil(BackendExpectationValue):
@@ -64,6 +64,7 @@ class BackendCircuitQiskit(BackendCircuit):
     }
 
     numbering = BitNumbering.LSB
+    records_parameter_slots = True
 
     def __init__(self, abstract_circuit: QCircuit, variables, use_mapping=True, noise_model=None, *args, **kwargs):
 
@@ -106,12 +107,7 @@ class BackendCircuitQiskit(BackendCircuit):
         self.counter = 0
         super().__init__(abstract_circuit=abstract_circuit, variables=variables, noise_model=self.noise_model,
                          use_mapping=use_mapping, *args, **kwargs)
-        if len(self.tq_to_sympy.keys()) is None:
-            self.sympy_to_tq = None
-            self.resolver = None
-        else:
-            self.sympy_to_tq = {v: k for k, v in self.tq_to_sympy.items()}
-            self.resolver = {k: to_float(v(variables)) for k, v in self.sympy_to_tq.items()}
+        self.update_variables(variables)
         if self.noise_model is None:
             self.ol = 1
         else:
@@ -143,7 +139,7 @@ class BackendCircuitQiskit(BackendCircuit):
         backend_result = qiskit.execute(experiments=self.circuit, optimization_level=optimization_level,
                                         backend=qiskit_backend, parameter_binds=[self.resolver],
                                         backend_options=opts).result()
-        return QubitWaveFunction.from_array(arr=backend_result.get_statevector(self.circuit), numbering=self.numbering)
+        return QubitWaveFunction.from_dense(arr=backend_result.get_statevector(self.circuit), numbering=self.numbering)
 
     def get_backend(self, qiskit_backend: str = None, samples=None, qiskit_provider=None, *args, **kwargs):
         """
@@ -199,12 +195,12 @@ class BackendCircuitQiskit(BackendCircuit):
         :return: Counts in OpenVQE format, states are big endian (MSB)
         """
         qiskit_counts = backend_result.result().get_counts()
-        result = QubitWaveFunction()
-        # todo there are faster ways
-        for k, v in qiskit_counts.items():
-            converted_key = BitString.from_bitstring(other=BitStringLSB.from_binary(binary=k))
-            result._state[converted_key] = v
-        return result
+        keys = [k.replace(" ", "") for k in qiskit_counts.keys()]
+        indices = numpy.asarray([int(k, 2) for k in keys], dtype=numpy.int64)
+        counts = numpy.asarray(list(qiskit_counts.values()))
+        n_qubits = max(len(k) for k in keys) if len(keys) > 0 else 0
+        return QubitWaveFunction.from_sparse(indices=indices, amplitudes=counts, n_qubits=n_qubits,
+                                             numbering=BitNumbering.LSB)
 
     def fast_return(self, abstract_circuit):
         return isinstance(abstract_circuit, qiskit.QuantumCircuit)
@@ -221,6 +217,7 @@ class BackendCircuitQiskit(BackendCircuit):
                 par = qiskit.circuit.parameter.Parameter(
                     '{}_{}'.format(self._name_variable_objective(gate.parameter), str(self.counter)))
                 self.tq_to_sympy[gate.parameter] = par
+                self.parameter_slots.add(expression=gate.parameter, handle=par)
                 self.counter += 1
         else:
             par = float(gate.parameter)
@@ -299,14 +296,11 @@ class BackendCircuitQiskit(BackendCircuit):
 
         return qnoise
 
-    def update_variables(self, variables):
+    def update_parameters(self, handles: list, values: numpy.ndarray):
         """
-        overriding the underlying base to make sure this stuff remains noisy
+        only the parameter bindings change, so the (noisy) circuit is kept
         """
-        if self.sympy_to_tq is not None:
-            self.resolver = {k: to_float(v(variables)) for k, v in self.sympy_to_tq.items()}
-        else:
-            self.resolver = None
+        self.resolver = {k: to_float(v) for k, v in zip(handles, values)}
 
 
 class BackendExpectationValueQiskit(BackendExpectationValue):
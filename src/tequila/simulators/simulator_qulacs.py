@@ -1,9 +1,14 @@
 import qulacs
 import numbers, numpy
 from tequila import TequilaException
-from tequila.utils.bitstrings import BitNumbering, BitString, BitStringLSB
+from tequila.utils.bitstrings import BitNumbering, BitString, BitStringLSB, integers_from_bits
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
-from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue, QCircuit, change_basis
+from tequila.simulators.simulator_base import BackendCircuit, BackendExpectationValue, QCircuit, change_basis, \
+    CompiledKetBra, compile_hamiltonian, bit_parity
+from tequila.circuit.gradient import parameter_derivatives
+from tequila.circuit._gates_impl import DenseGateImpl
+from tequila.hamiltonian.ketbra import KetBraHamiltonian
+from tequila.utils.state_cache import active_prefix_cache
 
 """
 Developer Note:
@@ -42,6 +47,7 @@ class BackendCircuitQulacs(BackendCircuit):
     }
 
     numbering = BitNumbering.LSB
+    records_parameter_slots = True
 
     def __init__(self, *args, **kwargs):
         self.op_lookup = {
@@ -57,63 +63,95 @@ class BackendCircuitQulacs(BackendCircuit):
             'Measure': qulacs.gate.Measurement,
             'Exp-Pauli': None
         }
-        self.variables = []
+        self._gate_keys = None
         super().__init__(*args, **kwargs)
 
-    def update_variables(self, variables):
-        for k, angle in enumerate(self.variables):
-            self.circuit.set_parameter(k, angle(variables))
+    def update_parameters(self, handles: list, values: numpy.ndarray):
+        for k, value in zip(handles, values):
+            self.circuit.set_parameter(k, value)
 
-    def do_simulate(self, variables, initial_state, *args, **kwargs):
+    def initialize_state(self, initial_state: int = 0) -> qulacs.QuantumState:
         state = qulacs.QuantumState(self.n_qubits)
         lsb = BitStringLSB.from_int(initial_state, nbits=self.n_qubits)
         state.set_computational_basis(BitString.from_binary(lsb.binary).integer)
-        self.circuit.update_quantum_state(state)
+        return state
+
+    def gate_keys(self) -> list:
+        """
+        :return: hashable keys of the gates with their current parameters (see PrefixStateCache)
+        """
+        if self._gate_keys is None:
+            circuit = self.circuit
+            positions = {circuit.get_parametric_gate_position(k): k for k in range(circuit.get_parameter_count())}
+            keys = []
+            for i in range(circuit.get_gate_count()):
+                gate = circuit.get_gate(i)
+                key = (gate.get_name(), tuple(gate.get_target_index_list()), tuple(gate.get_control_index_list()))
+                if i in positions:
+                    # everything which defines the gate except the angle, e.g. the paulis of ParametricPauliRotation
+                    if hasattr(gate, "get_pauli_id_list"):
+                        key += (tuple(gate.get_pauli_id_list()),)
+                    else:
+                        key += (gate.to_string(),)
+                    keys.append((key, positions[i]))
+                else:
+                    keys.append((key + (gate.get_matrix().tobytes(),), None))
+            self._gate_keys = keys
+        return [key if k is None else (key, self.circuit.get_parameter(k)) for key, k in self._gate_keys]
+
+    def compute_state(self, initial_state: int = 0) -> qulacs.QuantumState:
+        """
+        Simulate the circuit with the current parameters
+        circuits with the same gate prefix continue from the stored intermediate states if a prefix cache is open
+        """
+        prefixes = active_prefix_cache()
+        if prefixes is None:
+            state = self.initialize_state(initial_state=initial_state)
+            self.circuit.update_quantum_state(state)
+            return state
+
+        def apply(state, start, stop):
+            if start < stop:
+                self.circuit.update_quantum_state(state, start, stop)
+            return state
+
+        return prefixes.simulate(root=(type(self), self.qubits, initial_state), keys=self.gate_keys(),
+                                 initialize=lambda: self.initialize_state(initial_state=initial_state), apply=apply,
+                                 nbytes=lambda state: 16 * 2 ** state.get_qubit_count())
 
-        wfn = QubitWaveFunction.from_array(arr=state.get_vector(), numbering=self.numbering)
+    def do_simulate(self, variables, initial_state, *args, **kwargs):
+        state = self.compute_state(initial_state=initial_state)
+        wfn = QubitWaveFunction.from_dense(arr=state.get_vector(), numbering=self.numbering)
         return wfn
 
     def convert_measurements(self, backend_result) -> QubitWaveFunction:
-        result = QubitWaveFunction()
-        # todo there are faster ways
-        for k in backend_result:
-            converted_key = BitString.from_binary(BitStringLSB.from_int(integer=k, nbits=self.n_qubits).binary)
-            if converted_key in result._state:
-                result._state[converted_key] += 1
-            else:
-                result._state[converted_key] = 1
-        return result
+        return QubitWaveFunction.from_counts(outcomes=backend_result, n_qubits=self.n_qubits, numbering=self.numbering)
 
     def do_sample(self, samples, circuit, noise_model=None, initial_state=0, *args, **kwargs) -> QubitWaveFunction:
         assert (noise_model is None)
-        state = qulacs.QuantumState(self.n_qubits)
-        lsb = BitStringLSB.from_int(initial_state, nbits=self.n_qubits)
-        state.set_computational_basis(BitString.from_binary(lsb.binary).integer)
-        self.circuit.update_quantum_state(state)
+        state = self.compute_state(initial_state=initial_state)
+        result = numpy.asarray(state.sampling(samples), dtype=numpy.int64)
         if hasattr(self, "measurements"):
-            result = {}
-            for sample in range(samples):
-                sample_result = {}
-                for t, m in self.measurements.items():
-                    m.update_quantum_state(state)
-                    sample_result[t] = state.get_classical_value(t)
-
-                sample_result = dict(sorted(sample_result.items(), key=lambda x: x[0]))
-                binary = BitString.from_array(sample_result.values())
-                if binary in result:
-                    result[binary] += 1
-                else:
-                    result[binary] = 1
-
-            return QubitWaveFunction(state=result)
+            # keep only the measured qubits, the first measured qubit is the most significant bit
+            targets = sorted(self.measurements.keys())
+            bits = numpy.stack([(result >> self.qubit_map[t]) & 1 for t in targets], axis=-1)
+            return QubitWaveFunction.from_counts(outcomes=integers_from_bits(bits), n_qubits=len(targets))
         else:
             # sample from the whole wavefunction (all-Z measurement)
-            result = state.sampling(samples)
-        return self.convert_measurements(backend_result=result)
+            return self.convert_measurements(backend_result=result)
 
     def fast_return(self, abstract_circuit):
         return False
 
+    def dense_gate(self, gate, matrix: numpy.ndarray):
+        """
+        Dense qulacs gate with the same targets and controls as the given gate
+        """
+        qulacs_gate = qulacs.gate.DenseMatrix(gate.get_target_index_list(), matrix)
+        for c in gate.get_control_index_list():
+            qulacs_gate.add_control_qubit(c, 1)
+        return qulacs_gate
+
     def initialize_circuit(self, *args, **kwargs):
         n_qubits = len(self.qubit_map)
         return qulacs.ParametricQuantumCircuit(n_qubits)
@@ -124,7 +162,8 @@ class BackendCircuitQulacs(BackendCircuit):
         pind = [convert[x.lower()] for x in gate.paulistring.values()]
         qind = [self.qubit_map[x] for x in gate.paulistring.keys()]
         if len(gate.extract_variables()) > 0:
-            self.variables.append(-gate.parameter * gate.paulistring.coeff)
+            self.parameter_slots.add(expression=-gate.parameter * gate.paulistring.coeff,
+                                     handle=circuit.get_parameter_count())
             circuit.add_parametric_multi_Pauli_rotation_gate(qind, pind,
                                                              -gate.parameter(variables) * gate.paulistring.coeff)
         else:
@@ -138,7 +177,7 @@ class BackendCircuitQulacs(BackendCircuit):
         else:
             if len(gate.extract_variables()) > 0:
                 op = op[0]
-                self.variables.append(-gate.parameter)
+                self.parameter_slots.add(expression=-gate.parameter, handle=circuit.get_parameter_count())
                 op(circuit)(self.qubit_map[gate.target[0]], -gate.parameter(variables=variables))
                 if gate.is_controlled():
                     raise TequilaQulacsException("Gates which depend on variables can not be controlled! Gate was:\n{}".format(gate))
@@ -153,6 +192,10 @@ class BackendCircuitQulacs(BackendCircuit):
         circuit.add_gate(qulacs_gate)
 
     def add_basic_gate(self, gate, circuit, *args, **kwargs):
+        if isinstance(gate, DenseGateImpl):
+            # qulacs matrices have their first target as least significant qubit
+            circuit.add_gate(qulacs.gate.DenseMatrix([self.qubit_map[t] for t in reversed(gate.target)], gate.matrix))
+            return
         op = self.op_lookup[gate.name]
         qulacs_gate = op(*[self.qubit_map[t] for t in gate.target])
         if gate.is_controlled():
@@ -193,6 +236,69 @@ class BackendExpectationValueQulacs(BackendExpectationValue):
     BackendCircuitType = BackendCircuitQulacs
     use_mapping = True
 
+    def initialize_adjoint(self):
+        """
+        Prepare the adjoint gradient:
+        hamiltonians as bitmasks on the qulacs register (LSB ordering of the state vector)
+        and for every gate a tuple (position, daggered gate, index of the parameter, derivatives of the parameter)
+        parametrized gates get their daggered gate and derivatives in every call
+        """
+        U = self.U
+        lsb_map = {k: U.n_qubits - 1 - v for k, v in U.qubit_map.items()}
+        hamiltonians = [compile_hamiltonian(H=H, qubit_map=lsb_map, n_qubits=U.n_qubits)
+                        for H in self._abstract_hamiltonians]
+        positions = {U.circuit.get_parametric_gate_position(k): k for k in range(U.circuit.get_parameter_count())}
+        gates = []
+        for i in range(U.circuit.get_gate_count()):
+            if i in positions:
+                k = positions[i]
+                gates.append((i, None, k, parameter_derivatives(U.parameter_slots[k])))
+            else:
+                gate = U.circuit.get_gate(i)
+                gates.append((i, U.dense_gate(gate=gate, matrix=gate.get_matrix().conjugate().T), None, None))
+        self._adjoint_rules = (hamiltonians, gates)
+
+    def adjoint_gradient(self, variables, initial_state: int = 0, *args, **kwargs):
+        """
+        One forward simulation, then the state and H|state> are propagated backwards through the daggered gates
+        The parametrized qulacs gates are rotations, so their derivative is 1/2 of the gate with the angle shifted by pi
+        """
+        if self._adjoint_rules is None:
+            self.initialize_adjoint()
+        hamiltonians, gates = self._adjoint_rules
+        U = self.U
+        circuit = U.circuit
+
+        U.update_variables(variables)
+        state = U.initialize_state(initial_state=initial_state)
+        circuit.update_quantum_state(state)
+        vector = state.get_vector()
+        lambdas = []
+        for H in hamiltonians:
+            l = qulacs.QuantumState(U.n_qubits)
+            l.load(H.apply(state=vector))
+            lambdas.append(l)
+
+        gate_gradients = []
+        for i, dagger, k, derivatives in reversed(gates):
+            if k is None:
+                dagger.update_quantum_state(state)
+            else:
+                gate = circuit.get_gate(i)
+                dagger = U.dense_gate(gate=gate, matrix=gate.get_matrix().conjugate().T)
+                dagger.update_quantum_state(state)
+                value = circuit.get_parameter(k)
+                circuit.set_parameter(k, value + numpy.pi)
+                derivative = U.dense_gate(gate=gate, matrix=0.5 * circuit.get_gate(i).get_matrix())
+                circuit.set_parameter(k, value)
+                dstate = state.copy()
+                derivative.update_quantum_state(dstate)
+                gradient = numpy.asarray([2.0 * qulacs.state.inner_product(l, dstate).real for l in lambdas])
+                gate_gradients.append((derivatives, gradient))
+            for l in lambdas:
+                dagger.update_quantum_state(l)
+        return self.chain_gate_gradients(variables=variables, gate_gradients=gate_gradients)
+
     def simulate(self, variables, *args, **kwargs) -> numpy.array:
         # fast return if possible
         if self.H is None:
@@ -202,13 +308,17 @@ class BackendExpectationValueQulacs(BackendExpectationValue):
         elif isinstance(self.H, numbers.Number):
             return numpy.asarray[self.H]
 
-        self.U.update_variables(variables)
-        state = qulacs.QuantumState(self.U.n_qubits)
-        self.U.circuit.update_quantum_state(state)
+        def simulate():
+            self.U.update_variables(variables)
+            return self.U.compute_state()
+
+        state = self.cached_state(variables=variables, simulate=simulate)
         result = []
         for H in self.H:
             if isinstance(H, numbers.Number):
                 result.append(H) # those are accumulated unit strings, e.g 0.1*X(3) in wfn on qubits 0,1
+            elif isinstance(H, CompiledKetBra):
+                result.append(H.expectation_value(state.get_vector()))
             else:
                 result.append(H.get_expectation_value(state))
 
@@ -217,7 +327,11 @@ class BackendExpectationValueQulacs(BackendExpectationValue):
     def initialize_hamiltonian(self, hamiltonians):
         result = []
         for H in hamiltonians:
-            if self.use_mapping:
+            if isinstance(H, KetBraHamiltonian):
+                # evaluated from the wavefunctions on the state vector (LSB ordering)
+                lsb_map = {k: self.U.n_qubits - 1 - v for k, v in self.U.qubit_map.items()}
+                result.append(compile_hamiltonian(H=H, qubit_map=lsb_map, n_qubits=self.U.n_qubits))
+            elif self.use_mapping:
                 # initialize only the active parts of the Hamiltonian and pre-evaluate the passive ones
                 # passive parts are the components of each individual pauli string which act on qubits where the circuit does not act on
                 # if the circuit does not act on those qubits the passive parts are always evaluating to 1 (if the pauli operator is Z) or 0 (otherwise)
@@ -265,49 +379,43 @@ class BackendExpectationValueQulacs(BackendExpectationValue):
                 result.append(qulacs_H)
         return result
 
-    def sample(self, variables, samples, *args, **kwargs) -> numpy.array:
-        # todo: generalize in baseclass. Do Hamiltonian mapping on initialization
-        self.update_variables(variables)
-
-        result = []
-        for H in self._abstract_hamiltonians:
-            E = 0.0
-            for ps in H.paulistrings:
-                # change basis, measurement is destructive so copy the state
-                # to avoid recomputation
-                bc = QCircuit()
-                zero_string = False
-                for idx, p in ps.items():
-                    if idx not in self.U.qubit_map:
-                        # circuit does not act on the qubit
-                        # case1: paulimatrix is 'Z' -> unit factor: ignore that part
-                        # case2: zero factor -> continue with next ps
-                        if p.upper() != "Z":
-                            zero_string = True
-                    else:
-                        bc += change_basis(target=idx, axis=p)
-
-                if zero_string:
-                    continue
-
-                qbc = self.U.create_circuit(abstract_circuit=bc, variables=None)
-                Esamples = []
-                for sample in range(samples):
-                    state_tmp = qulacs.QuantumState(self.U.n_qubits)
-                    self.U.circuit.update_quantum_state(state_tmp)
-                    if len(bc.gates) > 0:  # otherwise there is no basis change (empty qulacs circuit does not work out)
-                        qbc.update_quantum_state(state_tmp)
-                    ps_measure = 1.0
-                    for idx in ps.keys():
-                        if idx not in self.U.qubit_map:
-                            continue  # means its 1 or Z and <0|Z|0> = 1 anyway
-                        else:
-                            M = qulacs.gate.Measurement(self.U.qubit_map[idx], self.U.qubit_map[idx])
-                            M.update_quantum_state(state_tmp)
-                            measured = state_tmp.get_classical_value(self.U.qubit_map[idx])
-                            ps_measure *= (-2.0 * measured + 1.0)  # 0 becomes 1 and 1 becomes -1
-                    Esamples.append(ps_measure)
-                E += ps.coeff * sum(Esamples) / len(Esamples)
-
-            result.append(E)
-        return numpy.asarray(result)
+    def sample_basis(self, state, basis: tuple, samples: int) -> numpy.ndarray:
+        """
+        Draw all shots from a copy of the state after a change of the measurement basis
+        :param state: the qulacs state prepared by U
+        :param basis: tuple of (qubit, axis) for all qubits which are not measured in the Z basis
+        :return: array with the sampled basis state indices (qulacs convention)
+        """
+        measured = state.copy()
+        if len(basis) > 0:  # empty qulacs circuit does not work out
+            bc = QCircuit()
+            for idx, p in basis:
+                bc += change_basis(target=idx, axis=p)
+            self.U.create_circuit(abstract_circuit=bc, variables=None).update_quantum_state(measured)
+        return numpy.asarray(measured.sampling(samples), dtype=numpy.uint64)
+
+    def group_sampler(self, *args, **kwargs):
+        """
+        U is simulated once, every measurement basis is sampled from a copy of the state
+        and all paulistrings of a group are evaluated on the same shots
+        """
+        state = self.U.compute_state()
+        measured = {}
+
+        def sample_group(group, samples):
+            basis = tuple((idx, p) for idx, p in sorted(group.basis.items()) if p != "Z")
+            key = (basis, samples)
+            # groups share the shots of their basis, a group which asks again gets new shots
+            if key not in measured or id(group) in measured[key][1]:
+                measured[key] = (self.sample_basis(state=state, basis=basis, samples=samples), set())
+            shots, consumers = measured[key]
+            consumers.add(id(group))
+            values = numpy.zeros(samples)
+            for ps in group.paulistrings:
+                mask = 0
+                for idx in ps.keys():
+                    mask |= 1 << self.U.qubit_map[idx]
+                values += ps.coeff * (1.0 - 2.0 * bit_parity(shots, mask))  # 0 becomes 1 and 1 becomes -1
+            return values, numpy.ones(samples)
+
+        return sample_group
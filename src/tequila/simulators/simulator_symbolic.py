@@ -2,6 +2,7 @@ from tequila.simulators.simulator_base import BackendExpectationValue, BackendCi
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.circuit.circuit import QCircuit
 from tequila.circuit.gates import QGate
+from tequila.circuit._gates_impl import DenseGateImpl
 from tequila import BitString
 import numpy
 import copy
@@ -33,6 +34,7 @@ class BackendCircuitSymbolic(BackendCircuit):
     }
 
     convert_to_numpy = True
+    fusion_qubits = 2
 
     def create_circuit(self, abstract_circuit: QCircuit, variables=None):
         return abstract_circuit
@@ -62,6 +64,22 @@ class BackendCircuitSymbolic(BackendCircuit):
             if not do_apply:
                 return QubitWaveFunction.from_int(basisfunction)
 
+        if isinstance(gate, DenseGateImpl):
+            # column of the matrix which belongs to the bits of the targets
+            targets = [qubits[t] for t in gate.target]
+            column = 0
+            for t in targets:
+                column = 2 * column + int(basis_array[t])
+            result = QubitWaveFunction()
+            for row, v in enumerate(gate.matrix[:, column]):
+                if v == 0.0:
+                    continue
+                a_array = copy.deepcopy(basis_array)
+                for k, t in enumerate(targets):
+                    a_array[t] = (row >> (len(targets) - 1 - k)) & 1
+                result += complex(v) * QubitWaveFunction.from_int(BitString.from_array(a_array))
+            return result
+
         if len(gate.target) > 1:
             raise Exception("Multi-targets not supported for symbolic simulators")
 
@@ -113,11 +131,11 @@ class BackendCircuitSymbolic(BackendCircuit):
     def do_simulate(self, variables, initial_state: int = None, *args, **kwargs) -> QubitWaveFunction:
         qubits = dict()
         count = 0
-        for q in self.abstract_circuit.qubits:
+        for q in self.qubits:
             qubits[q] = count
             count +=1
 
-        n_qubits = len(self.abstract_circuit.qubits)
+        n_qubits = len(self.qubits)
 
         if initial_state is None:
             initial_state = QubitWaveFunction.from_int(i=0, n_qubits=n_qubits)
@@ -7,6 +7,7 @@ from tequila.circuit.gradient import __grad_inner
 from tequila.autograd_imports import jax
 from tequila.circuit.compiler import compile_controlled_rotation,compile_h_power,compile_power_gate, \
     compile_trotterized_gate,compile_controlled_phase, compile_multitarget
+from tequila.utils.state_cache import shared_states
 
 import numpy
 import copy
@@ -241,16 +242,18 @@ def get_qng_combos(objective,initial_values=None,samples=None,backend=None,noise
 
 def evaluate_qng(combos,variables):
     gd={v:0 for v in variables.keys()}
-    for c in combos:
-        qgt=c['matrix']
-        vec=c['vector']
-        m=c['mapping']
-        pos=c['positional']
-        ev=numpy.dot(qgt(variables),vec(variables))
-        for i,val in enumerate(ev):
-            maps=m[i]
-            for k in maps.keys():
-                gd[k] += val*maps[k]*pos(variables)
+    # the prefix circuits of the metric blocks share their simulated states
+    with shared_states():
+        for c in combos:
+            qgt=c['matrix']
+            vec=c['vector']
+            m=c['mapping']
+            pos=c['positional']
+            ev=numpy.dot(qgt(variables),vec(variables))
+            for i,val in enumerate(ev):
+                maps=m[i]
+                for k in maps.keys():
+                    gd[k] += val*maps[k]*pos(variables)
 
     out=[v for v in gd.values()]
     return out
@@ -1,4 +1,4 @@
-from tequila.utils.bitstrings import BitString, BitStringLSB, BitNumbering, initialize_bitstring
+from tequila.utils.bitstrings import BitString, BitStringLSB, BitStringArray, BitNumbering, initialize_bitstring
 from tequila.utils.exceptions import TequilaException, TequilaWarning, TequilaTypeError, TequilaParameterError
 from tequila.utils.joined_transformation import JoinedTransformation
 from tequila.utils.misc import to_float
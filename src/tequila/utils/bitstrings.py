@@ -1,6 +1,8 @@
 from enum import Enum
 from typing import List
 from functools import total_ordering
+import numpy
+import operator
 
 
 class BitNumbering(Enum):
@@ -15,8 +17,11 @@ class BitString:
     Bitstring Class
     All Bitstrings are stored as integers
     return them as integers, binary strings or arrays of integers
+    The binary string and the array are computed once and cached until the bitstring changes
     """
 
+    __slots__ = ["_value", "_nbits", "_binary", "_array"]
+
     @property
     def numbering(self) -> BitNumbering:
         return BitNumbering.MSB
@@ -34,17 +39,22 @@ class BitString:
         self.update_nbits()
 
     def update_nbits(self):
+        self._binary = None
+        self._array = None
+        if self._value is None:
+            return self
         current = self.nbits
-        min_needed = len(format(self._value, 'b'))
+        # same as len(format(value, 'b')), zero needs one bit
+        min_needed = max(self._value.bit_length(), 1) if self._value >= 0 else len(format(self._value, 'b'))
         self._nbits = max(current, min_needed)
         return self
 
     @property
     def binary(self):
-        if self.numbering is BitNumbering.MSB:
-            return format(self._value, 'b').zfill(self.nbits)
-        else:
-            return format(self._value, 'b').zfill(self.nbits)[::-1]
+        if self._binary is None:
+            binary = format(self._value, 'b').zfill(self.nbits)
+            self._binary = binary if self.numbering is BitNumbering.MSB else binary[::-1]
+        return self._binary
 
     @binary.setter
     def binary(self, other: str):
@@ -64,32 +74,61 @@ class BitString:
 
     @integer.setter
     def integer(self, other: int):
-        self._value = other
+        self._value = operator.index(other)
         self.update_nbits()
         return self
 
+    def _bit_shift(self, position: int) -> int:
+        """
+        :return: the shift of the bit at the position of the array
+        """
+        if self.numbering is BitNumbering.MSB:
+            return self.nbits - 1 - position
+        else:
+            return position
+
     @property
     def array(self):
-        return [int(i) for i in self.binary]
+        if self._array is None:
+            value = self._value
+            self._array = tuple((value >> self._bit_shift(i)) & 1 for i in range(self.nbits))
+        # a new list, callers may change it
+        return list(self._array)
 
     @array.setter
     def array(self, other):
+        value = 0
         if self.numbering == BitNumbering.MSB:
-            self.integer = int("".join(str(x) for x in other), 2)
+            for x in other:
+                value = (value << 1) | int(x)
         else:
-            self.integer = int("".join(str(x) for x in reversed(other)), 2)
+            for x in reversed(other):
+                value = (value << 1) | int(x)
+        self._value = value
         self.update_nbits()
         return self
 
     def __init__(self, nbits: int = None):
         self._value = None
         self._nbits = nbits
+        self._binary = None
+        self._array = None
+
+    @classmethod
+    def _create(cls, integer: int, nbits: int = None):
+        """
+        Fast construction without the setters
+        """
+        result = cls.__new__(cls)
+        result._value = operator.index(integer)
+        result._nbits = nbits
+        return result.update_nbits()
 
     @classmethod
     def from_array(cls, array: list, nbits: int = 0):
         if isinstance(array, cls):
             return cls.from_bitstring(other=array)
-        result = result = cls(nbits=max(nbits, len(array)))
+        result = cls(nbits=max(nbits, len(array)))
         result.array = array
         return result
 
@@ -97,9 +136,7 @@ class BitString:
     def from_int(cls, integer: int, nbits: int = None):
         if isinstance(integer, cls):
             return cls.from_bitstring(other=integer, nbits=nbits)
-        result = cls(nbits=nbits)
-        result.integer = integer
-        return result
+        return cls._create(integer=integer, nbits=nbits)
 
     @classmethod
     def from_binary(cls, binary: str, nbits: int = None):
@@ -110,7 +147,7 @@ class BitString:
         else:
             nbits = max(nbits, len(binary))
 
-        result = result = cls(nbits=nbits)
+        result = cls(nbits=nbits)
         result.binary = binary
         return result
 
@@ -120,9 +157,7 @@ class BitString:
             nbits = other.nbits
         else:
             nbits = max(nbits, other.nbits)
-        result = cls(nbits=nbits)
-        result.integer = other.integer
-        return result
+        return cls._create(integer=other.integer, nbits=nbits)
 
     def __add__(self, other):
         nbits = max(self.nbits, other.nbits)
@@ -130,14 +165,14 @@ class BitString:
 
     def __iadd__(self, other):
         self.integer = self.integer + other.integer
-        self.update_nbits()
+        return self
 
     def __mul__(self, other):
         return BitString.from_int(integer=self.integer * other.integer, nbits=max(self.nbits, other.nbits))
 
     def __imul__(self, other):
         self.integer = self.integer * other.integer
-        self.update_nbits()
+        return self
 
     def __eq__(self, other) -> bool:
         if isinstance(other, int):
@@ -153,12 +188,30 @@ class BitString:
         return hash(self._value)
 
     def __getitem__(self, item: int) -> List[int]:
-        return self.array[item]
+        if not isinstance(item, int):
+            return self.array[item]
+        nbits = self.nbits
+        if item < 0:
+            item += nbits
+        if not 0 <= item < nbits:
+            raise IndexError("bit {} of BitString with {} bits".format(item, nbits))
+        return (self._value >> self._bit_shift(item)) & 1
 
     def __setitem__(self, key, value):
-        array = self.array
-        array[key] = value
-        self.array = array
+        if not isinstance(key, int):
+            array = self.array
+            array[key] = value
+            self.array = array
+            return self
+        nbits = self.nbits
+        if key < 0:
+            key += nbits
+        if not 0 <= key < nbits:
+            raise IndexError("bit {} of BitString with {} bits".format(key, nbits))
+        bit = 1 << self._bit_shift(key)
+        self._value = (self._value | bit) if int(value) else (self._value & ~bit)
+        self._binary = None
+        self._array = None
         return self
 
     def __lt__(self, other) -> bool:
@@ -171,12 +224,108 @@ class BitString:
 
 
 class BitStringLSB(BitString):
+    __slots__ = []
 
     @property
     def numbering(self) -> BitNumbering:
         return BitNumbering.LSB
 
 
+class BitStringArray:
+    """
+    Many bitstrings with the same number of bits, stored as one array of integers
+    For bulk conversions between integers, bit arrays, binary strings and BitString objects
+
+    Parameters
+    ----------
+    integers: the integers of the bitstrings (in the given numbering)
+    nbits: number of bits of every bitstring
+    numbering: BitNumbering of the integers (and of the bitstrings which are created from them)
+    """
+
+    def __init__(self, integers: numpy.ndarray, nbits: int, numbering: BitNumbering = BitNumbering.MSB):
+        self.integers = numpy.asarray(integers, dtype=numpy.int64).reshape(-1)
+        self.nbits = nbits
+        self.numbering = numbering
+
+    @classmethod
+    def from_bitstrings(cls, bitstrings: List[BitString], nbits: int = None):
+        numbering = bitstrings[0].numbering if len(bitstrings) > 0 else BitNumbering.MSB
+        if nbits is None:
+            nbits = max([b.nbits for b in bitstrings], default=1)
+        return cls(integers=numpy.fromiter((b.integer for b in bitstrings), dtype=numpy.int64, count=len(bitstrings)),
+                   nbits=nbits, numbering=numbering)
+
+    @classmethod
+    def from_arrays(cls, bits: numpy.ndarray, numbering: BitNumbering = BitNumbering.MSB):
+        """
+        :param bits: two dimensional array, every row holds the bits of one bitstring (in the order of BitString.array)
+        """
+        bits = numpy.asarray(bits, dtype=numpy.int64)
+        if numbering is BitNumbering.LSB:
+            bits = bits[:, ::-1]
+        return cls(integers=integers_from_bits(bits), nbits=bits.shape[-1], numbering=numbering)
+
+    @classmethod
+    def from_binaries(cls, binaries: List[str], numbering: BitNumbering = BitNumbering.MSB):
+        """
+        :param binaries: binary strings of the same length (in the order of BitString.binary)
+        """
+        nbits = max([len(b) for b in binaries], default=1)
+        codes = numpy.asarray([b.zfill(nbits) if numbering is BitNumbering.MSB else b.ljust(nbits, "0")
+                               for b in binaries], dtype="U{}".format(nbits))
+        bits = codes.view(numpy.uint32).reshape(len(binaries), nbits) - ord("0")
+        return cls.from_arrays(bits=bits, numbering=numbering)
+
+    @property
+    def bitstring_type(self):
+        return BitString if self.numbering is BitNumbering.MSB else BitStringLSB
+
+    @property
+    def array(self) -> numpy.ndarray:
+        """
+        :return: two dimensional array with the bits of every bitstring (in the order of BitString.array)
+        """
+        shifts = numpy.arange(self.nbits, dtype=numpy.int64)
+        if self.numbering is BitNumbering.MSB:
+            shifts = shifts[::-1]
+        return ((self.integers[:, None] >> shifts[None, :]) & 1).astype(numpy.int8)
+
+    @property
+    def binary(self) -> List[str]:
+        rows = (self.array + ord("0")).astype(numpy.uint32)
+        return numpy.ascontiguousarray(rows).view("U{}".format(max(self.nbits, 1))).reshape(-1).tolist()
+
+    def to_numbering(self, numbering: BitNumbering) -> 'BitStringArray':
+        """
+        :return: bitstrings with the same bits (array, binary) in the other numbering, the integers are bit reversed
+            (in contrast to BitString.from_bitstring and the keymaps, which keep the integers)
+        """
+        if numbering is self.numbering:
+            return self
+        return BitStringArray(integers=reverse_bits(self.integers, nbits=self.nbits), nbits=self.nbits,
+                              numbering=numbering)
+
+    def to_bitstrings(self) -> List[BitString]:
+        create = self.bitstring_type._create
+        nbits = self.nbits
+        return [create(integer=i, nbits=nbits) for i in self.integers.tolist()]
+
+    def __len__(self):
+        return len(self.integers)
+
+    def __iter__(self):
+        return iter(self.to_bitstrings())
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, numpy.integer)):
+            return self.bitstring_type._create(integer=int(self.integers[item]), nbits=self.nbits)
+        return BitStringArray(integers=self.integers[item], nbits=self.nbits, numbering=self.numbering)
+
+    def __repr__(self):
+        return "BitStringArray({} bitstrings with {} bits)".format(len(self), self.nbits)
+
+
 def initialize_bitstring(integer: int, nbits: int = None, numbering_in: BitNumbering = BitNumbering.MSB,
                          numbering_out: BitNumbering = BitNumbering.MSB):
     if numbering_in == BitNumbering.MSB:
@@ -189,3 +338,46 @@ def initialize_bitstring(integer: int, nbits: int = None, numbering_in: BitNumbe
             return BitStringLSB.from_int(integer=integer, nbits=nbits)
         else:
             return BitStringLSB.from_binary(binary=BitString.from_int(integer=integer, nbits=nbits).binary, nbits=nbits)
+
+
+def parity(integers: numpy.ndarray) -> numpy.ndarray:
+    """
+    Vectorized parity (popcount modulo 2) of non-negative 64bit integers
+    :param integers: numpy array of integers
+    :return: numpy array with 0 for even and 1 for odd number of set bits
+    """
+    x = numpy.asarray(integers, dtype=numpy.int64)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        x = x ^ (x >> shift)
+    return x & 1
+
+
+# the bit-reversed value of every byte
+_REVERSED_BYTES = numpy.asarray([int("{:08b}".format(i)[::-1], 2) for i in range(256)], dtype=numpy.uint64)
+
+
+def reverse_bits(integers: numpy.ndarray, nbits: int) -> numpy.ndarray:
+    """
+    Vectorized bit reversal of non-negative integers, i.e. conversion between MSB and LSB numbering
+    The integers are reversed bytewise with a lookup table
+    :param integers: numpy array of integers
+    :param nbits: number of bits which are reversed
+    :return: numpy array of the reversed integers
+    """
+    x = numpy.asarray(integers, dtype=numpy.uint64)
+    nbytes = (nbits + 7) // 8
+    result = numpy.zeros_like(x)
+    for i in range(nbytes):
+        result |= _REVERSED_BYTES[(x >> numpy.uint64(8 * i)) & numpy.uint64(255)] << numpy.uint64(8 * (nbytes - 1 - i))
+    return (result >> numpy.uint64(8 * nbytes - nbits)).astype(numpy.int64)
+
+
+def integers_from_bits(bits: numpy.ndarray) -> numpy.ndarray:
+    """
+    Vectorized conversion of measured bits to integers (MSB numbering)
+    :param bits: two dimensional array, every row holds the bits of one outcome, the first bit is the most significant
+    :return: numpy array of the integers
+    """
+    bits = numpy.asarray(bits, dtype=numpy.int64)
+    nbits = bits.shape[-1]
+    return numpy.dot(bits, numpy.left_shift(1, numpy.arange(nbits - 1, -1, -1, dtype=numpy.int64)))
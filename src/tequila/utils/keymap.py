@@ -1,6 +1,36 @@
 import typing
 import numbers
-from tequila import BitNumbering, BitString, BitStringLSB
+import numpy
+from tequila import BitNumbering, BitString, BitStringLSB, TequilaException
+
+
+def scatter_tables(weights: typing.List[typing.Tuple[int, int]], nbits: int) -> numpy.ndarray:
+    """
+    Lookup tables which move bits of integers to other positions (like pdep/pext), one table for every byte
+    :param weights: pairs (source bit, target bit), bit 0 is the least significant bit
+    :param nbits: number of bits of the source integers
+    :return: array of shape (bytes, 256), table[b, v] are the target bits of the byte b with value v
+    """
+    if max([t for s, t in weights], default=0) > 62:
+        raise TequilaException("integer keymaps support at most 63 bits")
+    tables = numpy.zeros(((max(nbits, 1) + 7) // 8, 256), dtype=numpy.int64)
+    values = numpy.arange(256, dtype=numpy.int64)
+    for source, target in weights:
+        tables[source // 8] |= ((values >> (source % 8)) & 1) << target
+    return tables
+
+
+def scatter_bits(integers: numpy.ndarray, tables: numpy.ndarray) -> numpy.ndarray:
+    """
+    :param integers: array of integers
+    :param tables: see scatter_tables
+    :return: the integers with the bits moved to their target positions (bits without target are dropped)
+    """
+    integers = numpy.asarray(integers, dtype=numpy.int64)
+    result = numpy.zeros_like(integers)
+    for b, table in enumerate(tables):
+        result |= table[(integers >> (8 * b)) & 255]
+    return result
 
 
 class KeyMapABC:
@@ -57,24 +87,56 @@ class KeyMapSubregisterToRegister(KeyMapABC):
     def complement(self):
         return self.make_complement()
 
+    @property
+    def weights(self) -> typing.List[typing.Tuple[int, int]]:
+        """
+        :return: pairs (bit in subregister integers, bit in register integers), bit 0 is the least significant bit
+        """
+        return self._weights
+
+    @property
+    def mask(self) -> int:
+        """
+        :return: integer with the bits of the subregister in the register set
+        """
+        return self._mask
+
+    @property
+    def tables(self) -> numpy.ndarray:
+        if self._tables is None:
+            self._tables = scatter_tables(weights=self.weights, nbits=len(self._subregister))
+        return self._tables
+
+    @property
+    def inverted_tables(self) -> numpy.ndarray:
+        if self._inverted_tables is None:
+            self._inverted_tables = scatter_tables(weights=[(t, s) for s, t in self.weights],
+                                                   nbits=len(self._register))
+        return self._inverted_tables
+
     def __init__(self, subregister: typing.List[int], register: typing.List[int]):
         self._subregister = subregister
         self._register = register
+        m = len(subregister)
+        n = len(register)
+        self._weights = [(m - 1 - k, n - 1 - v) for k, v in enumerate(subregister)]
+        self._mask = 0
+        for source, target in self._weights:
+            self._mask |= 1 << target
+        self._tables = None
+        self._inverted_tables = None
 
     def make_complement(self):
         return [i for i in self._register if i not in self._subregister]
 
     def __call__(self, input_state: BitString, initial_state: BitString = None) -> BitString:
-        if initial_state is None:
-            initial_state = BitString.from_int(integer=0)
-
-        input_state = BitString.from_int(integer=input_state, nbits=len(self._subregister))
-        initial_state = BitString.from_int(integer=initial_state, nbits=len(self._subregister))
-        output_state = BitString.from_int(integer=initial_state.integer, nbits=len(self._register))
-        for k, v in enumerate((self._subregister)):
-            output_state[v] = input_state[k]
-
-        return output_state
+        output_state = 0
+        input_state = int(input_state)
+        for source, target in self.weights:
+            output_state |= ((input_state >> source) & 1) << target
+        if initial_state is not None:
+            output_state |= int(initial_state) & ~self.mask
+        return BitString.from_int(integer=output_state, nbits=len(self._register))
 
     def inverted(self, input_state: int) -> BitString:
         """
@@ -82,11 +144,46 @@ class KeyMapSubregisterToRegister(KeyMapABC):
         :param input_state:
         :return: input_state only on subregister
         """
-        input_state = BitString.from_int(integer=input_state, nbits=len(self._register))
-        output_state = BitString.from_int(integer=0, nbits=len(self._subregister))
-        for k, v in enumerate(self._subregister):
-            output_state[k] = input_state[v]
-        return output_state
+        output_state = 0
+        input_state = int(input_state)
+        for source, target in self.weights:
+            output_state |= ((input_state >> target) & 1) << source
+        return BitString.from_int(integer=output_state, nbits=len(self._subregister))
+
+    def map_integers(self, integers: numpy.ndarray, initial_state: int = None) -> numpy.ndarray:
+        """
+        Vectorized version of __call__
+        :param integers: array of integers of basis states on the subregister
+        :param initial_state: bits of the register which are not in the subregister are taken from it
+        :return: array of integers of the basis states on the register
+        """
+        mapped = scatter_bits(integers=integers, tables=self.tables)
+        if initial_state is not None:
+            mapped |= int(initial_state) & ~self.mask
+        return mapped
+
+    def inverted_integers(self, integers: numpy.ndarray) -> numpy.ndarray:
+        """
+        Vectorized version of inverted
+        """
+        return scatter_bits(integers=integers, tables=self.inverted_tables)
+
+    def embed(self, amplitudes: numpy.ndarray, initial_state: int = None) -> numpy.ndarray:
+        """
+        :param amplitudes: statevector on the subregister (2^len(subregister) entries)
+        :param initial_state: bits of the register which are not in the subregister are taken from it
+        :return: statevector on the register (2^len(register) entries)
+        """
+        if len(amplitudes) != 2 ** len(self._subregister):
+            raise TequilaException("statevector with {} entries does not fit a subregister of {} qubits".format(
+                len(amplitudes), len(self._subregister)))
+        if initial_state is not None and not 0 <= int(initial_state) < 2 ** len(self._register):
+            raise TequilaException("initial state {} is not a basis state of the register".format(initial_state))
+        result = numpy.zeros(2 ** len(self._register), dtype=amplitudes.dtype)
+        indices = self.map_integers(integers=numpy.arange(len(amplitudes), dtype=numpy.int64),
+                                    initial_state=initial_state)
+        result[indices] = amplitudes
+        return result
 
     def __repr__(self):
         return "keymap:\n" + "register    = " + str(self.register) + "\n" + "subregister = " + str(self.subregister)
@@ -100,11 +197,10 @@ class KeyMapRegisterToSubregister(KeyMapSubregisterToRegister):
         :param input_state:
         :return: input_state only on subregister
         """
-        input_state = BitString.from_int(integer=input_state.integer, nbits=len(self._register))
-        output_state = BitString.from_int(integer=0, nbits=len(self._subregister))
-        for k, v in enumerate(self._subregister):
-            output_state[k] = input_state[v]
-        return output_state
+        return self.inverted(input_state=input_state)
+
+    def map_integers(self, integers: numpy.ndarray, initial_state: int = None) -> numpy.ndarray:
+        return self.inverted_integers(integers=integers)
 
     def __repr__(self):
         return "keymap:\n" + "register    = " + str(self.register) + "\n" + "subregister = " + str(self.subregister)
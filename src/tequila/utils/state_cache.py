@@ -0,0 +1,136 @@
+import threading, contextlib, typing, collections
+
+"""
+Simulated states which are shared between compiled expectation values
+Objectives open a state cache while they are evaluated, so expectation values with the same circuit
+(but different hamiltonians) simulate the circuit only once per call
+Circuits which only differ near the end (shifted circuits of gradients, prefix circuits of the QNG metric)
+share the intermediate states of their common gate prefix (see PrefixStateCache)
+The caches are local to the thread and dropped when the outermost evaluation is done
+"""
+
+# default memory limit of the intermediate states kept by a PrefixStateCache (in bytes)
+PREFIX_CACHE_MEMORY = 2 ** 28
+
+_local = threading.local()
+
+
+class _PrefixNode:
+    """
+    Node of the gate trie: children are keyed by the key of the next gate
+    terminal nodes are the end of a simulated circuit, state is None if no intermediate state is stored
+    """
+    __slots__ = ["children", "state", "nbytes", "terminal"]
+
+    def __init__(self):
+        self.children = {}
+        self.state = None
+        self.nbytes = 0
+        self.terminal = False
+
+
+class PrefixStateCache:
+    """
+    Trie of the gate sequences of all simulated circuits
+    Intermediate states are stored where a new circuit leaves the gates of the previous ones
+    (a branching point or the end of a previous circuit), so later circuits with the same prefix
+    only simulate their remaining gates
+    The stored states are evicted in least recently used order once max_memory is exceeded
+
+    Parameters
+    ----------
+    max_memory: memory limit of the stored states in bytes
+    """
+
+    def __init__(self, max_memory: int = None):
+        self.max_memory = PREFIX_CACHE_MEMORY if max_memory is None else max_memory
+        self.memory = 0
+        self._roots = {}
+        self._stored = collections.OrderedDict()
+
+    def simulate(self, root, keys: list, initialize: typing.Callable, apply: typing.Callable,
+                 copy: typing.Callable = None, nbytes: typing.Callable = None):
+        """
+        :param root: hashable key of the register and the initial state, only circuits with the same root share states
+        :param keys: hashable keys of the gates with their current parameters
+        :param initialize: called without arguments, gives the initial state
+        :param apply: apply(state, start, stop) applies the gates start:stop to the state and gives back the result
+        :param copy: copies a state, default is state.copy()
+        :param nbytes: memory of a state, default is state.nbytes
+        :return: the state after all gates
+        """
+        copy = (lambda x: x.copy()) if copy is None else copy
+        nbytes = (lambda x: x.nbytes) if nbytes is None else nbytes
+
+        node = self._roots.setdefault(root, _PrefixNode())
+        depth = 0
+        resume, resume_depth = None, 0
+        for key in keys:
+            child = node.children.get(key)
+            if child is None:
+                break
+            node = child
+            depth += 1
+            if node.state is not None:
+                resume, resume_depth = node, depth
+
+        if resume is None:
+            state = initialize()
+        else:
+            self._stored.move_to_end(id(resume))
+            state = copy(resume.state)
+
+        # keep the state where this circuit leaves the previous ones
+        if depth < len(keys) and (len(node.children) > 0 or node.terminal) and node.state is None and depth > 0:
+            state = apply(state, resume_depth, depth)
+            self.store(node=node, state=copy(state), nbytes=nbytes(state))
+            resume_depth = depth
+        for key in keys[depth:]:
+            node = node.children.setdefault(key, _PrefixNode())
+        node.terminal = True
+        return apply(state, resume_depth, len(keys))
+
+    def store(self, node: _PrefixNode, state, nbytes: int):
+        if nbytes > self.max_memory:
+            return
+        while self.memory + nbytes > self.max_memory:
+            _, evicted = self._stored.popitem(last=False)
+            self.memory -= evicted.nbytes
+            evicted.state = None
+            evicted.nbytes = 0
+        node.state = state
+        node.nbytes = nbytes
+        self.memory += nbytes
+        self._stored[id(node)] = node
+
+
+def active_state_cache() -> typing.Optional[dict]:
+    """
+    :return: the state cache of the current evaluation or None if no cache is open
+    """
+    return getattr(_local, "cache", None)
+
+
+def active_prefix_cache() -> typing.Optional[PrefixStateCache]:
+    """
+    :return: the prefix state cache of the current evaluation or None if no cache is open
+    """
+    return getattr(_local, "prefixes", None)
+
+
+@contextlib.contextmanager
+def shared_states(max_memory: int = None):
+    """
+    Open a state cache and a prefix state cache for the current thread, nested calls use the outermost caches
+    :param max_memory: memory limit of the prefix state cache in bytes (default is PREFIX_CACHE_MEMORY)
+    """
+    if active_state_cache() is not None:
+        yield _local.cache
+        return
+    _local.cache = {}
+    _local.prefixes = PrefixStateCache(max_memory=max_memory)
+    try:
+        yield _local.cache
+    finally:
+        _local.cache = None
+        _local.prefixes = None
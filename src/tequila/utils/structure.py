@@ -0,0 +1,99 @@
+import numbers, types, numpy
+
+_ATOMS = {str, int, float, complex, bool, type(None)}
+
+"""
+Structural keys: hashable representations of tequila objects which are equal
+if the objects describe the same computation (same gates, same hamiltonians, same parameter expressions)
+and which do not rely on object identity
+"""
+
+
+class IdentityKey:
+    """
+    Wraps objects without structural representation, compares by identity
+    The reference is kept, so the id can not be reused while the key lives
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, IdentityKey) and self.obj is other.obj
+
+
+class HashedKey:
+    """
+    Wraps a hashable key and computes its hash only once
+    For keys which are expensive to hash (e.g. circuits) and are looked up often
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._hash = hash(key)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        return isinstance(other, HashedKey) and self._hash == other._hash and (
+                self.key is other.key or self.key == other.key)
+
+
+def structural_key(obj, _active: set = None) -> tuple:
+    """
+    Hashable structural representation of an object
+    Objects can define their own representation by implementing structural_key()
+    Functions (e.g. the lambdas in Objective transformations) are represented by their code and the
+    representations of their closures, so identical expressions built twice give the same key
+    Other objects are represented by their type and attributes
+    Objects which can not be represented are compared by identity
+    :param obj: the object
+    :return: hashable key
+    """
+    if type(obj) in _ATOMS or isinstance(obj, numbers.Number):
+        return obj
+    if _active is None:
+        _active = set()
+    if id(obj) in _active:
+        # cyclic reference
+        return IdentityKey(obj)
+    _active.add(id(obj))
+    try:
+        return _structural_key(obj, _active)
+    finally:
+        _active.discard(id(obj))
+
+
+def _structural_key(obj, _active: set):
+    if hasattr(obj, "structural_key") and not isinstance(obj, type):
+        return obj.structural_key()
+    if isinstance(obj, numpy.ndarray):
+        return ("ndarray", obj.dtype.str, obj.shape, obj.tobytes())
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__,) + tuple(structural_key(x, _active) for x in obj)
+    if isinstance(obj, (set, frozenset)):
+        return ("set", frozenset(structural_key(x, _active) for x in obj))
+    if isinstance(obj, dict):
+        items = tuple((structural_key(k, _active), structural_key(v, _active)) for k, v in obj.items())
+        try:
+            items = tuple(sorted(items))
+        except TypeError:
+            pass
+        return ("dict",) + items
+    if isinstance(obj, types.FunctionType):
+        closure = tuple() if obj.__closure__ is None else tuple(
+            structural_key(c.cell_contents, _active) for c in obj.__closure__)
+        return ("function", obj.__code__, closure, structural_key(obj.__defaults__, _active))
+    if isinstance(obj, (type, types.BuiltinFunctionType, numpy.ufunc)):
+        return obj
+    if hasattr(obj, "__dict__"):
+        return (type(obj),) + structural_key(vars(obj), _active)[1:]
+    try:
+        hash(obj)
+        return obj
+    except TypeError:
+        return IdentityKey(obj)
@@ -1,11 +1,10 @@
-import copy
 import typing
 import numpy
 import numbers
 
-from tequila.utils.bitstrings import BitNumbering, BitString, initialize_bitstring
+from tequila.utils.bitstrings import BitNumbering, BitString, BitStringArray, initialize_bitstring, reverse_bits, parity
 from tequila import TequilaException
-from tequila.utils.keymap import KeyMapLSB2MSB, KeyMapMSB2LSB
+from tequila.utils.keymap import KeyMapLSB2MSB, KeyMapMSB2LSB, KeyMapSubregisterToRegister
 from tequila.tools import number_to_string
 
 # from __future__ import annotations # can use that in python 3.7+ to get rid of string type hints
@@ -19,19 +18,65 @@ class QubitWaveFunction:
     """
     Store Wavefunction as dictionary of comp. basis state and complex numbers
     Use the same structure for Measurments results with int instead of complex numbers (counts)
+
+    Amplitudes can alternatively be stored in numpy arrays (see from_dense and from_sparse)
+    dense: array of length 2**n_qubits indexed by the integer of the basis state
+    sparse: sorted int64 array with the integers of the basis states and an array with the amplitudes
+    Arithmetic, inner products and keymaps are then vectorized
+    BitString objects are only created if the dictionary interface (state, items, keys, ...) is used
     """
 
     numbering = BitNumbering.MSB
 
-    def apply_keymap(self, keymap, initial_state: BitString = None):
-        self.n_qubits = keymap.n_qubits
-        mapped_state = dict()
-        for k, v in self.state.items():
-            mapped_state[keymap(input_state=k, initial_state=initial_state)] = v
+    # amplitudes below this threshold are not part of the dictionary interface of dense wavefunctions
+    threshold = 1.e-6
+
+    # dense wavefunctions stay dense under subregister keymaps which add at most this many qubits
+    max_embedding_qubits = 2
 
-        self.state = mapped_state
+    def apply_keymap(self, keymap, initial_state: BitString = None):
+        if self._storage == "dict":
+            self.n_qubits = keymap.n_qubits
+            mapped_state = dict()
+            for k, v in self.state.items():
+                mapped_state[keymap(input_state=k, initial_state=initial_state)] = v
+
+            self.state = mapped_state
+            return self
+
+        if isinstance(keymap, (KeyMapLSB2MSB, KeyMapMSB2LSB)):
+            # keys are stored as integers, the keymap does not change them
+            return self
+
+        n_qubits = max(self.n_qubits if keymap.n_qubits is None else keymap.n_qubits, self.min_qubits())
+        if isinstance(initial_state, BitString):
+            initial_state = initial_state.integer
+        if type(keymap) is KeyMapSubregisterToRegister and self._storage == "dense":
+            if n_qubits == self.n_qubits and list(keymap.subregister) == list(range(n_qubits)):
+                # all bits are mapped onto themselves
+                return self
+            if len(self._amplitudes) == 2 ** len(keymap.subregister) and n_qubits == len(keymap.register) \
+                    and len(keymap.register) - len(keymap.subregister) <= self.max_embedding_qubits \
+                    and (initial_state is None or 0 <= initial_state < 2 ** n_qubits):
+                amplitudes = keymap.embed(amplitudes=self._amplitudes, initial_state=initial_state)
+                return self._set_dense(amplitudes=amplitudes, n_qubits=n_qubits)
+        if isinstance(keymap, KeyMapSubregisterToRegister):
+            indices, amplitudes = self._sparse_arrays(threshold=self.threshold)
+            mapped = keymap.map_integers(integers=indices, initial_state=initial_state)
+        else:
+            indices, amplitudes = self._sparse_arrays(threshold=self.threshold)
+            mapped = numpy.asarray([keymap(input_state=BitString.from_int(integer=int(i), nbits=self.n_qubits),
+                                           initial_state=initial_state).integer for i in indices], dtype=numpy.int64)
+        self._set_sparse(indices=mapped, amplitudes=amplitudes, n_qubits=n_qubits)
         return self
 
+    @property
+    def storage(self) -> str:
+        """
+        :return: how the amplitudes are stored: 'dict', 'dense' or 'sparse'
+        """
+        return self._storage
+
     @property
     def n_qubits(self) -> int:
         if self._n_qubits is None:
@@ -40,7 +85,11 @@ class QubitWaveFunction:
             return max(self._n_qubits, self.min_qubits())
 
     def min_qubits(self) -> int:
-        if len(self.state) > 0:
+        if self._storage == "dense":
+            return int(len(self._amplitudes)).bit_length() - 1
+        elif self._storage == "sparse":
+            return int(self._indices[-1]).bit_length() if len(self._indices) > 0 else 0
+        elif len(self.state) > 0:
             maxk = max(self.state.keys())
             return maxk.nbits
         else:
@@ -50,10 +99,23 @@ class QubitWaveFunction:
     def n_qubits(self, n_qubits):
         if n_qubits is not None:
             self._n_qubits = max(n_qubits, self.min_qubits())
+            if self._storage == "dense" and len(self._amplitudes) < 2 ** self._n_qubits:
+                amplitudes = numpy.zeros(2 ** self._n_qubits, dtype=self._amplitudes.dtype)
+                amplitudes[:len(self._amplitudes)] = self._amplitudes
+                self._amplitudes = amplitudes
         return self
 
     @property
     def state(self):
+        """
+        The wavefunction as dictionary
+        For array storage this is a new dictionary, changing it does not change the wavefunction
+        """
+        if self._storage != "dict":
+            threshold = self.threshold if self._storage == "dense" else None
+            indices, amplitudes = self._sparse_arrays(threshold=threshold)
+            keys = BitStringArray(integers=indices, nbits=self.n_qubits).to_bitstrings()
+            return dict(zip(keys, amplitudes))
         if self._state is None:
             return dict()
         else:
@@ -62,9 +124,89 @@ class QubitWaveFunction:
     @state.setter
     def state(self, other: typing.Dict[BitString, complex]):
         assert (isinstance(other, dict))
+        self._storage = "dict"
+        self._indices = None
+        self._amplitudes = None
         self._state = other
 
+    def _set_dense(self, amplitudes: numpy.ndarray, n_qubits: int = None):
+        self._storage = "dense"
+        self._state = None
+        self._indices = None
+        self._amplitudes = amplitudes
+        self._n_qubits = None
+        self.n_qubits = n_qubits
+        return self
+
+    def _set_sparse(self, indices: numpy.ndarray, amplitudes: numpy.ndarray, n_qubits: int = None):
+        order = numpy.argsort(indices, kind="stable")
+        self._storage = "sparse"
+        self._state = None
+        self._indices = numpy.asarray(indices, dtype=numpy.int64)[order]
+        self._amplitudes = numpy.asarray(amplitudes)[order]
+        self._n_qubits = None
+        self.n_qubits = n_qubits
+        return self
+
+    def _sparse_arrays(self, threshold: float = None) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :param threshold: only for dense storage: ignore amplitudes with smaller absolute value
+        :return: sorted integers of the basis states and their amplitudes
+        """
+        if self._storage == "dense":
+            if threshold is None:
+                indices = numpy.flatnonzero(self._amplitudes)
+            else:
+                indices = numpy.flatnonzero(numpy.abs(self._amplitudes) > threshold)
+            return indices.astype(numpy.int64), self._amplitudes[indices]
+        elif self._storage == "sparse":
+            return self._indices, self._amplitudes
+        else:
+            indices = numpy.asarray([int(k) for k in self.keys()], dtype=numpy.int64)
+            amplitudes = numpy.asarray(list(self.values()))
+            order = numpy.argsort(indices, kind="stable")
+            return indices[order], amplitudes[order]
+
+    def to_arrays(self) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        :return: sorted integers of the stored basis states (MSB numbering) and their amplitudes (or counts)
+        """
+        return self._sparse_arrays()
+
+    def to_dense(self, n_qubits: int = None) -> 'QubitWaveFunction':
+        """
+        :param n_qubits: size of the register, defaults to self.n_qubits
+        :return: new wavefunction with dense array storage
+        """
+        if n_qubits is None:
+            n_qubits = self.n_qubits
+        n_qubits = max(n_qubits, self.min_qubits())
+        if self._storage == "dense":
+            amplitudes = numpy.array(self._amplitudes, copy=True)
+        else:
+            indices, values = self._sparse_arrays()
+            amplitudes = numpy.zeros(2 ** n_qubits, dtype=numpy.result_type(values, numpy.complex128))
+            amplitudes[indices] = values
+        return QubitWaveFunction()._set_dense(amplitudes=amplitudes, n_qubits=n_qubits)
+
+    def to_sparse(self) -> 'QubitWaveFunction':
+        """
+        :return: new wavefunction with sparse array storage
+        """
+        indices, amplitudes = self._sparse_arrays()
+        return QubitWaveFunction()._set_sparse(indices=numpy.array(indices, copy=True),
+                                               amplitudes=numpy.array(amplitudes, copy=True), n_qubits=self.n_qubits)
+
+    def to_dict(self) -> 'QubitWaveFunction':
+        """
+        :return: new wavefunction with dictionary storage
+        """
+        return QubitWaveFunction(state=dict(self.state), n_qubits=self.n_qubits)
+
     def __init__(self, state: typing.Dict[BitString, complex] = None, n_qubits=None):
+        self._storage = "dict"
+        self._indices = None
+        self._amplitudes = None
         if state is None:
             self._state = dict()
         elif isinstance(state, int):
@@ -97,8 +239,25 @@ class QubitWaveFunction:
         else:
             return key
 
+    def _lookup(self, key) -> typing.Optional[numbers.Number]:
+        # amplitude of a basis state (given as integer) for array storage, None if it is not stored
+        i = int(key.integer) if isinstance(key, BitString) else int(key)
+        if self._storage == "dense":
+            if i < len(self._amplitudes):
+                return self._amplitudes[i]
+        else:
+            position = numpy.searchsorted(self._indices, i)
+            if position < len(self._indices) and self._indices[position] == i:
+                return self._amplitudes[position]
+        return None
+
     def __getitem__(self, item: BitString):
         key = self.convert_bitstring(item, self.n_qubits)
+        if self._storage != "dict":
+            value = self._lookup(key)
+            if value is None:
+                raise KeyError(key)
+            return value
         return self.state[key]
 
     def __call__(self, key, *args, **kwargs) -> numbers.Number:
@@ -113,6 +272,9 @@ class QubitWaveFunction:
             Return the amplitude or measurement occurence of a bitstring
         """
         ckey = self.convert_bitstring(key, self.n_qubits)
+        if self._storage != "dict":
+            value = self._lookup(ckey)
+            return 0.0 if value is None else value
         if ckey in self.state:
             return self.state[ckey]
         else:
@@ -121,13 +283,35 @@ class QubitWaveFunction:
 
 
     def __setitem__(self, key: BitString, value: numbers.Number):
-        self._state[self.convert_bitstring(key, self.n_qubits)] = value
+        key = self.convert_bitstring(key, self.n_qubits)
+        if self._storage == "dense":
+            self.n_qubits = key.nbits
+            self._amplitudes[key.integer] = value
+        elif self._storage == "sparse":
+            position = numpy.searchsorted(self._indices, key.integer)
+            if position < len(self._indices) and self._indices[position] == key.integer:
+                self._amplitudes[position] = value
+            else:
+                self._indices = numpy.insert(self._indices, position, key.integer)
+                self._amplitudes = numpy.insert(self._amplitudes, position, value)
+        else:
+            self._state[key] = value
         return self
 
     def __contains__(self, item: BitString):
-        return self.convert_bitstring(item, self.n_qubits) in self.keys()
+        key = self.convert_bitstring(item, self.n_qubits)
+        if self._storage == "dense":
+            value = self._lookup(key)
+            return value is not None and abs(value) > self.threshold
+        elif self._storage == "sparse":
+            return self._lookup(key) is not None
+        return key in self.keys()
 
     def __len__(self):
+        if self._storage == "dense":
+            return int(numpy.count_nonzero(numpy.abs(self._amplitudes) > self.threshold))
+        elif self._storage == "sparse":
+            return len(self._indices)
         return len(self.state)
 
     @classmethod
@@ -138,11 +322,10 @@ class QubitWaveFunction:
         state = dict()
         maxkey = len(arr) - 1
         maxbit = initialize_bitstring(integer=maxkey, numbering_in=numbering, numbering_out=cls.numbering).nbits
-        for ii, v in enumerate(arr):
-            i = initialize_bitstring(integer=ii, nbits=maxbit, numbering_in=numbering, numbering_out=cls.numbering)
-            if not numpy.isclose(abs(v), 0.0, atol=threshold):
-                key = i if keymap is None else keymap(i)
-                state[key] = v
+        for ii in numpy.flatnonzero(numpy.abs(arr) > threshold):
+            i = initialize_bitstring(integer=int(ii), nbits=maxbit, numbering_in=numbering, numbering_out=cls.numbering)
+            key = i if keymap is None else keymap(i)
+            state[key] = arr[ii]
         result = QubitWaveFunction(state, n_qubits=n_qubits)
 
         if cls.numbering != numbering:
@@ -153,6 +336,55 @@ class QubitWaveFunction:
 
         return result
 
+    @classmethod
+    def from_dense(cls, arr: numpy.ndarray, numbering: BitNumbering = BitNumbering.MSB, n_qubits: int = None):
+        """
+        Wavefunction with dense array storage
+        :param arr: amplitudes, length needs to be a power of two
+        :param numbering: bit numbering used for the indices of arr
+        :param n_qubits: number of qubits, defaults to log2 of the length of arr
+        """
+        arr = numpy.asarray(arr)
+        assert (len(arr.shape) == 1)
+        nbits = int(len(arr)).bit_length() - 1
+        if len(arr) != 2 ** nbits:
+            raise TequilaException("dense wavefunction needs 2**n_qubits amplitudes, received {}".format(len(arr)))
+        if numbering != cls.numbering:
+            arr = arr[reverse_bits(numpy.arange(len(arr)), nbits=nbits)]
+        return QubitWaveFunction()._set_dense(amplitudes=arr, n_qubits=n_qubits)
+
+    @classmethod
+    def from_sparse(cls, indices: numpy.ndarray, amplitudes: numpy.ndarray, n_qubits: int,
+                    numbering: BitNumbering = BitNumbering.MSB):
+        """
+        Wavefunction with sparse array storage
+        :param indices: integers of the basis states
+        :param amplitudes: corresponding amplitudes
+        :param n_qubits: number of qubits
+        :param numbering: bit numbering used for indices
+        """
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+        if numbering != cls.numbering:
+            indices = reverse_bits(indices, nbits=n_qubits)
+        return QubitWaveFunction()._set_sparse(indices=indices, amplitudes=numpy.asarray(amplitudes), n_qubits=n_qubits)
+
+    @classmethod
+    def from_counts(cls, outcomes: numpy.ndarray, n_qubits: int, numbering: BitNumbering = BitNumbering.MSB,
+                    counts: numpy.ndarray = None):
+        """
+        Measurement counts with sparse array storage
+        :param outcomes: integers of the measured basis states, one per shot
+        :param n_qubits: number of measured qubits
+        :param numbering: bit numbering used for outcomes
+        :param counts: number of shots for each outcome, outcomes may repeat (default: one shot per outcome)
+        """
+        if counts is None:
+            indices, counts = numpy.unique(numpy.asarray(outcomes, dtype=numpy.int64), return_counts=True)
+        else:
+            indices, inverse = numpy.unique(numpy.asarray(outcomes, dtype=numpy.int64), return_inverse=True)
+            counts = numpy.bincount(inverse, weights=counts, minlength=len(indices)).astype(numpy.int64)
+        return cls.from_sparse(indices=indices, amplitudes=counts, n_qubits=n_qubits, numbering=numbering)
+
     @classmethod
     def from_int(cls, i: int, coeff=1, n_qubits: int = None):
         if isinstance(i, BitString):
@@ -205,6 +437,13 @@ class QubitWaveFunction:
         return result
 
     def __eq__(self, other):
+        if self._storage != "dict" or other._storage != "dict":
+            threshold = self.threshold
+            indices, values = self._sparse_arrays(threshold=threshold if self._storage == "dense" else None)
+            other_indices, other_values = other._sparse_arrays(threshold=threshold if other._storage == "dense" else None)
+            return numpy.array_equal(indices, other_indices) and numpy.allclose(numpy.asarray(values, dtype=complex),
+                                                                                numpy.asarray(other_values, dtype=complex),
+                                                                                atol=1.e-6)
         if len(self.state) != len(other.state):
             return False
         for k, v in self.state.items():
@@ -215,8 +454,25 @@ class QubitWaveFunction:
 
         return True
 
+    def _combine(self, other, factor=1.0) -> 'QubitWaveFunction':
+        # self + factor*other for array storage, dense if both are dense on the same register
+        n_qubits = max(self.n_qubits, other.n_qubits)
+        if self._storage == "dense" and other._storage == "dense" and len(self._amplitudes) == len(other._amplitudes):
+            return QubitWaveFunction()._set_dense(amplitudes=self._amplitudes + factor * other._amplitudes,
+                                                  n_qubits=n_qubits)
+        indices, values = self._sparse_arrays()
+        other_indices, other_values = other._sparse_arrays()
+        indices, inverse = numpy.unique(numpy.concatenate([indices, other_indices]), return_inverse=True)
+        dtype = numpy.result_type(values, other_values, factor)
+        amplitudes = numpy.zeros(len(indices), dtype=dtype)
+        numpy.add.at(amplitudes, inverse[:len(values)], values)
+        numpy.add.at(amplitudes, inverse[len(values):], factor * other_values)
+        return QubitWaveFunction()._set_sparse(indices=indices, amplitudes=amplitudes, n_qubits=n_qubits)
+
     def __add__(self, other):
-        result = QubitWaveFunction(state=copy.deepcopy(self._state))
+        if self._storage != "dict" or other._storage != "dict":
+            return self._combine(other)
+        result = QubitWaveFunction(state=dict(self._state))
         for k, v in other.items():
             if k in result._state:
                 result._state[k] += v
@@ -228,6 +484,10 @@ class QubitWaveFunction:
         return self + -1.0 * other
 
     def __iadd__(self, other):
+        if self._storage != "dict" or other._storage != "dict":
+            result = self._combine(other)
+            self.__dict__.update(result.__dict__)
+            return self
         for k, v in other.items():
             if k in self._state:
                 self._state[k] += v
@@ -236,12 +496,26 @@ class QubitWaveFunction:
         return self
 
     def __rmul__(self, other):
-        result = QubitWaveFunction(state=copy.deepcopy(self._state))
-        for k, v in result._state.items():
-            result._state[k] *= other
+        if self._storage == "dense":
+            return QubitWaveFunction()._set_dense(amplitudes=other * self._amplitudes, n_qubits=self.n_qubits)
+        elif self._storage == "sparse":
+            return QubitWaveFunction()._set_sparse(indices=self._indices, amplitudes=other * self._amplitudes,
+                                                   n_qubits=self.n_qubits)
+        result = QubitWaveFunction(state={k: v * other for k, v in self._state.items()})
         return result
 
     def inner(self, other):
+        if self._storage == "dense" and other._storage == "dense":
+            n = min(len(self._amplitudes), len(other._amplitudes))
+            return numpy.vdot(self._amplitudes[:n], other._amplitudes[:n])
+        elif self._storage != "dict" or other._storage != "dict":
+            indices, values = self._sparse_arrays()
+            if other._storage == "dense":
+                inside = indices < len(other._amplitudes)
+                return numpy.vdot(values[inside], other._amplitudes[indices[inside]])
+            other_indices, other_values = other._sparse_arrays()
+            common, i, j = numpy.intersect1d(indices, other_indices, assume_unique=True, return_indices=True)
+            return numpy.vdot(values[i], other_values[j])
         # currently very slow and not optimized in any way
         result = 0.0
         for k, v in self.items():
@@ -274,7 +548,10 @@ class QubitWaveFunction:
         """
         result = QubitWaveFunction()
         for ps in operator.paulistrings:
-            result += self.apply_paulistring(paulistring=ps)
+            if self._storage != "dict" and result._storage == "dict":
+                result = self.apply_paulistring(paulistring=ps)
+            else:
+                result += self.apply_paulistring(paulistring=ps)
         return result
 
     def apply_paulistring(self, paulistring: 'PauliString'):
@@ -283,6 +560,8 @@ class QubitWaveFunction:
         :param paulistring: PauliString
         :return: Expectation Value
         """
+        if self._storage != "dict":
+            return self._apply_paulistring_masks(paulistring=paulistring)
         result = QubitWaveFunction()
         for k, v in self.items():
             arr = k.array
@@ -300,16 +579,53 @@ class QubitWaveFunction:
             result[BitString.from_array(array=arr)] = c
         return paulistring.coeff * result
 
+    def _apply_paulistring_masks(self, paulistring: 'PauliString'):
+        # P|i> = i^ny (-1)^popcount(i & zmask) |i ^ xmask> on the integers of the basis states
+        n_qubits = self.n_qubits
+        xmask = 0
+        zmask = 0
+        phase = paulistring.coeff
+        for idx, p in paulistring.items():
+            if idx >= n_qubits:
+                raise TequilaException(
+                    "paulistring acts on qubit {} but wavefunction has only {} qubits".format(idx, n_qubits))
+            bit = 1 << (n_qubits - 1 - idx)
+            if p.lower() == "x":
+                xmask |= bit
+            elif p.lower() == "y":
+                xmask |= bit
+                zmask |= bit
+                phase *= 1.0j
+            elif p.lower() == "z":
+                zmask |= bit
+            else:
+                raise TequilaException("unknown pauli: " + str(p))
+
+        if self._storage == "dense":
+            indices = numpy.arange(len(self._amplitudes), dtype=numpy.int64)
+            amplitudes = phase * self._amplitudes * (1 - 2 * parity(indices & zmask))
+            return QubitWaveFunction()._set_dense(amplitudes=amplitudes[indices ^ xmask], n_qubits=n_qubits)
+        else:
+            amplitudes = phase * self._amplitudes * (1 - 2 * parity(self._indices & zmask))
+            return QubitWaveFunction()._set_sparse(indices=self._indices ^ xmask, amplitudes=amplitudes,
+                                                   n_qubits=n_qubits)
+
     def to_array(self):
+        if self._storage != "dict":
+            return self.to_dense()._amplitudes
         result = numpy.zeros(shape=2 ** self.n_qubits)
         for k, v in self.items():
             result[int(k)] = v
         return result
 
     def simplify(self, threshold = 1.e-8):
+        if self._storage != "dict":
+            indices, amplitudes = self._sparse_arrays()
+            keep = numpy.abs(amplitudes) > threshold
+            return QubitWaveFunction()._set_sparse(indices=indices[keep], amplitudes=amplitudes[keep],
+                                                   n_qubits=self.n_qubits)
         state = {}
         for k, v in self.state.items():
             if not numpy.isclose(v, 0.0, atol=threshold):
                 state[k] = v
         return QubitWaveFunction(state=state)
-
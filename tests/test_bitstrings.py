@@ -1,4 +1,5 @@
-from tequila import BitString, BitNumbering, BitStringLSB
+import pytest
+from tequila import BitString, BitNumbering, BitStringLSB, BitStringArray
 
 
 def test_bitstrings():
@@ -89,3 +90,69 @@ def test_constructor():
         assert (bita == bite)
         assert (bita == bitf)
         assert (bita == bitg)
+
+
+def test_vectorized_conversion():
+    import numpy
+    from tequila.utils.bitstrings import reverse_bits, integers_from_bits
+    for nbits in [1, 3, 8, 13, 40, 63]:
+        integers = numpy.random.randint(0, 2 ** nbits, 50, dtype=numpy.int64)
+        reversed_integers = reverse_bits(integers, nbits=nbits)
+        for i, r in zip(integers, reversed_integers):
+            assert BitStringLSB.from_int(integer=int(i), nbits=nbits).binary == BitString.from_int(integer=int(r),
+                                                                                                   nbits=nbits).binary
+        bits = [BitString.from_int(integer=int(i), nbits=nbits).array for i in integers]
+        assert numpy.array_equal(integers_from_bits(bits), integers)
+
+
+@pytest.mark.parametrize("bitstring_type", [BitString, BitStringLSB])
+@pytest.mark.parametrize("nbits", [1, 5, 70])
+def test_bit_access(bitstring_type, nbits):
+    import numpy
+    arr = [int(x) for x in numpy.random.randint(0, 2, nbits)]
+    bits = bitstring_type.from_array(array=arr, nbits=nbits)
+    assert [bits[i] for i in range(nbits)] == arr
+    assert bits[-1] == arr[-1]
+    assert bits[1:] == arr[1:]
+    with pytest.raises(IndexError):
+        bits[nbits]
+    # cached views are updated when the bitstring changes
+    assert bits.binary == "".join(str(x) for x in arr)
+    changed = bits.array
+    changed[0] = 1 - changed[0]
+    assert bits.array == arr
+    bits[0] = changed[0]
+    assert bits.array == changed
+    assert bits == bitstring_type.from_array(array=changed, nbits=nbits)
+    assert bits.binary == "".join(str(x) for x in changed)
+    bits.integer = 0
+    assert bits.array == [0] * nbits
+    bits += bitstring_type.from_int(integer=1, nbits=nbits)
+    assert bits.integer == 1
+
+
+@pytest.mark.parametrize("numbering", [BitNumbering.MSB, BitNumbering.LSB])
+@pytest.mark.parametrize("nbits", [1, 4, 33])
+def test_bitstring_array(numbering, nbits):
+    import numpy
+    bitstring_type = BitString if numbering is BitNumbering.MSB else BitStringLSB
+    integers = numpy.random.randint(0, 2 ** nbits, 20, dtype=numpy.int64)
+    bitstrings = [bitstring_type.from_int(integer=int(i), nbits=nbits) for i in integers]
+
+    array = BitStringArray(integers=integers, nbits=nbits, numbering=numbering)
+    assert array.to_bitstrings() == bitstrings
+    assert all(a.nbits == b.nbits for a, b in zip(array, bitstrings))
+    assert array[3] == bitstrings[3]
+    assert len(array[2:5]) == 3
+    assert array.array.tolist() == [b.array for b in bitstrings]
+    assert array.binary == [b.binary for b in bitstrings]
+
+    for other in [BitStringArray.from_bitstrings(bitstrings), BitStringArray.from_arrays(array.array, numbering),
+                  BitStringArray.from_binaries(array.binary, numbering)]:
+        assert other.nbits == nbits
+        assert other.numbering is numbering
+        assert numpy.array_equal(other.integers, integers)
+
+    converted = array.to_numbering(BitNumbering.LSB if numbering is BitNumbering.MSB else BitNumbering.MSB)
+    assert converted.binary == array.binary
+    assert converted.to_numbering(numbering).to_bitstrings() == bitstrings
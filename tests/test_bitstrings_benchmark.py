@@ -0,0 +1,92 @@
+"""
+Microbenchmarks for the hot operations on bitstrings
+The results are always checked, the timings are only measured and compared if TEQUILA_BENCHMARKS is set:
+TEQUILA_BENCHMARKS=1 pytest -s tests/test_bitstrings_benchmark.py
+"""
+import os
+import timeit
+import numpy
+import pytest
+
+from tequila import BitString, BitStringLSB, BitStringArray
+
+N_BITS = 20
+N_STATES = 2 ** 12
+
+benchmarks = pytest.mark.skipif("TEQUILA_BENCHMARKS" not in os.environ,
+                                reason="timings are only measured if TEQUILA_BENCHMARKS is set")
+
+
+def best_time(function, number: int = 3) -> float:
+    return min(timeit.repeat(function, number=1, repeat=number))
+
+
+def bit_access(bitstring_type):
+    integers = numpy.random.randint(0, 2 ** N_BITS, N_STATES).tolist()
+    bitstrings = [bitstring_type.from_int(integer=i, nbits=N_BITS) for i in integers]
+
+    def get_items():
+        return [[b[k] for k in range(N_BITS)] for b in bitstrings]
+
+    def set_items():
+        for b in bitstrings:
+            for k in range(N_BITS):
+                b[k] = 1 - b[k]
+
+    def arrays():
+        return [b.array for b in bitstrings]
+
+    return get_items, set_items, arrays
+
+
+def construction(bitstring_type):
+    integers = numpy.random.randint(0, 2 ** N_BITS, N_STATES)
+    array = BitStringArray(integers=integers, nbits=N_BITS, numbering=bitstring_type(nbits=0).numbering)
+
+    def loop_bitstrings():
+        return [bitstring_type.from_int(integer=int(i), nbits=N_BITS) for i in integers]
+
+    def loop_arrays():
+        return [bitstring_type.from_int(integer=int(i), nbits=N_BITS).array for i in integers]
+
+    def loop_binaries():
+        return [bitstring_type.from_int(integer=int(i), nbits=N_BITS).binary for i in integers]
+
+    return {"bitstrings": (loop_bitstrings, array.to_bitstrings),
+            "arrays": (loop_arrays, lambda: array.array.tolist()),
+            "binaries": (loop_binaries, lambda: array.binary)}
+
+
+@pytest.mark.parametrize("bitstring_type", [BitString, BitStringLSB])
+def test_bit_access_results(bitstring_type):
+    get_items, set_items, arrays = bit_access(bitstring_type)
+    items = get_items()
+    assert items == arrays()
+    set_items()
+    assert [[1 - x for x in row] for row in items] == arrays()
+
+
+@pytest.mark.parametrize("bitstring_type", [BitString, BitStringLSB])
+def test_construction_results(bitstring_type):
+    for loop, vectorized in construction(bitstring_type).values():
+        assert loop() == vectorized()
+
+
+@benchmarks
+@pytest.mark.parametrize("bitstring_type", [BitString, BitStringLSB])
+def test_benchmark_bit_access(bitstring_type):
+    get_items, set_items, arrays = bit_access(bitstring_type)
+    print("\n{}: getitem {:.4f}s, setitem {:.4f}s, array {:.4f}s for {} bitstrings with {} bits".format(
+        bitstring_type.__name__, best_time(get_items), best_time(set_items), best_time(arrays), N_STATES, N_BITS))
+
+
+@benchmarks
+@pytest.mark.parametrize("bitstring_type", [BitString, BitStringLSB])
+def test_benchmark_construction(bitstring_type):
+    timings = {name: (best_time(loop), best_time(vectorized))
+               for name, (loop, vectorized) in construction(bitstring_type).items()}
+    print()
+    for name, (loop, vectorized) in timings.items():
+        print("{} {}: loop {:.4f}s, BitStringArray {:.4f}s".format(bitstring_type.__name__, name, loop, vectorized))
+    assert timings["arrays"][1] < timings["arrays"][0]
+    assert timings["binaries"][1] < timings["binaries"][0]
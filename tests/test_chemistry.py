@@ -2,6 +2,7 @@ import pytest
 import tequila.quantumchemistry as qc
 import numpy
 import os, glob
+import openfermion
 
 import tequila.simulators.simulator_api
 from tequila.objective import ExpectationValue
@@ -200,3 +201,32 @@ def test_active_spaces(active):
     assert (tq.numpy.isclose(hf, mol.energies["hf"], atol=1.e-4))
     qubits = 2*sum([len(v) for v in active.values()])
     assert (H.n_qubits == qubits)
+
+
+def test_uccsd_gradient_deduplication():
+    # the gradient of the aaaa and bbbb excitations with respect to the amplitude and its partner
+    # lead to the same shifted expectation values, which are only compiled and evaluated once
+    geometry = [("H", (0.0, 0.0, 0.0)), ("H", (0.0, 0.0, 1.0)), ("H", (0.0, 0.0, 2.0)), ("H", (0.0, 0.0, 3.0))]
+    molecule = openfermion.hamiltonians.MolecularData(geometry=geometry, basis="sto-3g", multiplicity=1, charge=0)
+    molecule.n_orbitals = 4
+    mol = qc.QuantumChemistryBase.from_openfermion(molecule=molecule)
+    tIjAb = numpy.zeros(shape=[2, 2, 2, 2])
+    tIjAb[0, 1, 0, 1] = 0.1
+    tIjAb[0, 1, 1, 0] = 0.2
+    amplitudes = qc.qc_base.ClosedShellAmplitudes(tIjAb=tIjAb, tIA=numpy.zeros(shape=[2, 2]))
+    U = mol.make_uccsd_ansatz(trotter_steps=1, initial_amplitudes=amplitudes)
+    E = ExpectationValue(U=U, H=tq.paulis.Z(0) + tq.paulis.X(1) * tq.paulis.X(2))
+    variables = E.extract_variables()
+    assert len(variables) == 2
+
+    dE = [tq.grad(E, k) for k in variables]
+    O = dE[0] + dE[1]
+    expectationvalues = O.get_expectationvalues()
+    n_objects = len(set(id(x) for x in expectationvalues))
+    n_unique = O.count_expectationvalues(unique=True)
+    assert n_unique < n_objects
+
+    compiled = tq.compile(O, backend="numpy")
+    assert len(set(id(x) for x in compiled.get_expectationvalues())) == n_unique
+    values = {k: numpy.random.uniform(0.0, 2.0 * numpy.pi) for k in variables}
+    assert numpy.isclose(compiled(values), sum(simulate(x, variables=values, backend="numpy") for x in dE))
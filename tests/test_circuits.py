@@ -2,9 +2,14 @@ from tequila.circuit.gates import X, Y, Z, Rx, Ry, Rz, H, CNOT, QCircuit, Rotati
 from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
 from tequila.circuit._gates_impl import RotationGateImpl
 from tequila.objective.objective import Variable
-from tequila.simulators.simulator_api import simulate
-from tequila import assign_variable
-import numpy, sympy
+from tequila.simulators.simulator_api import simulate, INSTALLED_SIMULATORS
+from tequila import assign_variable, ExpectationValue
+from tequila.circuit.fusion import fuse_gates
+from tequila.circuit.peephole import peephole_optimize
+from tequila.circuit.compiler import Compiler
+from tequila.circuit.gates import ExpPauli, Trotterized, TrotterParameters
+from tequila.hamiltonian import QubitHamiltonian
+import numpy, sympy, pytest
 
 
 def test_conventions():
@@ -128,3 +133,110 @@ def test_circuit_from_moments():
     moms = c.moments
     c2 = QCircuit.from_moments(moms)
     assert c == c2
+
+
+def test_structural_hash():
+    a = Variable("a")
+    U1 = Rx(target=0, angle=a * 2.0 + 1.0) + CNOT(control=0, target=1) + Ry(target=2, angle="b")
+    U2 = Rx(target=0, angle=a * 2.0 + 1.0) + CNOT(control=0, target=1) + Ry(target=2, angle="b")
+    assert U1 == U2
+    assert hash(U1) == hash(U2)
+    assert len({U1, U2}) == 1
+    for g1, g2 in zip(U1.gates, U2.gates):
+        assert g1 == g2 and hash(g1) == hash(g2)
+
+    # the order of gates on different qubits does not matter
+    U3 = Ry(target=2, angle="b") + Rx(target=0, angle=a * 2.0 + 1.0) + CNOT(control=0, target=1)
+    assert U1 == U3 and hash(U1) == hash(U3)
+    assert U1 != Rx(target=0, angle=a * 2.0 + 1.0) + CNOT(control=0, target=1) + Ry(target=1, angle="b")
+    assert U1 != Rx(target=0, angle=a * 2.0 + 2.0) + CNOT(control=0, target=1) + Ry(target=2, angle="b")
+    assert Rx(target=0, angle=a).gates[0] != Ry(target=0, angle=a).gates[0]
+
+    # changing gates invalidates the cached keys
+    old = hash(U2)
+    U2.gates[2]._parameter = assign_variable("c")
+    assert hash(U2) != old
+    assert U1 != U2
+    U2 += X(3)
+    U1 += X(3)
+    U1.gates[2]._parameter = assign_variable("c")
+    assert U1 == U2 and hash(U1) == hash(U2)
+
+
+@pytest.mark.parametrize("max_qubits", [1, 2, 3])
+def test_gate_fusion(max_qubits):
+    U = H(0) + CNOT(0, 1) + Rz(target=1, angle=0.3) + X(2) + Z(2) + Ry(target=1, angle="a") + Phase(target=0, phi=0.2)
+    U += Rx(target=1, control=2, angle=0.7) + CNOT(1, 2) + ExpPauli(paulistring="X(0)Y(2)", angle=0.4) + Y(0) + H(2)
+    fused = fuse_gates(U, max_qubits=max_qubits)
+    assert len(fused.gates) < len(U.gates)
+    assert all(len(g.qubits) <= max_qubits for g in fused.gates if g.name == "Dense")
+    # the gates with variables are kept
+    assert fused.extract_variables() == U.extract_variables()
+    variables = {"a": 0.4}
+    for backend in ["numpy", "symbolic", "qulacs"]:
+        if backend not in INSTALLED_SIMULATORS:
+            continue
+        wfn = simulate(U, variables=variables, backend=backend)
+        # compiled phase gates can differ by a global phase
+        assert numpy.isclose(abs(wfn.inner(simulate(fused, variables=variables, backend=backend))), 1.0)
+    dense = [g for g in fused.gates if g.name == "Dense"]
+    assert numpy.allclose(dense[0].dagger().matrix.dot(dense[0].matrix), numpy.eye(len(dense[0].matrix)))
+
+
+def test_peephole_optimization():
+    # the basis changes and cnot ladders between the two exponentials cancel
+    P1 = "X(0)Y(1)Z(2)X(3)"
+    P2 = "X(0)Y(1)Z(2)Y(3)"
+    U = ExpPauli(paulistring=P1, angle="a") + ExpPauli(paulistring=P2, angle="b")
+    U += Rx(target=0, angle=0.2) + Rx(target=0, angle="c") + Rz(target=2, angle=0.5) + Rz(target=2, angle=-0.5)
+    U += H(1) + CNOT(0, 1) + Z(0) + CNOT(0, 1) + H(1)
+    compiled = Compiler(exponential_pauli=True)(U)
+    optimized = peephole_optimize(compiled)
+    assert len(optimized.gates) < len(compiled.gates) - 10
+    assert optimized.depth < compiled.depth
+    assert set(optimized.extract_variables()) == set(compiled.extract_variables())
+    variables = {"a": 0.3, "b": -0.7, "c": 1.1}
+    wfn = simulate(compiled, variables=variables, backend="numpy")
+    assert numpy.isclose(wfn.inner(simulate(optimized, variables=variables, backend="numpy")), 1.0)
+
+    # gates which do not commute are not moved
+    U = Rx(target=0, angle="a") + H(0) + Rx(target=0, angle="b") + CNOT(0, 1) + X(1) + CNOT(1, 0) + X(1)
+    assert len(peephole_optimize(U).gates) == len(U.gates)
+
+
+@pytest.mark.parametrize("backend", INSTALLED_SIMULATORS)
+def test_peephole_cancelled_qubit(backend):
+    # all gates on qubit 1 cancel, the optimized circuit keeps the register
+    U = Ry(target=0, angle="a") + H(1) + X(1) + X(1) + H(1) + Ry(target=2, angle="b") + CNOT(0, 2)
+    optimized = peephole_optimize(U)
+    assert len(optimized.gates) == 3
+    assert optimized.n_qubits == U.n_qubits
+    variables = {"a": 0.3, "b": -0.7}
+    reference = simulate(U, variables=variables, backend=backend, optimize_circuit=False)
+    for circuit in [U, optimized]:
+        wfn = simulate(circuit, variables=variables, backend=backend)
+        assert wfn.n_qubits == 3
+        assert numpy.isclose(abs(wfn.inner(reference)), 1.0, atol=1.e-4)
+    H_ = QubitHamiltonian.from_string("X(1) + Z(0)Z(2)")
+    E = simulate(ExpectationValue(U=U, H=H_), variables=variables, backend=backend)
+    assert numpy.isclose(E, reference.compute_expectationvalue(H_), atol=1.e-4)
+
+
+@pytest.mark.parametrize("ordering", ["lexicographic", "gray"])
+def test_trotterized_ordering(ordering):
+    # jordan-wigner transformed double excitation, the paulistrings commute
+    generator = QubitHamiltonian.from_string("0.125*X(0)X(1)Y(4)X(5) - 0.125*Y(0)Y(1)Y(4)X(5) + 0.125*Y(0)X(1)Y(4)Y(5)"
+                                             "+ 0.125*X(0)Y(1)Y(4)Y(5) - 0.125*Y(0)X(1)X(4)X(5) - 0.125*X(0)Y(1)X(4)X(5)"
+                                             "+ 0.125*X(0)X(1)X(4)Y(5) - 0.125*Y(0)Y(1)X(4)Y(5)")
+    U = X([0, 1])
+    U1 = U + Trotterized(generators=[generator], angles=["a"], steps=1)
+    U2 = U + Trotterized(generators=[generator], angles=["a"], steps=1,
+                         parameters=TrotterParameters(ordering=ordering))
+    compiler = Compiler(trotterized=True, exponential_pauli=True)
+    cnots1 = [g for g in peephole_optimize(compiler(U1)).gates if g.is_controlled()]
+    cnots2 = [g for g in peephole_optimize(compiler(U2)).gates if g.is_controlled()]
+    assert len(cnots2) < len(cnots1)
+    variables = {"a": 0.7}
+    wfn1 = simulate(U1, variables=variables, backend="numpy")
+    wfn2 = simulate(U2, variables=variables, backend="numpy")
+    assert numpy.isclose(abs(wfn1.inner(wfn2)), 1.0)
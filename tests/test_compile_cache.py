@@ -0,0 +1,82 @@
+from tequila.simulators.compile_cache import CompileCache, compile_cache
+from tequila.utils.structure import structural_key
+from tequila.circuit import gates
+from tequila.circuit.gradient import grad
+from tequila.hamiltonian import paulis
+from tequila.objective import ExpectationValue
+from tequila.objective.objective import Variable
+from tequila.simulators.simulator_api import simulate, compile
+
+import numpy
+import pytest
+
+
+def make_objective(angle=1.0):
+    a, b = Variable("a"), Variable("b")
+    U = gates.Ry(target=0, angle=a) + gates.Rx(target=1, control=0, angle=2.0 * b + angle)
+    U += gates.ExpPauli(paulistring="X(0)Y(1)", angle=a)
+    return ExpectationValue(U=U, H=paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(1))
+
+
+def test_structural_key():
+    E1 = make_objective().args[0]
+    E2 = make_objective().args[0]
+    assert E1 is not E2
+    assert structural_key(E1) == structural_key(E2)
+    assert hash(structural_key(E1)) == hash(structural_key(E2))
+    assert structural_key(E1) != structural_key(make_objective(angle=2.0).args[0])
+    assert structural_key(gates.Rx(target=0, angle="a")) != structural_key(gates.Rx(target=1, angle="a"))
+    assert structural_key(gates.Rx(target=0, angle="a")) != structural_key(gates.Ry(target=0, angle="a"))
+    assert structural_key(paulis.X(0)) != structural_key(paulis.X(0) + paulis.Z(1))
+
+
+@pytest.mark.parametrize("backend", ["numpy", "symbolic"])
+def test_compile_cache(backend):
+    compile_cache.clear()
+    variables = {"a": 0.3, "b": -0.7}
+    O1 = make_objective()
+    E = simulate(O1, variables=variables, backend=backend)
+    info = compile_cache.info()
+    assert info.misses == 1 and info.hits == 0
+
+    # rebuilding the same objective reuses the compiled expectation value
+    O2 = make_objective()
+    compiled1 = compile(O1, backend=backend)
+    compiled2 = compile(O2, backend=backend)
+    assert compiled1.args[0] is compiled2.args[0]
+    assert numpy.isclose(compiled2(variables), E)
+    info = compile_cache.info()
+    assert info.misses == 1 and info.hits == 2
+
+    # same for gradients which are constructed again
+    dO1 = [simulate(grad(O1, k), variables=variables, backend=backend) for k in ["a", "b"]]
+    misses = compile_cache.info().misses
+    dO2 = [simulate(grad(O2, k), variables=variables, backend=backend) for k in ["a", "b"]]
+    assert compile_cache.info().misses == misses
+    assert numpy.allclose(dO1, dO2)
+
+    O3 = make_objective(angle=2.0)
+    compiled3 = compile(O3, backend=backend)
+    assert compiled3.args[0] is not compiled1.args[0]
+    assert compile_cache.info().misses == misses + 1
+
+
+def test_compile_cache_limits():
+    cache = CompileCache(maxsize=2)
+    compiled = []
+    for angle in [1.0, 2.0, 3.0]:
+        E = make_objective(angle=angle).args[0]
+        compiled.append(cache.get(E=E, backend="numpy", noise_model=None,
+                                  compile_function=lambda: compile(make_objective(angle)).args[0]))
+    info = cache.info()
+    assert info.currsize == 2 and info.evictions == 1 and info.misses == 3
+    assert info.memory > 0
+
+    cache.resize(max_memory=1)
+    assert cache.info().currsize == 1
+
+    cache.resize(maxsize=0)
+    assert len(cache) == 0
+    E = make_objective().args[0]
+    cache.get(E=E, backend="numpy", noise_model=None, compile_function=lambda: compile(make_objective()).args[0])
+    assert len(cache) == 0
@@ -0,0 +1,98 @@
+import tequila as tq
+from tequila import TequilaException
+from tequila.simulators.executors import make_executor, SerialExecutor, ThreadExecutor, ProcessExecutor
+from tequila.simulators.simulator_api import INSTALLED_SIMULATORS
+
+import numpy
+import pytest
+
+backends = [x for x in ["numpy", "qulacs"] if x in INSTALLED_SIMULATORS]
+
+
+def make_objective():
+    a, b = tq.Variable("a"), tq.Variable("b")
+    U = tq.gates.Ry(target=0, angle=a) + tq.gates.CNOT(0, 1) + tq.gates.Rx(target=1, angle=b)
+    E1 = tq.ExpectationValue(U=U, H=tq.paulis.Z(0) + tq.paulis.X(1))
+    E2 = tq.ExpectationValue(U=U, H=tq.paulis.Y(1))
+    return E1 * E2 + 0.5 * E2 + a
+
+
+@pytest.mark.parametrize("backend", backends)
+@pytest.mark.parametrize("executor", ["serial", "threads", "processes"])
+def test_executors(backend, executor):
+    variables = {"a": 0.3, "b": -1.2}
+    O = make_objective()
+    reference = tq.simulate(O, variables=variables, backend=backend)
+    compiled = tq.compile(O, backend=backend, executor=executor)
+    assert compiled.executor is not None
+    assert numpy.isclose(compiled(variables), reference)
+
+    dO = [tq.compile(tq.grad(O, k), backend=backend, executor=compiled.executor) for k in ["a", "b"]]
+    values = compiled.executor.evaluate_objectives(dO, variables)
+    assert numpy.allclose(values, [tq.simulate(tq.grad(O, k), variables=variables, backend=backend) for k in
+                                   ["a", "b"]])
+    compiled.executor.shutdown()
+
+
+def test_shared_expectationvalues():
+    class CountingExecutor(SerialExecutor):
+        evaluated = 0
+
+        def evaluate(self, expectationvalues, variables, *args, **kwargs):
+            self.evaluated += len(expectationvalues)
+            return super().evaluate(expectationvalues, variables, *args, **kwargs)
+
+    executor = CountingExecutor()
+    O = make_objective()
+    compiled = tq.compile(O, backend="numpy", executor=executor)
+    variables = {"a": 0.3, "b": -1.2}
+    values = executor.evaluate_objectives([compiled, compiled, compiled], variables)
+    assert executor.evaluated == len(set(id(E) for E in compiled.get_expectationvalues()))
+    assert numpy.allclose(values, tq.simulate(O, variables=variables, backend="numpy"))
+
+
+def test_make_executor():
+    assert make_executor(None) is None
+    assert isinstance(make_executor("threads"), ThreadExecutor)
+    assert isinstance(make_executor("processes"), ProcessExecutor)
+    executor = SerialExecutor()
+    assert make_executor(executor) is executor
+    with pytest.raises(TequilaException):
+        make_executor("cluster")
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_shared_states(backend):
+    O = make_objective()
+    variables = {"a": 0.3, "b": -1.2}
+    reference = tq.simulate(O, variables=variables, backend=backend)
+    compiled = tq.compile(O, backend=backend)
+    expectationvalues = {id(E): E for E in compiled.get_expectationvalues()}.values()
+    assert len(expectationvalues) == 2
+    simulated = []
+    for E in expectationvalues:
+        E.cached_state = (lambda f: lambda *args, **kwargs: simulated.append(f(*args, **kwargs)) or simulated[-1])(
+            E.cached_state)
+    assert numpy.isclose(compiled(variables), reference)
+    # both expectation values got the same state object
+    assert len(simulated) == 2
+    assert simulated[0] is simulated[1]
+    for E in expectationvalues:
+        del E.cached_state
+
+
+def test_process_executor_sampling():
+    # workers and restarted pools draw different samples
+    # different circuits with the same distribution, so they are not deduplicated
+    E1 = tq.ExpectationValue(U=tq.gates.H(0) + tq.gates.H(1), H=tq.paulis.Z(0))
+    E2 = tq.ExpectationValue(U=tq.gates.H(0) + tq.gates.H(1) + tq.gates.Z(1), H=tq.paulis.Z(0))
+    executor = ProcessExecutor(max_workers=2)
+    compiled = [tq.compile(E, backend="numpy", executor=executor) for E in [E1, E2]]
+    values = []
+    for _ in range(4):
+        values.append(tuple(executor.evaluate_objectives(compiled, variables={}, samples=1000)))
+        executor.shutdown()
+    assert len(set(values)) > 1
+    assert any(v[0] != v[1] for v in values)
+    executor.clear()
+    assert len(executor._registry) == 0
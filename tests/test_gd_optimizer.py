@@ -72,3 +72,32 @@ def test_methods_qng(simulator, method):
                                          initial_values=initial_values, silent=False)
     assert(numpy.isclose(result.energy, -0.612, atol=2.e-2))
 
+
+
+@pytest.mark.parametrize("simulator, gradient", [(tq.simulators.simulator_api.pick_backend(), "shift"),
+                                                 ("numpy", "adjoint")])
+@pytest.mark.parametrize("method", ["adam", "basic"])
+def test_batched_gradient(simulator, gradient, method):
+    U = tq.gates.Ry(angle="a", target=0) + tq.gates.Rx(angle="b", target=1, control=0)
+    H = tq.paulis.Z(0) + tq.paulis.Z(1)
+    O = tq.ExpectationValue(U=U, H=H)
+    initial_values = {"a": 0.5, "b": 1.0}
+    result = tq.minimize(objective=O, method=method, lr=0.1, maxiter=5, initial_values=initial_values,
+                         backend=simulator, silent=True)
+    batched = tq.minimize(objective=O, method=method, lr=0.1, maxiter=5, initial_values=initial_values,
+                          backend=simulator, gradient=gradient, silent=True)
+    assert numpy.isclose(result.energy, batched.energy)
+    for k, v in result.angles.items():
+        assert numpy.isclose(v, batched.angles[k])
+
+
+@pytest.mark.parametrize("method", ["rmsprop", "rmsprop-nesterov"])
+def test_rmsprop_zero_gradient(method):
+    # a vanishing gradient (e.g. from shot noise) must not give NaN angles
+    optimizer = tq.optimizers.optimizer_gd.OptimizerGD()
+    step = optimizer.rms if method == "rmsprop" else optimizer.rms_nesterov
+    angles = {"a": 1.0, "b": 2.0}
+    new, moments, grads = step(lr=0.1, gradients=lambda v: numpy.zeros(2), v=dict(angles),
+                               moments=[numpy.zeros(2), numpy.zeros(2)], active_angles=dict(angles))
+    assert new == angles
+    assert numpy.all(numpy.isfinite(moments[0])) and numpy.all(numpy.isfinite(moments[1]))
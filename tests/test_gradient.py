@@ -6,6 +6,7 @@ from tequila.objective.objective import Variable
 from tequila.hamiltonian import paulis
 from tequila.simulators.simulator_api import simulate
 from tequila import simulators
+from tequila import TequilaException
 import numpy
 import pytest
 
@@ -449,3 +450,51 @@ def test_gradient_deep_H(simulator, power, controls):
     dE = simulate(dO, variables=variables, backend=simulator)
 
     assert (numpy.isclose(dE, numpy.pi * numpy.sin(angle(variables) * (numpy.pi)) / 2, atol=1.e-4))
+
+
+@pytest.mark.parametrize("simulator", simulators.simulator_api.INSTALLED_SIMULATORS.keys())
+@pytest.mark.parametrize("angles", numpy.random.uniform(0.0, 2.0 * numpy.pi, (1, 3)))
+def test_batched_gradient(simulator, angles):
+    a, b, c = Variable("a"), Variable("b"), Variable("c")
+    U = gates.Ry(target=0, angle=a) + gates.Rx(target=1, control=0, angle=b)
+    U += gates.Trotterized(angles=[c * a, 2.0], generators=[paulis.X(0) * paulis.Y(2), paulis.Z(1)], steps=1)
+    U += gates.ExpPauli(angle=b, paulistring="Y(1)Z(2)")
+    E1 = ExpectationValue(U=U, H=paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(2))
+    E2 = ExpectationValue(U=U, H=paulis.Z(1))
+    O = E1 * E2 + c * E1 - 2.0 * E2
+    variables = {a: angles[0], b: angles[1], c: angles[2]}
+
+    dO = simulate(grad(O, method="shift"), variables=variables, backend=simulator)
+    assert set(dO.keys()) == set(O.extract_variables())
+    for k, v in dO.items():
+        assert numpy.isclose(v, simulate(grad(O, k), variables=variables, backend=simulator), atol=1.e-4)
+
+    dE = simulate(grad(E1, variable=c, method="shift"), variables=variables, backend=simulator)
+    assert list(dE.keys()) == [c]
+    assert numpy.isclose(dE[c], simulate(grad(E1, c), variables=variables, backend=simulator), atol=1.e-4)
+
+
+@pytest.mark.parametrize("simulator", [s for s in ["numpy", "qulacs"] if s in simulators.simulator_api.INSTALLED_SIMULATORS])
+@pytest.mark.parametrize("angles", numpy.random.uniform(0.0, 2.0 * numpy.pi, (2, 3)))
+def test_adjoint_gradient(simulator, angles):
+    a, b, c = Variable("a"), Variable("b"), Variable("c")
+    U = gates.Ry(target=0, angle=a) + gates.Rx(target=1, control=0, angle=b) + gates.H(target=2)
+    U += gates.Trotterized(angles=[c * a, 2.0], generators=[paulis.X(0) * paulis.Y(2), paulis.Z(1)], steps=1)
+    U += gates.ExpPauli(angle=b, paulistring="Y(1)Z(2)") + gates.Rz(target=2, control=1, angle=c)
+    E1 = ExpectationValue(U=U, H=paulis.X(0) * paulis.Z(1) + 0.5 * paulis.Y(2) + paulis.Z(3))
+    E2 = ExpectationValue(U=U, H=paulis.Z(1) - paulis.X(0) * paulis.X(2))
+    O = E1 * E2 + c * E1 - 2.0 * E2
+    variables = {a: angles[0], b: angles[1], c: angles[2]}
+
+    dO = simulate(grad(O, method="adjoint"), variables=variables, backend=simulator)
+    assert set(dO.keys()) == set(O.extract_variables())
+    for k, v in dO.items():
+        assert numpy.isclose(v, simulate(grad(O, k), variables=variables, backend=simulator), atol=1.e-6)
+
+
+@pytest.mark.parametrize("simulator", [s for s in simulators.simulator_api.INSTALLED_SIMULATORS
+                                       if s not in ["numpy", "qulacs"]])
+def test_adjoint_gradient_unsupported(simulator):
+    E = ExpectationValue(U=gates.Ry(target=0, angle="a"), H=paulis.Z(0))
+    with pytest.raises(TequilaException):
+        simulate(grad(E, method="adjoint"), variables={"a": 1.0}, backend=simulator)
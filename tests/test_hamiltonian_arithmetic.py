@@ -266,3 +266,150 @@ def test_matrix_form():
     Hm3p = kron(Hm, paulis.Z(0).to_matrix())
     assert allclose(Hm3 , Hm3p)
 
+
+
+def test_qubitwise_commuting_groups():
+    from tequila.hamiltonian.grouping import group_qubitwise_commuting
+    H = paulis.X(0) * paulis.X(1) + 0.5 * paulis.Z(0) + paulis.Y(1) * paulis.Z(2) + paulis.Z(0) * paulis.Z(2)
+    H += paulis.X(0) + paulis.Z(1) + 2.0 * paulis.Y(1)
+    groups = group_qubitwise_commuting(H)
+    assert len(groups) == 3
+    assert sorted(str(ps) for g in groups for ps in g.paulistrings) == sorted(str(ps) for ps in H.paulistrings)
+    for group in groups:
+        for ps in group.paulistrings:
+            for q, p in ps.items():
+                assert group.basis[q] == p.upper()
+
+    for repeat in range(5):
+        H = sum(make_random_pauliword(complex=False) for i in range(20))
+        groups = group_qubitwise_commuting(H)
+        assert sum(len(g) for g in groups) == len(H)
+        reference = QubitHamiltonian.from_paulistrings([ps for g in groups for ps in g.paulistrings])
+        assert allclose(reference.to_matrix(), H.to_matrix())
+
+
+@pytest.mark.parametrize("max_qubit", [6, 70])
+def test_binary_hamiltonian(max_qubit):
+    from tequila.hamiltonian import BinaryHamiltonian
+
+    def random_hamiltonian(n_terms):
+        H = QubitHamiltonian.zero()
+        for i in range(n_terms):
+            term = QubitHamiltonian.unit() * (random.uniform(-1, 1) + 1.0j * random.uniform(-1, 1))
+            for q in random.choice(range(max_qubit), 3, replace=False):
+                term *= [paulis.X, paulis.Y, paulis.Z][random.randint(0, 3)](int(q))
+            H += term
+        return H + 0.5
+
+    H1 = random_hamiltonian(10)
+    H2 = random_hamiltonian(8)
+    B1 = BinaryHamiltonian.from_qubit_hamiltonian(H1)
+    B2 = BinaryHamiltonian.from_qubit_hamiltonian(H2)
+    assert len(B1) == len(H1)
+    assert B1.n_qubits == H1.n_qubits
+    assert B1.qubits == H1.qubits
+    assert B1.to_qubit_hamiltonian() == H1
+    assert (B1 + B2).to_qubit_hamiltonian() == H1 + H2
+    assert (B1 - 2.0 * B2 + 1.0).to_qubit_hamiltonian() == H1 - 2.0 * H2 + 1.0
+    assert (B1 * B2).to_qubit_hamiltonian() == H1 * H2
+    assert (B2 * B1).to_qubit_hamiltonian() == H2 * H1
+    assert B1.commutator(B2).to_qubit_hamiltonian() == H1 * H2 - H2 * H1
+    assert B1.dagger().to_qubit_hamiltonian() == H1.dagger()
+    assert BinaryHamiltonian.from_paulistrings(H1.paulistrings) == B1
+    assert (B1 * H2).to_qubit_hamiltonian() == H1 * H2
+    assert (H2 + B1) == H2 + H1
+    assert not B1.is_hermitian()
+    assert (B1 + B1.dagger()).is_hermitian()
+
+    # products of single paulis follow the pauli algebra
+    X, Y, Z = [BinaryHamiltonian.from_qubit_hamiltonian(P(max_qubit - 1)) for P in [paulis.X, paulis.Y, paulis.Z]]
+    assert X * Y == 1.0j * Z
+    assert Y * X == -1.0j * Z
+    assert X * X == BinaryHamiltonian.unit(max_qubit)
+    assert X.commutator(Y) == 2.0j * Z
+    assert len(X.commutator(X)) == 0
+
+
+@pytest.mark.parametrize("n_qubits", [1, 3, 5])
+def test_sparse_matrix_form(n_qubits):
+    import scipy.sparse.linalg
+    H = 0.3 + paulis.Y(0)
+    for i in range(8):
+        term = QubitHamiltonian.unit() * (random.uniform(-1, 1) + 1.0j * random.uniform(-1, 1))
+        for q in random.choice(range(n_qubits), min(2, n_qubits), replace=False):
+            term *= [paulis.X, paulis.Y, paulis.Z][random.randint(0, 3)](int(q))
+        H += term
+    dense = H.to_matrix()
+    sparse = H.to_sparse()
+    assert sparse.shape == dense.shape
+    assert allclose(sparse.toarray(), dense)
+    # one entry per row and x mask
+    assert sparse.nnz <= len(H) * 2 ** H.n_qubits
+
+    vector = random.uniform(-1, 1, 2 ** H.n_qubits) + 1.0j * random.uniform(-1, 1, 2 ** H.n_qubits)
+    operator = H.to_linear_operator()
+    assert allclose(operator.matvec(vector), dense.dot(vector))
+    assert allclose(operator.rmatvec(vector), dense.conj().T.dot(vector))
+
+    # larger register than the hamiltonian
+    assert allclose(H.to_sparse(n_qubits=H.n_qubits + 1).toarray(), kron(dense, eye(2)))
+
+    if H.n_qubits > 2:
+        hermitian = H + H.dagger()
+        energy = scipy.sparse.linalg.eigsh(hermitian.to_sparse(), k=1, which="SA")[0][0]
+        reference = numpy.linalg.eigvalsh(hermitian.to_matrix())[0]
+        assert numpy.isclose(energy, reference)
+        energy = scipy.sparse.linalg.eigsh(hermitian.to_linear_operator(), k=1, which="SA")[0][0]
+        assert numpy.isclose(energy, reference)
+
+
+@pytest.mark.parametrize("n_qubits", [1, 2, 3, 4])
+def test_ketbra_pauli_form(n_qubits):
+    def random_wfn(sparse):
+        array = random.uniform(-1, 1, 2 ** n_qubits) + 1.0j * random.uniform(-1, 1, 2 ** n_qubits)
+        if sparse:
+            array[random.choice(range(2 ** n_qubits), 2 ** n_qubits // 2, replace=False)] = 0.0
+        return QubitWaveFunction.from_array(arr=array, threshold=0.0).normalize()
+
+    ket = random_wfn(sparse=False)
+    bra = random_wfn(sparse=True)
+    reference = QubitHamiltonian.zero()
+    for k1, v1 in bra.items():
+        for k2, v2 in ket.items():
+            reference += v1.conjugate() * v2 * paulis.decompose_transfer_operator(bra=k1, ket=k2)
+    assert paulis.KetBra(ket=ket, bra=bra, threshold=0.0) == reference
+    assert paulis.KetBra(ket=ket, bra=bra, hermitian=True, threshold=0.0) == reference.split()[0]
+    array = ket.to_dense().to_array()
+    assert allclose(paulis.Projector(wfn=ket).to_matrix(), numpy.outer(array, array.conj()))
+
+    lazy = paulis.KetBra(ket=ket, bra=bra, threshold=0.0, lazy=True)
+    assert lazy._qubit_operator is None
+    assert lazy.qubits == list(range(n_qubits))
+    assert lazy == reference
+    lazy += 1.0
+    assert lazy == reference + 1.0
+
+
+@pytest.mark.parametrize("backend", ["numpy", "qulacs"])
+def test_lazy_projector_expectation_values(backend):
+    import tequila as tq
+    if backend not in tq.INSTALLED_SIMULATORS:
+        pytest.skip("{} not installed".format(backend))
+    wfn = QubitWaveFunction.from_string("1.0*|010> + 0.5j*|111> - 0.3*|001>").normalize()
+    other = QubitWaveFunction.from_string("1.0*|011> + 1.0*|110>").normalize()
+    U = tq.gates.Ry(angle="a", target=0) + tq.gates.CNOT(0, 1) + tq.gates.Rx(angle="b", target=2)
+    U += tq.gates.H(3) + tq.gates.Rz(angle="c", target=3)
+    variables = {"a": 0.4, "b": -1.3, "c": 0.7}
+    # circuits on more and on less qubits than the operators
+    for circuit in [U, U + tq.gates.Ry(angle="b", target=5), tq.gates.Ry(angle="a", target=1) + tq.gates.X(2)]:
+        for lazy, dense in [(paulis.Projector(wfn=wfn, lazy=True), paulis.Projector(wfn=wfn)),
+                            (paulis.KetBra(ket=wfn, bra=other, hermitian=True, lazy=True),
+                             paulis.KetBra(ket=wfn, bra=other, hermitian=True))]:
+            E = tq.ExpectationValue(H=lazy, U=circuit)
+            reference = tq.simulate(tq.ExpectationValue(H=dense, U=circuit), variables=variables, backend=backend)
+            assert numpy.isclose(tq.simulate(E, variables=variables, backend=backend), reference)
+            assert lazy._qubit_operator is None
+            dE = tq.grad(E, "a")
+            reference = tq.simulate(tq.grad(tq.ExpectationValue(H=dense, U=circuit), "a"), variables=variables,
+                                    backend=backend)
+            assert numpy.isclose(tq.simulate(dE, variables=variables, backend=backend), reference)
@@ -8,7 +8,7 @@ from tequila.circuit.noise import BitFlip,PhaseDamp,PhaseFlip,AmplitudeDamp,Phas
 import numpy
 import pytest
 
-samplers = [k for k in tequila.INSTALLED_SAMPLERS.keys() if k not in ['qulacs'] ]
+samplers = [k for k in tequila.INSTALLED_SAMPLERS.keys() if k not in ['qulacs', 'numpy'] ]
 
 @pytest.mark.dependencies
 def test_dependencies():
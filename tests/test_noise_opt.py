@@ -6,7 +6,7 @@ import numpy
 import pytest
 import tequila as tq
 
-samplers = [k for k in tq.INSTALLED_SAMPLERS.keys() if k not in ['qulacs'] ]
+samplers = [k for k in tq.INSTALLED_SAMPLERS.keys() if k not in ['qulacs', 'numpy'] ]
 
 @pytest.mark.dependencies
 def test_dependencies():
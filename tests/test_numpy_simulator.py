@@ -0,0 +1,85 @@
+from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+from tequila.circuit import gates
+from tequila.hamiltonian import paulis
+from tequila.objective import ExpectationValue
+from tequila.simulators.simulator_api import simulate
+
+import numpy
+import pytest
+
+
+@pytest.mark.parametrize("paulis", [(gates.X, paulis.X), (gates.Y, paulis.Y), (gates.Z, paulis.Z)])
+@pytest.mark.parametrize("qubit", [0, 1, 2])
+@pytest.mark.parametrize("init", [0, 1])
+def test_pauli_gates(paulis, qubit, init):
+    iwfn = QubitWaveFunction.from_int(i=init, n_qubits=qubit + 1)
+    wfn = simulate(paulis[0](qubit), initial_state=init, backend="numpy")
+    iwfn = iwfn.apply_qubitoperator(paulis[1](qubit))
+    assert (iwfn == wfn)
+
+
+@pytest.mark.parametrize("rot", [(gates.Rx, paulis.X), (gates.Ry, paulis.Y), (gates.Rz, paulis.Z)])
+@pytest.mark.parametrize("angle", numpy.random.uniform(0.0, 2 * numpy.pi, 3))
+@pytest.mark.parametrize("qubit", [0, 2])
+@pytest.mark.parametrize("init", [0, 1])
+def test_rotations(rot, qubit, angle, init):
+    pauli = rot[1](qubit)
+    gate = rot[0](target=qubit, angle=angle)
+    iwfn = QubitWaveFunction.from_int(i=init, n_qubits=qubit + 1)
+    wfn = simulate(gate, initial_state=init, backend="numpy")
+    test = numpy.cos(-angle / 2.0) * iwfn + 1.0j * numpy.sin(-angle / 2.0) * iwfn.apply_qubitoperator(pauli)
+    assert (wfn == test)
+
+
+@pytest.mark.parametrize("target", [0, 2])
+@pytest.mark.parametrize("control", [1, 3])
+@pytest.mark.parametrize("gate", [gates.X, gates.Y, gates.Z, gates.H])
+def test_controls(target, control, gate):
+    c0 = gates.X(target=control) + gate(target=target, control=None)
+    c1 = gates.X(target=control) + gate(target=target, control=control)
+    wfn0 = simulate(c0, initial_state=0, backend="numpy")
+    wfn1 = simulate(c1, initial_state=0, backend="numpy")
+    assert (wfn0 == wfn1)
+
+    c1 = gate(target=target, control=control)
+    wfn0 = QubitWaveFunction.from_int(0, n_qubits=max(target, control) + 1)
+    wfn1 = simulate(c1, initial_state=0, backend="numpy")
+    assert (wfn0 == wfn1)
+
+
+@pytest.mark.parametrize("angle", numpy.random.uniform(0.0, 2 * numpy.pi, 3))
+@pytest.mark.parametrize("ps", ["X(0)Y(3)", "Y(2)X(4)Z(1)", "Z(0)Z(1)"])
+def test_exponential_pauli(angle, ps):
+    U = gates.H(target=0) + gates.X(target=1, control=0) + gates.ExpPauli(angle=angle, paulistring=ps)
+    wfn1 = simulate(U, backend="numpy")
+    wfn2 = simulate(U, backend="symbolic")
+    assert (numpy.isclose(numpy.abs(wfn1.inner(wfn2)), 1.0, atol=1.e-6))
+
+
+@pytest.mark.parametrize("angle", numpy.random.uniform(0.0, 2 * numpy.pi, 3))
+def test_expectationvalue(angle):
+    U = gates.Ry(target=0, angle="a") + gates.X(target=2, control=0) + gates.Rx(target=1, angle="b", control=2)
+    H = paulis.X(0) * paulis.Z(2) + 0.5 * paulis.Y(1) - 0.25 * paulis.Z(0) * paulis.Z(1)
+    variables = {"a": angle, "b": -2.0 * angle}
+    E = simulate(ExpectationValue(U=U, H=H), variables=variables, backend="numpy")
+    wfn = simulate(U, variables=variables, backend="numpy")
+    assert (numpy.isclose(E, wfn.compute_expectationvalue(operator=H), atol=1.e-6))
+
+    # qubits which are not touched by the circuit are in state |0>
+    E2 = simulate(ExpectationValue(U=U, H=H + paulis.X(4) + paulis.Z(5)), variables=variables, backend="numpy")
+    assert (numpy.isclose(E2, E + 1.0, atol=1.e-6))
+
+
+def test_sampling():
+    U = gates.X(target=0) + gates.H(target=2)
+    counts = simulate(U, samples=1000, backend="numpy")
+    assert counts.storage == "sparse"
+    assert (sum(counts.values()) == 1000)
+    assert (set(k.integer for k in counts.keys()) <= {2, 3})
+    # only the measured qubits are part of the keys
+    counts = simulate(U + gates.Measurement(target=[0, 1]), samples=1000, backend="numpy")
+    assert counts.storage == "sparse"
+    assert counts.n_qubits == 2
+    assert dict((k.integer, v) for k, v in counts.items()) == {2: 1000}
+    E = simulate(ExpectationValue(U=U, H=paulis.Z(0) + paulis.X(2)), samples=100, backend="numpy")
+    assert (numpy.isclose(E, 0.0, atol=1.e-6))
@@ -595,3 +595,29 @@ def test_really_awfull_thing(simulator, value1=(numpy.random.randint(0, 1000) /
     assert np.isclose(en1, an1, atol=1.e-4)
     assert np.isclose(deval, an2 * (uen + den), atol=1.e-4)
     assert np.isclose(doval, dtrue, atol=1.e-4)
+
+
+@pytest.mark.parametrize("simulator", tequila.simulators.simulator_api.INSTALLED_SIMULATORS.keys())
+def test_batch(simulator):
+    a, b = Variable("a"), Variable("b")
+    U = gates.Ry(target=0, angle=a) + gates.Rx(target=1, control=0, angle=2.0 * b)
+    U += gates.ExpPauli(paulistring="X(0)Y(1)", angle=a * b) + gates.Rz(target=2, angle=-a) + gates.X(target=2, control=1)
+    E1 = ExpectationValue(U=U, H=paulis.X(0) * paulis.Z(1) + paulis.Y(2))
+    E2 = ExpectationValue(U=U, H=paulis.Z(2))
+    O = E1 * E1 + E2 - a
+    points = [{a: numpy.random.uniform(0.0, 2.0 * numpy.pi), b: numpy.random.uniform(0.0, 2.0 * numpy.pi)} for _ in
+              range(4)]
+    reference = [simulate(O, variables=p, backend="symbolic") for p in points]
+    values = simulate(O, variables=points, backend=simulator)
+    assert isinstance(values, numpy.ndarray) and values.shape == (4,)
+    assert numpy.allclose(values, reference, atol=1.e-4)
+
+    compiled = tq.compile(O, backend=simulator)
+    assert numpy.allclose(compiled.batch(points), reference, atol=1.e-4)
+    # single evaluations are not affected by batches
+    assert numpy.isclose(compiled(points[1]), reference[1], atol=1.e-4)
+
+    wavefunctions = simulate(U, variables=points[:2], backend=simulator)
+    assert len(wavefunctions) == 2
+    assert numpy.isclose(abs(wavefunctions[1].inner(simulate(U, variables=points[1], backend=simulator))), 1.0,
+                         atol=1.e-4)
@@ -85,7 +85,7 @@ def test_gradient_free_methods(simulator, method):
 
 @pytest.mark.parametrize("simulator", [tequila.simulators.simulator_api.pick_backend("random"), tequila.simulators.simulator_api.pick_backend()])
 @pytest.mark.parametrize("method", tq.optimizer_scipy.OptimizerSciPy.gradient_based_methods)
-@pytest.mark.parametrize("use_gradient", [None, '2-point'])
+@pytest.mark.parametrize("use_gradient", [None, '2-point', 'shift'])
 def test_gradient_based_methods(simulator, method, use_gradient):
 
     wfn = tq.QubitWaveFunction.from_string(string="1.0*|00> + 1.0*|11>")
@@ -156,3 +156,15 @@ def test_hessian_based_methods(simulator, method, use_hessian):
     result = tq.optimizer_scipy.minimize(objective=-E,backend=simulator, hessian=use_hessian, method=method, tol=1.e-4,
                                          method_options=method_options, initial_values=initial_values, silent=True)
     assert (numpy.isclose(result.energy, -1.0, atol=1.e-1))
+
+
+@pytest.mark.parametrize("simulator", [s for s in ["numpy", "qulacs"] if s in tq.simulators.simulator_api.INSTALLED_SIMULATORS])
+@pytest.mark.parametrize("method", ["BFGS", "L-BFGS-B"])
+def test_adjoint_gradient(simulator, method):
+    U = tq.gates.Ry(angle="a", target=0) + tq.gates.Rx(angle="b", target=1, control=0)
+    H = tq.paulis.Z(0) + tq.paulis.X(1)
+    E = tq.ExpectationValue(H=H, U=U)
+    initial_values = {"a": 0.5, "b": 1.0}
+    result = tq.minimize(objective=E, method=method, initial_values=initial_values, backend=simulator,
+                         gradient="adjoint", silent=True)
+    assert numpy.isclose(result.energy, -1.0, atol=1.e-3)
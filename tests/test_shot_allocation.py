@@ -0,0 +1,86 @@
+import tequila as tq
+from tequila import TequilaException
+from tequila.hamiltonian.grouping import group_qubitwise_commuting
+from tequila.simulators.shot_allocation import make_shot_allocation, ShotAllocation, UniformAllocation, ProportionalAllocation, \
+    VarianceAllocation
+from tequila.simulators.simulator_api import INSTALLED_SAMPLERS
+
+import numpy
+import pytest
+
+
+def make_objective():
+    a = tq.Variable("a")
+    U = tq.gates.Ry(target=0, angle=a) + tq.gates.CNOT(0, 1) + tq.gates.Ry(target=2, angle=0.3) + tq.gates.CNOT(1, 2)
+    H = 2.0 * tq.paulis.X(0) * tq.paulis.X(1) + 0.5 * tq.paulis.Z(0) + 0.1 * tq.paulis.Y(1) * tq.paulis.Z(2)
+    H += tq.paulis.Z(0) * tq.paulis.Z(2) + tq.paulis.X(5) + 0.5 * tq.paulis.Z(7)
+    return tq.ExpectationValue(U=U, H=H)
+
+
+def test_allocate():
+    H = 4.0 * tq.paulis.X(0) + 1.0 * tq.paulis.Z(0) + 0.01 * tq.paulis.Y(0)
+    groups = group_qubitwise_commuting(H)
+    assert UniformAllocation().allocate(samples=10, groups=groups) == [4, 3, 3]
+    shots = ProportionalAllocation().allocate(samples=1003, groups=groups)
+    assert sum(shots) == 1003
+    assert shots == [799, 201, 3]
+
+    allocation = VarianceAllocation(regularization=0.0)
+    assert allocation.allocate(samples=1003, groups=groups) == shots
+    allocation.update(groups=groups, variances=[1.0, 4.0, 0.0])
+    assert allocation.allocate(samples=1003, groups=groups) == [334, 668, 1]
+
+    with pytest.raises(TequilaException):
+        UniformAllocation().allocate(samples=2, groups=groups)
+    with pytest.raises(TequilaException):
+        make_shot_allocation("optimal")
+    assert isinstance(make_shot_allocation("variance"), VarianceAllocation)
+    with pytest.raises(TequilaException):
+        ShotAllocation().allocate(samples=10, groups=groups)
+
+
+@pytest.mark.parametrize("simulator", INSTALLED_SAMPLERS.keys())
+@pytest.mark.parametrize("shot_allocation", [None, "uniform", "proportional", "variance"])
+def test_sample_with_error(simulator, shot_allocation):
+    variables = {"a": 0.7}
+    O = make_objective()
+    reference = tq.simulate(O, variables=variables, backend="symbolic")
+    compiled = tq.compile(O, backend=simulator, shot_allocation=shot_allocation)
+    value, error = compiled.sample_with_error(variables=variables, samples=4000)
+    assert 0.0 < error < 0.1
+    assert numpy.isclose(value, reference, atol=5.0 * error)
+    assert numpy.isclose(compiled(variables=variables, samples=4000), reference, atol=5.0 * error)
+
+    # errors are propagated through the transformation
+    value, error2 = tq.compile(2.0 * O + 1.0, backend=simulator, shot_allocation=shot_allocation).sample_with_error(
+        variables=variables, samples=4000)
+    assert numpy.isclose(value, 2.0 * reference + 1.0, atol=10.0 * error)
+    assert numpy.isclose(error2, 2.0 * error, rtol=0.5)
+
+
+@pytest.mark.parametrize("simulator", INSTALLED_SAMPLERS.keys())
+@pytest.mark.parametrize("shot_allocation", [None, "variance"])
+def test_streaming(simulator, shot_allocation):
+    variables = {"a": 0.7}
+    O = make_objective()
+    reference = tq.simulate(O, variables=variables, backend="symbolic")
+    E = tq.compile(O, backend=simulator).get_expectationvalues()[0]
+    variables = {tq.Variable("a"): 0.7}
+
+    statistics = E.sample_statistics(variables=variables, samples=10 ** 6, target_error=0.05, chunk=200,
+                                     shot_allocation=shot_allocation)
+    assert numpy.sqrt(numpy.sum(statistics.variances)) <= 0.05
+    assert 0 < statistics.samples[0] < 10 ** 5
+    assert numpy.isclose(statistics.estimates[0], reference, atol=0.25)
+
+    # without early stopping all samples are used
+    statistics = E.sample_statistics(variables=variables, samples=1000, chunk=200, shot_allocation=shot_allocation)
+    n_groups = len(E.measurement_groups[0][1]) if shot_allocation is None else 1
+    assert statistics.samples[0] == 1000 * n_groups
+
+    statistics = E.sample_statistics(variables=variables, samples=1000, time_budget=0.0, chunk=200,
+                                     shot_allocation=shot_allocation)
+    assert statistics.samples[0] == 200 * n_groups
+
+    value = tq.simulate(O, variables={"a": 0.7}, samples=10 ** 6, backend=simulator, target_error=0.05)
+    assert numpy.isclose(value, reference, atol=0.25)
@@ -264,3 +264,78 @@ def test_initial_state_from_integer(simulator, initial_state):
     wfn = tq.simulate(U, initial_state=initial_state, backend=simulator)
     assert (initial_state in wfn)
     assert (numpy.isclose(wfn[initial_state], 1.0))
+
+
+@pytest.mark.parametrize("simulator", tequila.simulators.simulator_api.INSTALLED_SIMULATORS.keys())
+@pytest.mark.parametrize("angle", numpy.random.uniform(0.0, 2.0 * numpy.pi, 2))
+def test_expectationvalue_passive_qubits(simulator, angle):
+    # hamiltonian acts on qubits which are not touched by the circuit
+    U = tq.gates.Ry(target=0, angle=angle) + tq.gates.X(target=2, control=0) + tq.gates.H(target=1)
+    H = tq.paulis.X(0) * tq.paulis.Z(2) + 0.5 * tq.paulis.Y(1) * tq.paulis.Y(0) - 0.25 * tq.paulis.Z(1) * tq.paulis.Z(3)
+    H += tq.paulis.X(1) * tq.paulis.X(3) + 2.0 * tq.paulis.I()
+    E = tq.simulate(tq.ExpectationValue(U=U, H=H), backend=simulator)
+    U += tq.gates.Rz(target=3, angle=0.0)
+    wfn = tq.simulate(U, backend="qulacs" if "qulacs" in tq.INSTALLED_SIMULATORS else simulator)
+    state = numpy.zeros(2 ** 4, dtype=complex)
+    for k, v in wfn.items():
+        state[k.integer] = v
+    reference = numpy.vdot(state, H.to_matrix().dot(state)).real
+    assert (numpy.isclose(E, reference, atol=1.e-4))
+
+
+def test_parameter_slots():
+    from tequila.simulators.simulator_base import ParameterSlots
+    a, b = tq.Variable("a"), tq.Variable("b")
+    expressions = [a, -a, 2.0 * b + 1.0, -a, 2.0 * a + 1.0, b, a.apply(lambda v: v if v > 0.0 else 0.0), a * b]
+    slots = ParameterSlots()
+    for k, e in enumerate(expressions):
+        assert slots.add(expression=e, handle=k) == k
+    assert len(slots) == len(expressions)
+    assert slots.handles == list(range(len(expressions)))
+    # -a is only evaluated once, a and b are evaluated together, 2a+1 and 2b+1 are evaluated together
+    assert len(slots.make_batches()) == 5
+    for variables in [{a: 0.5, b: -1.2}, {a: -0.3, b: 2.0}]:
+        values = slots(variables)
+        assert numpy.allclose(values, [e(variables) for e in expressions])
+
+
+@pytest.mark.parametrize("simulator", tequila.simulators.simulator_api.INSTALLED_SIMULATORS.keys())
+def test_parameter_updates(simulator):
+    a, b = tq.Variable("a"), tq.Variable("b")
+    U = tq.gates.Ry(target=0, angle=a) + tq.gates.Rx(target=1, angle=-a) + tq.gates.X(target=1, control=0)
+    U += tq.gates.ExpPauli(paulistring="X(0)Y(1)", angle=2.0 * b + 1.0) + tq.gates.Rz(target=1, angle=(a * b) ** 2)
+    U += tq.gates.Ry(target=1, angle=0.3)
+    E = tq.ExpectationValue(U=U, H=tq.paulis.X(0) * tq.paulis.Z(1) + tq.paulis.Y(1))
+    compiled = tq.compile(E, backend=simulator)
+    for variables in [{a: 0.5, b: -1.2}, {a: -0.3, b: 2.0}, {a: 1.7, b: 0.1}]:
+        reference = tq.simulate(E, variables=variables, backend="symbolic")
+        assert numpy.isclose(compiled(variables), reference, atol=1.e-4)
+
+
+def test_bit_parity():
+    from tequila.simulators.simulator_base import bit_parity
+    values = numpy.random.randint(0, 2 ** 40, 100, dtype=numpy.int64)
+    for mask in [0, 1, 5, 2 ** 39 + 3, 2 ** 40 - 1]:
+        reference = [bin(int(v) & mask).count("1") % 2 for v in values]
+        assert numpy.array_equal(bit_parity(values, mask), reference)
+
+
+@pytest.mark.parametrize("simulator", tequila.simulators.simulator_api.INSTALLED_SAMPLERS.keys())
+def test_sampled_expectationvalue(simulator):
+    U = tq.gates.Ry(target=0, angle=0.7) + tq.gates.CNOT(0, 1) + tq.gates.Ry(target=2, angle=0.3) + tq.gates.CNOT(1, 2)
+    H = tq.paulis.X(0) * tq.paulis.X(1) + 0.5 * tq.paulis.Z(0) + tq.paulis.Y(1) * tq.paulis.Z(2)
+    H += tq.paulis.Z(0) * tq.paulis.Z(2) + tq.paulis.X(5) + 2.0 * tq.paulis.Z(7)
+    E = tq.ExpectationValue(U=U, H=H)
+    reference = tq.simulate(E, backend="symbolic")
+    sampled = tq.simulate(E, backend=simulator, samples=10000)
+    # 4 measured terms with |coeff| <= 1, standard deviation below 0.02
+    assert numpy.isclose(sampled, reference, atol=1.e-1)
+
+
+@pytest.mark.parametrize("simulator", tequila.simulators.simulator_api.INSTALLED_SAMPLERS.keys())
+def test_shot_measurement_subset(simulator):
+    U = tq.gates.H(target=0) + tq.gates.CNOT(control=0, target=1) + tq.gates.X(target=3)
+    U += tq.gates.Measurement(target=[0, 3])
+    counts = tq.simulate(U, samples=1000, backend=simulator)
+    assert set(k.binary for k, v in counts.items() if v > 0) <= {"01", "11"}
+    assert sum(counts.values()) == 1000
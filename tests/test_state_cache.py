@@ -0,0 +1,78 @@
+import tequila as tq
+from tequila.simulators.simulator_api import INSTALLED_SIMULATORS
+from tequila.utils.state_cache import PrefixStateCache, shared_states, active_prefix_cache
+
+import numpy
+import pytest
+
+backends = [x for x in ["numpy", "qulacs"] if x in INSTALLED_SIMULATORS]
+
+
+def test_prefix_trie():
+    applied = []
+
+    def apply(state, start, stop):
+        applied.append(stop - start)
+        return state + list(keys[start:stop])
+
+    cache = PrefixStateCache()
+    for keys, gates in [("abcdef", 6), ("abcdeg", 6), ("abcxyz", 6), ("abcxyw", 3), ("abcxyw", 1)]:
+        keys = list(keys)
+        applied.clear()
+        assert cache.simulate(root=0, keys=keys, initialize=list, apply=apply, nbytes=len) == keys
+        assert sum(applied) == gates
+    # different roots share nothing
+    applied.clear()
+    cache.simulate(root=1, keys=list("abcdef"), initialize=list, apply=apply, nbytes=len)
+    assert sum(applied) == 6
+
+    # least recently used states are evicted
+    cache = PrefixStateCache(max_memory=5)
+    for keys in ["abcdef", "abcdeg", "abx", "aby"]:
+        cache.simulate(root=0, keys=list(keys), initialize=list, apply=apply, nbytes=len)
+    assert cache.memory == 2
+    applied.clear()
+    cache.simulate(root=0, keys=list("abcdez"), initialize=list, apply=apply, nbytes=len)
+    assert sum(applied) == 4
+    assert cache.memory == 5
+
+
+@pytest.mark.parametrize("backend", backends)
+@pytest.mark.parametrize("max_memory", [None, 0])
+def test_shared_prefixes(backend, max_memory):
+    n = 4
+    U = tq.QCircuit()
+    for layer in range(2):
+        for q in range(n):
+            U += tq.gates.Ry(target=q, angle=(layer, q))
+        for q in range(n - 1):
+            U += tq.gates.CNOT(q, q + 1)
+    E = tq.ExpectationValue(U=U, H=tq.paulis.Z(0) * tq.paulis.Z(n - 1) + tq.paulis.X(2))
+    variables = {k: numpy.random.uniform(0.0, 2.0 * numpy.pi) for k in U.extract_variables()}
+    dE = [tq.compile(tq.grad(E, k), backend=backend) for k in variables]
+    reference = [tq.simulate(tq.grad(E, k), variables=variables, backend="symbolic") for k in variables]
+    with shared_states(max_memory=max_memory):
+        assert numpy.allclose([d(variables) for d in dE], reference)
+        memory = active_prefix_cache().memory
+    assert (memory > 0) == (max_memory is None)
+    assert active_prefix_cache() is None
+    gradient = tq.compile(E, backend=backend).get_expectationvalues()[0].gradient(variables, method="shift")
+    assert numpy.allclose([gradient[k] for k in variables], reference)
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_shared_prefixes_pauli_rotations(backend):
+    # the rotations differ only in their paulis, they must not share intermediate states
+    a = tq.Variable("a")
+    H = tq.paulis.Z(0) + tq.paulis.X(1) + tq.paulis.Y(0) * tq.paulis.Y(1)
+    U0 = tq.gates.H(0) + tq.gates.H(1)
+    circuits = [U0 + tq.gates.ExpPauli(paulistring="X(0)Y(1)", angle=a) + tq.gates.Rz(1.0, 0),
+                U0 + tq.gates.ExpPauli(paulistring="X(0)Y(1)", angle=a) + tq.gates.Rz(0.5, 0),
+                U0 + tq.gates.ExpPauli(paulistring="Y(0)X(1)", angle=a) + tq.gates.Rz(0.3, 0)]
+    variables = {"a": 0.9}
+    reference = [tq.simulate(tq.ExpectationValue(U=U, H=H), variables=variables, backend="symbolic") for U in circuits]
+    objective = sum([tq.ExpectationValue(U=U, H=H) for U in circuits[1:]], tq.ExpectationValue(U=circuits[0], H=H))
+    assert numpy.isclose(tq.simulate(objective, variables=variables, backend=backend), sum(reference))
+    with shared_states():
+        values = [tq.simulate(tq.ExpectationValue(U=U, H=H), variables=variables, backend=backend) for U in circuits]
+    assert numpy.allclose(values, reference)
@@ -0,0 +1,167 @@
+from tequila.wavefunction.qubit_wavefunction import QubitWaveFunction
+from tequila.utils.keymap import KeyMapSubregisterToRegister, KeyMapRegisterToSubregister
+from tequila.utils.bitstrings import BitNumbering, BitString, BitStringLSB
+from tequila.hamiltonian import paulis
+from tequila import TequilaException
+
+import numpy
+import pytest
+
+
+def random_state(n_qubits):
+    state = numpy.random.uniform(-1.0, 1.0, 2 ** n_qubits) + 1.0j * numpy.random.uniform(-1.0, 1.0, 2 ** n_qubits)
+    return state / numpy.linalg.norm(state)
+
+
+def make_wfn(arr, storage):
+    if storage == "dict":
+        return QubitWaveFunction.from_array(arr=arr)
+    elif storage == "dense":
+        return QubitWaveFunction.from_dense(arr=arr)
+    else:
+        indices = numpy.flatnonzero(arr)
+        return QubitWaveFunction.from_sparse(indices=indices, amplitudes=arr[indices],
+                                             n_qubits=int(len(arr)).bit_length() - 1)
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+def test_storage_interface(storage):
+    arr = random_state(3)
+    arr[5] = 0.0
+    reference = make_wfn(arr, "dict")
+    wfn = make_wfn(arr, storage)
+    assert wfn.storage == storage
+    assert wfn.n_qubits == 3
+    assert len(wfn) == len(reference)
+    assert wfn == reference
+    assert reference == wfn
+    assert set(wfn.keys()) == set(reference.keys())
+    for k, v in reference.items():
+        assert k in wfn
+        assert numpy.isclose(wfn[k], v)
+        assert numpy.isclose(wfn(k.integer), v)
+    assert 5 not in wfn
+    assert numpy.isclose(wfn(5), 0.0)
+    assert numpy.allclose(wfn.to_array(), arr)
+    assert wfn.to_dict() == reference
+
+    wfn[5] = 0.5
+    reference[5] = 0.5
+    assert wfn == reference
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+@pytest.mark.parametrize("other_storage", ["dict", "dense", "sparse"])
+def test_storage_arithmetic(storage, other_storage):
+    a1 = random_state(3)
+    a2 = random_state(3)
+    a2[:4] = 0.0
+    wfn1 = make_wfn(a1, storage)
+    wfn2 = make_wfn(a2, other_storage)
+    ref1 = make_wfn(a1, "dict")
+    ref2 = make_wfn(a2, "dict")
+
+    assert numpy.isclose(wfn1.inner(wfn2), numpy.vdot(a1, a2))
+    assert numpy.isclose(wfn2.inner(wfn1), numpy.vdot(a2, a1))
+    assert (wfn1 + wfn2) == (ref1 + ref2)
+    assert (wfn1 - wfn2) == (ref1 - ref2)
+    assert (2.0j * wfn1) == (2.0j * ref1)
+    assert numpy.isclose((3.0 * wfn1).normalize().inner(wfn1), 1.0)
+
+    wfn1 += wfn2
+    assert numpy.allclose(wfn1.to_array(), a1 + a2)
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+@pytest.mark.parametrize("numbering", [BitNumbering.MSB, BitNumbering.LSB])
+def test_storage_numbering(storage, numbering):
+    arr = random_state(4)
+    wfn = QubitWaveFunction.from_dense(arr=arr, numbering=numbering)
+    if storage == "sparse":
+        wfn = wfn.to_sparse()
+    assert wfn == QubitWaveFunction.from_array(arr=arr, numbering=numbering)
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+@pytest.mark.parametrize("H", [paulis.X(0) * paulis.Y(2), paulis.Z(1) + 0.5 * paulis.X(0) * paulis.Z(2),
+                               paulis.Y(0) * paulis.Y(1) * paulis.Y(2) - paulis.I()])
+def test_storage_expectationvalue(storage, H):
+    arr = random_state(3)
+    wfn = make_wfn(arr, storage)
+    reference = make_wfn(arr, "dict")
+    assert wfn.apply_qubitoperator(H) == reference.apply_qubitoperator(H)
+    assert numpy.isclose(wfn.compute_expectationvalue(H), reference.compute_expectationvalue(H))
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+@pytest.mark.parametrize("subregister", [[0, 1, 2], [1, 3, 4], [0, 4, 5]])
+@pytest.mark.parametrize("initial_state", [None, 0, 13])
+def test_storage_keymap(storage, subregister, initial_state):
+    arr = random_state(3)
+    register = list(range(6))
+    keymap = KeyMapSubregisterToRegister(subregister=subregister, register=register)
+    wfn = make_wfn(arr, storage).apply_keymap(keymap=keymap, initial_state=initial_state)
+    reference = make_wfn(arr, "dict").apply_keymap(keymap=keymap, initial_state=initial_state)
+    assert wfn.n_qubits == reference.n_qubits == 6
+    assert wfn == reference
+
+    # generic keymaps are applied key by key
+    keymap = KeyMapRegisterToSubregister(subregister=subregister, register=register)
+    assert wfn.apply_keymap(keymap=keymap) == reference.apply_keymap(keymap=keymap)
+
+
+@pytest.mark.parametrize("subregister,register", [([0, 1, 2], range(4)), ([2, 0, 1], range(3)), ([3, 1], range(4)),
+                                                  ([0, 5, 9, 11, 17, 30, 42], range(50))])
+@pytest.mark.parametrize("initial_state", [None, 0, 2 ** 31 + 13])
+def test_integer_keymaps(subregister, register, initial_state):
+    keymap = KeyMapSubregisterToRegister(subregister=subregister, register=list(register))
+    m = len(subregister)
+    integers = numpy.random.randint(0, 2 ** m, 20)
+    mapped = keymap.map_integers(integers=integers, initial_state=initial_state)
+    for i, j in zip(integers, mapped):
+        output_state = keymap(input_state=int(i), initial_state=initial_state)
+        assert output_state.integer == j
+        assert output_state.nbits >= len(register)
+        # the bits of the subregister in the order of the subregister
+        on_register = BitString.from_int(integer=int(j) % 2 ** len(register), nbits=len(register))
+        assert [on_register[v] for v in subregister] == BitString.from_int(integer=int(i), nbits=m).array
+        assert keymap.inverted(input_state=int(j)).integer == i
+    assert numpy.array_equal(keymap.inverted_integers(integers=mapped), integers)
+    assert numpy.array_equal(KeyMapRegisterToSubregister(subregister=subregister, register=list(register)).map_integers(
+        integers=mapped), integers)
+
+    if len(register) <= 10:
+        arr = random_state(m)
+        reference = make_wfn(arr, "dict").apply_keymap(keymap=keymap, initial_state=initial_state)
+        wfn = make_wfn(arr, "dense").apply_keymap(keymap=keymap, initial_state=initial_state)
+        assert wfn == reference
+        if initial_state is None or initial_state < 2 ** len(register):
+            embedded = keymap.embed(amplitudes=arr, initial_state=initial_state)
+            assert QubitWaveFunction.from_dense(arr=embedded) == reference
+            assert wfn.storage == "dense"
+            assert wfn.n_qubits == len(register)
+        else:
+            with pytest.raises(TequilaException):
+                keymap.embed(amplitudes=arr, initial_state=initial_state)
+
+
+@pytest.mark.parametrize("numbering", [BitNumbering.MSB, BitNumbering.LSB])
+def test_counts(numbering):
+    outcomes = numpy.random.randint(0, 2 ** 5, 1000)
+    counts = QubitWaveFunction.from_counts(outcomes=outcomes, n_qubits=5, numbering=numbering)
+    assert counts.storage == "sparse"
+    indices, values = counts.to_arrays()
+    assert sum(values) == 1000
+    reference = QubitWaveFunction()
+    for i in outcomes:
+        key = BitString.from_int(integer=int(i), nbits=5)
+        if numbering == BitNumbering.LSB:
+            key = BitString.from_binary(binary=BitStringLSB.from_int(integer=int(i), nbits=5).binary)
+        reference[key] = reference(key) + 1
+    assert counts == reference
+    # outcomes with their counts, outcomes may repeat
+    unique, multiplicity = numpy.unique(outcomes, return_counts=True)
+    repeated = QubitWaveFunction.from_counts(outcomes=numpy.concatenate([unique, unique]), n_qubits=5,
+                                             numbering=numbering, counts=numpy.concatenate([multiplicity - 1,
+                                                                                            numpy.ones_like(unique)]))
+    assert repeated == reference